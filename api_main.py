@@ -1,17 +1,25 @@
 import os
+import json
 import shutil
 import tempfile
 import pickle
-from typing import Optional, List
+import hashlib
+import threading
+import numpy as np
+from datetime import datetime, timezone
+from typing import Optional, List, Iterable
 from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Header, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from utils import logger, setup_logging
+from utils import Document, logger, setup_logging, run_blocking, configure_executor
 from config import get_settings
-from ingestion import DocumentIngestor
-from chunking import Chunker
+from ingestion import DocumentIngestor, IngestJob, IngestJobQueue, QueueFull
+from ingestion.directory import file_hash
+from ingestion.bulk import BulkIngestor, BulkProgress
+from chunking import create_chunker
 from embeddings import EmbeddingService
-from vectorstore import VectorStore
+from vectorstore import VectorStore, MetadataFilter, StoreFlusher, StoreReplica, acquire_writer_lock
 from retrieval import Retriever
 from llm import LLMService
 from rag import RAGPipeline
@@ -28,21 +36,92 @@ app.add_middleware(
 )
 setup_logging()
 
-# Shared Services
+# Shared Services, built at startup rather than at import: spawned PDF extraction workers
+# re-import the main module, and must not load the embedding model or start a job queue
 settings = get_settings()
-embed_svc = EmbeddingService(settings.embedding)
-llm_svc = LLMService(settings.llm)
+embed_svc: Optional[EmbeddingService] = None
+llm_svc: Optional[LLMService] = None
+# Ingests run here, off the request: handlers enqueue and return a job id
+job_queue: Optional[IngestJobQueue] = None
 _store = None
+_flusher = None
+_replica = None
+_role = None
+_writer_lock = None
+_store_lock = threading.RLock()
 
+def is_reader() -> bool:
+    """
+    Whether this worker serves a read-only replica (STORE_ROLE=reader). Only one process may
+    write a store, so a writer that finds the store's writer lock taken serves as a reader too.
+    """
+    global _role, _writer_lock
+    if _role is None:
+        with _store_lock:
+            if _role is None:
+                role = settings.store_role
+                if role != "reader":
+                    _writer_lock = acquire_writer_lock(settings.vector_db_path)
+                    if _writer_lock is None:
+                        logger.warning(f"Another process writes the vector store at {settings.vector_db_path}, serving it read-only")
+                        role = "reader"
+                _role = role
+    return _role == "reader"
+
+def require_writer():
+    if is_reader():
+        raise HTTPException(status_code=403, detail="This worker serves a read-only replica of the vector store; send ingests, updates and deletes to the writer.")
+
+def _open_store(store: VectorStore):
+    global _store, _flusher
+    # Handlers publish changes in memory; the flusher persists them off the request path
+    _flusher = StoreFlusher(store, settings.vector_db_path, settings.store_flush_interval)
+    _store = store
+
+# Blocking, called from the executor (run_blocking), never directly on the event loop
 def get_store() -> Optional[VectorStore]:
-    global _store
-    if _store is None:
-        if os.path.exists(os.path.join(settings.vector_db_path, "store.pkl")):
-            try:
-                _store = VectorStore.load(settings.vector_db_path)
-            except Exception as e:
-                logger.error(f"Failed to load store: {e}")
-    return _store
+    global _replica
+    if _store is not None:
+        return _store
+    if _replica is not None:
+        return _replica.store
+    with _store_lock:
+        if _store is None and _replica is None:
+            if is_reader():
+                # Follows the writer's saves; None until it has written the store
+                _replica = StoreReplica(settings.vector_db_path, settings.store_poll_interval)
+            elif VectorStore.exists(settings.vector_db_path):
+                try:
+                    _open_store(VectorStore.load(settings.vector_db_path, settings.index))
+                except Exception as e:
+                    logger.error(f"Failed to load store: {e}")
+        return _replica.store if _replica is not None else _store
+
+def store_for(dimension: int) -> VectorStore:
+    """The persisted store, or a new empty one on the very first ingest."""
+    with _store_lock:
+        if get_store() is None:
+            _open_store(VectorStore(dimension, settings.index))
+        return _store
+
+def add_to_store(chunks: List, embeddings, content_hashes: dict = None, replaces: List[str] = None) -> VectorStore:
+    """
+    Add chunks and schedule a save. The previous chunks of the documents in replaces are
+    deleted first, in the same writer turn; callers only get here once the new version is
+    embedded, so a failed update leaves the old one intact.
+    """
+    store = store_for(len(embeddings[0]))
+    with store.writer():
+        for document_id in replaces or ():
+            store.delete_by_metadata("document_id", document_id)
+        store.add(chunks, embeddings, content_hashes)
+    _flusher.mark_dirty()
+    return store
+
+def save_upload(file: UploadFile, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        return tmp.name
 
 def verify_token(authorization: Optional[str] = Header(None)):
     if settings.api_token and authorization != f"Bearer {settings.api_token}":
@@ -50,18 +129,61 @@ def verify_token(authorization: Optional[str] = Header(None)):
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    status = {"status": "ok"}
+    if embed_svc.cache is not None:
+        status["embedding_cache"] = embed_svc.cache.stats()
+    status["query_batching"] = embed_svc.query_batcher.stats()
+    status["ingest_jobs"] = job_queue.stats()
+    if _store is not None:
+        status["store"] = {
+            "role": "writer", "version": _store.version, "generation": _store.generation,
+            "chunks": _store.count, **_flusher.stats()
+        }
+    elif _replica is not None:
+        store = _replica.store
+        status["store"] = {
+            "role": "reader", "version": store.version if store else None,
+            "chunks": store.count if store else 0, **_replica.stats()
+        }
+    return status
+
+@app.on_event("startup")
+def start_services():
+    global embed_svc, llm_svc, job_queue
+    configure_executor(settings.worker_threads)
+    embed_svc = EmbeddingService(settings.embedding)
+    llm_svc = LLMService(settings.llm)
+    job_queue = IngestJobQueue(settings.ingest_workers, settings.ingest_queue_depth)
+
+@app.on_event("shutdown")
+def flush_store():
+    if job_queue is not None:
+        job_queue.close()
+    if _flusher is not None:
+        _flusher.close()
+    if _replica is not None:
+        _replica.close()
 
 class QueryRequest(BaseModel):
     query: str
     k: Optional[int] = 5
     collection: Optional[str] = None
+    filters: Optional[dict] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
 
-@app.post("/query")
-async def query_rag(request: Request, auth=Depends(verify_token)):
+def wrap_query(query_text: str) -> str:
+    if not (query_text.startswith("{{") and query_text.endswith("}}")):
+        return f"{{{{{query_text}}}}}"
+    return query_text
+
+async def parse_query(request: Request) -> dict:
+    """Query text and search options from a JSON or raw-text /query body."""
     # 1. Flexible Input Handling (JSON or Raw Text)
     k = 5
     collection = None
+    filters = None
+    search_params = {}
     content_type = request.headers.get("Content-Type", "")
     
     if "application/json" in content_type:
@@ -70,8 +192,15 @@ async def query_rag(request: Request, auth=Depends(verify_token)):
             query_text = data.get("query", "")
             k = data.get("k", 5)
             collection = data.get("collection")
+            raw_filters = data.get("filters")
+            # Optional ANN knobs for HNSW / IVF indexes
+            search_params = {key: data[key] for key in ("nprobe", "ef_search") if data.get(key)}
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid JSON body")
+        try:
+            filters = MetadataFilter.from_dict(raw_filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
     else:
         # Assume raw text if not JSON
         body = await request.body()
@@ -81,142 +210,336 @@ async def query_rag(request: Request, auth=Depends(verify_token)):
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
     # 2. Automatically wrap in braces if Sim Studio stripped them or sent raw
-    processed_query = query_text
-    if not (processed_query.startswith("{{") and processed_query.endswith("}}")):
-        processed_query = f"{{{{{processed_query}}}}}"
+    processed_query = wrap_query(query_text)
     
-    logger.info(f"Processing query: {processed_query} (Collection: {collection})")
+    logger.info(f"Processing query: {processed_query} (Collection: {collection}, Filters: {filters})")
+    return {"question": processed_query, "k": k, "collection": collection, "filters": filters, **search_params}
 
-    store = get_store()
+async def get_pipeline() -> RAGPipeline:
+    store = await run_blocking(get_store)
     if not store:
         raise HTTPException(status_code=400, detail="Vector store is empty. Please ingest documents.")
-    
-    retriever = Retriever(embed_svc, store)
-    pipeline = RAGPipeline(retriever, llm_svc)
+    return RAGPipeline(Retriever(embed_svc, store), llm_svc)
+
+@app.post("/query")
+async def query_rag(request: Request, auth=Depends(verify_token)):
+    params = await parse_query(request)
+    pipeline = await get_pipeline()
     # The pipeline.query now handles the (pdf_upload OR collection) logic internally
-    answer = pipeline.query(processed_query, k=k, collection=collection)
+    answer = await pipeline.aquery(**params)
     return {"answer": answer}
 
-@app.post("/ingest")
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    k: Optional[int] = 5
+    collection: Optional[str] = None
+    filters: Optional[dict] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    stream: Optional[bool] = False
+
+@app.post("/query_batch")
+async def query_batch(body: BatchQueryRequest, request: Request, auth=Depends(verify_token)):
+    """
+    Answer many questions with the same search options. All questions are embedded in one call
+    and searched as one matrix; answers are generated LLM_CONCURRENCY at a time. Results keep
+    the question order and carry an "error" instead of an "answer" if their generation failed.
+    With "stream": true (or Accept: application/x-ndjson) each result is sent as an NDJSON line
+    as soon as it and all earlier ones are ready.
+    """
+    if not body.queries or not all(q.strip() for q in body.queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty")
+    try:
+        filters = MetadataFilter.from_dict(body.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+    logger.info(f"Processing batch of {len(body.queries)} queries (Collection: {body.collection}, Filters: {filters})")
+
+    pipeline = await get_pipeline()
+    results = pipeline.aquery_many(
+        [wrap_query(q.strip()) for q in body.queries], k=body.k, collection=body.collection, filters=filters,
+        nprobe=body.nprobe, ef_search=body.ef_search
+    )
+
+    async def records():
+        index = 0
+        async for result in results:
+            yield {"index": index, **result, "question": body.queries[index]}
+            index += 1
+
+    if body.stream or "application/x-ndjson" in request.headers.get("Accept", ""):
+        async def lines():
+            try:
+                async for record in records():
+                    yield json.dumps(record) + "\n"
+            except Exception as e:
+                # Headers are already sent, so the failure is reported in-band
+                logger.error(f"Batch query failed: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    return {"results": [record async for record in records()]}
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def query_rag_stream(request: Request, auth=Depends(verify_token)):
+    """
+    Same body as /query, answered as Server-Sent Events: a "sources" event with the retrieved
+    chunks once retrieval is done, a "token" event per piece of the answer, then "done"
+    (or "error" if generation fails midway).
+    """
+    params = await parse_query(request)
+    pipeline = await get_pipeline()
+
+    async def events():
+        try:
+            async for event, data in pipeline.aquery_stream(**params):
+                yield sse_event(event, data)
+        except Exception as e:
+            # Headers are already sent, so the failure is reported in-band
+            logger.error(f"Streaming query failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+        yield sse_event("done", {})
+
+    # X-Accel-Buffering stops nginx-style proxies from holding events back
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def make_chunker(strategy: Optional[str], chunk_size: int, overlap: int, max_tokens: Optional[int]):
+    """The request's chunker; strategy and max_tokens default to the CHUNK_* settings."""
+    try:
+        return create_chunker(
+            strategy or settings.chunking.strategy,
+            chunk_size=chunk_size, chunk_overlap=overlap,
+            max_tokens=max_tokens or settings.chunking.max_tokens,
+            overlap_tokens=settings.chunking.overlap_tokens,
+            model=settings.embedding.model,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def run_ingest(job: IngestJob, documents: Iterable[Document], chunker, content_hash: str,
+               replaces: bool = False, empty_error: str = "No text to embed.") -> dict:
+    """
+    Job worker: chunk and embed a document's pages (or text) as they arrive, then add the
+    chunks in one go, so a failed job never leaves half a document behind.
+    """
+    chunks, embeddings = [], []
+    for group, vectors in embed_svc.embed_stream(job.track(chunker.iter_split(documents), "chunks", "chunking")):
+        chunks.extend(group)
+        embeddings.append(vectors)
+        job.embedded += len(group)
+    if not chunks:
+        raise ValueError(empty_error)
+    job.stage = "saving"
+    add_to_store(chunks, np.vstack(embeddings), {job.document_id: content_hash},
+                 [job.document_id] if replaces else None)
+    return {"chunks": len(chunks), "document_id": job.document_id, "collection": job.collection}
+
+def submit_job(key: dict, run, kind: str, document_id: str, collection: Optional[str]) -> dict:
+    """Queue an ingest; an identical one still in flight is returned instead of running twice."""
+    key = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+    try:
+        job, created = job_queue.submit(key, run, kind, document_id, collection)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"{e}, retry later.", headers={"Retry-After": "5"})
+    return {
+        "status": "queued" if created else "duplicate",
+        "job_id": job.id,
+        "document_id": document_id,
+        "collection": collection,
+        "queue_position": job_queue.position(job),
+    }
+
+@app.post("/ingest", status_code=202)
 async def ingest_document(
     file: UploadFile = File(...), 
     document_id: str = Form(...),
     collection: Optional[str] = Form(None),
     chunk_size: int = Form(500),
     overlap: int = Form(100),
-    auth=Depends(verify_token)
+    strategy: Optional[str] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    auth=Depends(verify_token),
+    writer=Depends(require_writer)
 ):
-    global _store
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = tmp.name
+    chunker = make_chunker(strategy, chunk_size, overlap, max_tokens)
+    return await ingest_pdf(file, document_id, collection, chunker, [strategy, chunk_size, overlap, max_tokens])
 
+async def ingest_pdf(file: UploadFile, document_id: str, collection: Optional[str], chunker, options: list,
+                     replaces: bool = False) -> dict:
+    """Save the upload and queue its ingest; the job removes the file when it is done with it."""
+    tmp_path = await run_blocking(save_upload, file, ".pdf")
+    queued = False
     try:
-        # 1. Ingest
-        ingestor = DocumentIngestor()
-        
+        content_hash = await run_blocking(file_hash, tmp_path)
+
         # User Logic: If not provided, tag as 'pdf_upload'. 
         # If provided 'xyz', it belongs to 'xyz' AND 'pdf_upload' (implied by base layer)
         metadata = {"document_id": document_id, "source": "pdf_upload"}
         if collection:
             metadata["collection"] = collection
-            
-        docs = ingestor.ingest(tmp_path, extra_metadata=metadata)
-        if not docs:
-            raise HTTPException(status_code=400, detail="Failed to extract text from PDF.")
-
-        chunker = Chunker(chunk_size=chunk_size, chunk_overlap=overlap)
-        chunks = chunker.split(docs)
-
-        texts = [c.text for c in chunks]
-        embeddings = embed_svc.embed(texts)
-
-        if _store is None:
-            _store = get_store() or VectorStore(len(embeddings[0]))
-        
-        _store.add(chunks, embeddings)
-        _store.save(settings.vector_db_path)
-        
-        return {"status": "success", "chunks": len(chunks), "document_id": document_id, "collection": collection}
+
+        def run(job: IngestJob) -> dict:
+            try:
+                # Pages stream out of the extraction pool into chunking and embedding as they are ready
+                ingestor = DocumentIngestor(workers=settings.pdf_workers)
+                pages = job.track(ingestor.iter_pages(tmp_path, extra_metadata=metadata), "pages", "extracting")
+                return run_ingest(job, pages, chunker, content_hash, replaces, "Failed to extract text from PDF.")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        kind = "update" if replaces else "pdf"
+        response = submit_job([kind, document_id, collection, content_hash, options], run, kind, document_id, collection)
+        queued = response["status"] == "queued"
+        return response
     finally:
-        if os.path.exists(tmp_path):
+        if not queued and os.path.exists(tmp_path):
             os.remove(tmp_path)
 
-@app.post("/ingest_text")
+@app.post("/ingest_text", status_code=202)
 async def ingest_text(
     document_id: str = Form(...),
     text: str = Form(...),
     collection: Optional[str] = Form(None),
     chunk_size: int = Form(500),
     overlap: int = Form(100),
-    auth=Depends(verify_token)
+    strategy: Optional[str] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    auth=Depends(verify_token),
+    writer=Depends(require_writer)
 ):
-    global _store
+    chunker = make_chunker(strategy, chunk_size, overlap, max_tokens)
+    metadata = {"document_id": document_id, "source": "pdf_upload"}
+    if collection:
+        metadata["collection"] = collection
+    doc = Document(text=text, metadata=metadata)
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def run(job: IngestJob) -> dict:
+        return run_ingest(job, [doc], chunker, content_hash)
+
+    options = [strategy, chunk_size, overlap, max_tokens]
+    return submit_job(["text", document_id, collection, content_hash, options], run, "text", document_id, collection)
+
+def write_blocks(f, blocks: List[bytes]):
+    for block in blocks:
+        f.write(block)
+
+@app.post("/ingest_bulk", status_code=202)
+async def ingest_bulk(
+    request: Request,
+    collection: Optional[str] = None,
+    chunk_size: int = 500,
+    overlap: int = 100,
+    strategy: Optional[str] = None,
+    max_tokens: Optional[int] = None,
+    auth=Depends(verify_token),
+    writer=Depends(require_writer)
+):
+    """
+    Queue the ingest of an NDJSON body, one {document_id, text, collection, metadata} record
+    per line. Chunking options are query parameters; collection is the default for records
+    without one.
+    """
+    chunker = make_chunker(strategy, chunk_size, overlap, max_tokens)
+    # The body is spooled to disk as it arrives, so the job can stream it back however large it is
+    tmp = await run_blocking(tempfile.NamedTemporaryFile, delete=False, suffix=".ndjson")
+    digest = hashlib.sha256()
+    queued = False
     try:
-        from utils import Document
-        
-        metadata = {"document_id": document_id, "source": "pdf_upload"}
-        if collection:
-            metadata["collection"] = collection
-            
-        doc = Document(text=text, metadata=metadata)
-        chunker = Chunker(chunk_size=chunk_size, chunk_overlap=overlap)
-        chunks = chunker.split([doc])
-        texts = [c.text for c in chunks]
-        if not texts:
-            raise HTTPException(status_code=400, detail="No text to embed.")
-        embeddings = embed_svc.embed(texts)
-        if _store is None:
-            _store = get_store() or VectorStore(len(embeddings[0]))
-        _store.add(chunks, embeddings)
-        _store.save(settings.vector_db_path)
-        return {"status": "success", "chunks": len(chunks), "document_id": document_id}
-    except Exception as e:
-        logger.error(f"Text ingestion failed: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/update")
+        blocks, size = [], 0
+        async for block in request.stream():
+            digest.update(block)
+            blocks.append(block)
+            size += len(block)
+            if size >= 1 << 20:
+                await run_blocking(write_blocks, tmp, blocks)
+                blocks, size = [], 0
+        await run_blocking(write_blocks, tmp, blocks)
+        await run_blocking(tmp.close)
+
+        def lookup(document_id: str) -> Optional[dict]:
+            # Resolved per record: another ingest job may create the store while this one runs
+            store = get_store()
+            return store.document_info(document_id) if store is not None else None
+
+        def run(job: IngestJob) -> dict:
+            try:
+                job.details = BulkProgress()
+                bulk = BulkIngestor(
+                    embed_svc, chunker, add_to_store, lookup=lookup, collection=collection, progress=job.details,
+                )
+                with open(tmp.name, "rb") as f:
+                    progress = bulk.run(f)
+                logger.info(f"Bulk ingest job {job.id}: {progress.summary()}")
+                return progress.to_dict()
+            finally:
+                os.remove(tmp.name)
+
+        key = ["bulk", collection, digest.hexdigest(), [strategy, chunk_size, overlap, max_tokens]]
+        response = submit_job(key, run, "bulk", None, collection)
+        queued = response["status"] == "queued"
+        return response
+    finally:
+        if not tmp.closed:
+            await run_blocking(tmp.close)
+        if not queued and os.path.exists(tmp.name):
+            os.remove(tmp.name)
+
+@app.post("/update", status_code=202)
 async def update_document(
     file: UploadFile = File(...), 
     document_id: str = Form(...),
+    collection: Optional[str] = Form(None),
     chunk_size: int = Form(500),
     overlap: int = Form(100),
-    auth=Depends(verify_token)
+    strategy: Optional[str] = Form(None),
+    max_tokens: Optional[int] = Form(None),
+    auth=Depends(verify_token),
+    writer=Depends(require_writer)
 ):
-    global _store
-    store = get_store()
-    if store:
-        store.delete_by_metadata("document_id", document_id)
-    return await ingest_document(file, document_id, chunk_size, overlap, auth)
+    chunker = make_chunker(strategy, chunk_size, overlap, max_tokens)
+    # The previous chunks are replaced in the same save as the new ones are added
+    return await ingest_pdf(file, document_id, collection, chunker, [strategy, chunk_size, overlap, max_tokens],
+                            replaces=True)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, auth=Depends(verify_token)):
+    """Stage, progress and throughput of an ingest job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job {job_id}.")
+    return {**job.to_dict(), "queue_position": job_queue.position(job)}
 
 @app.post("/delete")
-async def delete_document(document_id: str = Form(...), auth=Depends(verify_token)):
-    global _store
-    store = get_store()
+async def delete_document(document_id: str = Form(...), auth=Depends(verify_token), writer=Depends(require_writer)):
+    store = await run_blocking(get_store)
     if not store:
         raise HTTPException(status_code=400, detail="Vector store is empty.")
-    store.delete_by_metadata("document_id", document_id)
-    store.save(settings.vector_db_path)
+    await run_blocking(store.delete_by_metadata, "document_id", document_id)
+    _flusher.mark_dirty()
     return {"status": "success", "message": f"Document {document_id} deleted."}
 
+def summarize_documents(store: VectorStore) -> dict:
+    # Read from the store's document registry: proportional to the number of documents, not chunks
+    docs_summary = store.list_documents()
+    for summary in docs_summary.values():
+        if summary["ingested_at"] is not None:
+            summary["ingested_at"] = datetime.fromtimestamp(summary["ingested_at"], timezone.utc).isoformat()
+    return docs_summary
+
 @app.get("/documents")
 async def list_documents(auth=Depends(verify_token)):
-    store = get_store()
+    store = await run_blocking(get_store)
     if not store:
         return {"documents": []}
     
     # Summarize contents
-    docs_summary = {}
-    for doc in store.documents:
-        did = doc.metadata.get("document_id", "unknown")
-        if did not in docs_summary:
-            docs_summary[did] = {
-                "source": doc.metadata.get("source"),
-                "collection": doc.metadata.get("collection"),
-                "chunks": 0
-            }
-        docs_summary[did]["chunks"] += 1
-    
+    docs_summary = await run_blocking(summarize_documents, store)
     return {"documents": docs_summary}
 
 if __name__ == "__main__":
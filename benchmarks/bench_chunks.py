@@ -0,0 +1,118 @@
+"""
+Memory and time of chunking a large corpus: copied chunks vs offset-based chunks.
+
+"copy" reproduces the previous Chunker (a new string slice and a metadata.copy() per chunk,
+dataclass Documents with a __dict__); "offsets" is the current Chunker, whose chunks are
+(parent, start, end) views sharing their page's metadata. Each mode runs in its own subprocess
+over the same synthetic pages, keeps every chunk alive (as an ingest does until the chunks
+reach the store) and reports the RSS growth over the pages themselves, plus the time to chunk
+and to materialise the texts in embedding-sized groups.
+
+    python benchmarks/bench_chunks.py --pages 50000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_memory import rss_bytes
+
+
+@dataclass
+class CopiedDocument:
+    text: str
+    metadata: dict = field(default_factory=dict)
+
+
+def copy_split(pages, chunk_size: int, overlap: int):
+    """The previous Chunker.split."""
+    chunks = []
+    for doc in pages:
+        text, metadata = doc.text, doc.metadata
+        start = 0
+        while start < len(text):
+            end = start + chunk_size
+            chunks.append(CopiedDocument(text=text[start:end], metadata=metadata.copy()))
+            if end >= len(text):
+                break
+            start += chunk_size - overlap
+    return chunks
+
+
+def make_pages(n: int, chars: int):
+    import random
+    from utils import Document
+    rng = random.Random(0)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+    pages = []
+    for i in range(n):
+        text = " ".join(rng.choice(words) for _ in range(chars // 6))[:chars]
+        pages.append(Document(text=text, metadata={
+            "source": f"manual-{i // 500}.pdf", "page": i % 500 + 1, "total_pages": 500,
+            "document_id": f"doc-{i // 500}", "collection": "manuals",
+        }))
+    return pages
+
+
+def child(mode: str, args):
+    from chunking import Chunker
+    pages = make_pages(args.pages, args.chars)
+    baseline = rss_bytes()
+
+    start = time.perf_counter()
+    if mode == "copy":
+        chunks = copy_split(pages, args.chunk_size, args.overlap)
+    else:
+        chunks = Chunker(args.chunk_size, args.overlap).split(pages)
+    split_s = time.perf_counter() - start
+    grown = rss_bytes() - baseline
+
+    # What the embed stage does: read the texts of one group at a time
+    start = time.perf_counter()
+    chars = 0
+    for i in range(0, len(chunks), args.group):
+        chars += sum(len(c.text) for c in chunks[i:i + args.group])
+    texts_s = time.perf_counter() - start
+    print(json.dumps({"mode": mode, "chunks": len(chunks), "rss_delta": grown, "split_s": split_s, "texts_s": texts_s}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50_000)
+    parser.add_argument("--chars", type=int, default=3000, help="Characters per page.")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--group", type=int, default=1024, help="Chunks per embedding group.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        from utils import setup_logging
+        setup_logging("WARNING")
+        child(args.child, args)
+        return
+
+    corpus = args.pages * args.chars
+    print(f"{args.pages:,} pages x {args.chars} chars = {corpus / 2**20:.0f} MiB of text, "
+          f"chunk {args.chunk_size} / overlap {args.overlap}")
+    print(f"{'mode':<9}{'chunks':>10}{'RSS +':>12}{'per chunk':>11}{'split':>9}{'texts':>9}")
+    for mode in ("copy", "offsets"):
+        command = [sys.executable, __file__, "--child", mode] + [
+            f"--{name}={getattr(args, name.replace('-', '_'))}" for name in ("pages", "chars", "chunk-size", "overlap", "group")
+        ]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{mode:<9}  failed (exit {proc.returncode})")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{mode:<9}{r['chunks']:>10,}{r['rss_delta'] / 2**20:>8.0f} MiB{r['rss_delta'] / r['chunks']:>9.0f} B"
+              f"{r['split_s']:>8.2f}s{r['texts_s']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Recall and latency of the selectable vector index types.
+
+Builds one VectorStore per index type over the same clustered synthetic corpus and reports,
+for each per-query setting (efSearch for HNSW, nprobe for IVF), recall@k against the exact
+Flat index and p50/p99 single-query latency through VectorStore.query.
+
+    python benchmarks/bench_index.py --n 200000 --dim 384
+    python benchmarks/bench_index.py --n 50000 --dim 128 --types flat,hnsw --ef-search 16,64,256
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def corpus(n: int, dim: int, queries: int, seed: int = 0):
+    """Gaussian clusters, closer to real embeddings than uniform noise (which defeats any ANN index)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 1000), dim)).astype(np.float32)
+    def sample(count):
+        return (centers[rng.integers(0, len(centers), count)] + 0.5 * rng.normal(size=(count, dim))).astype(np.float32)
+    return sample(n), sample(queries)
+
+
+def build(index_type: str, vectors: np.ndarray, args):
+    from config import IndexConfig
+    from utils import Document
+    from vectorstore import VectorStore
+    config = IndexConfig(
+        type=index_type, train_min=0, hnsw_m=args.hnsw_m, nlist=args.nlist, pq_m=args.pq_m,
+    )
+    store = VectorStore(vectors.shape[1], config)
+    docs = [Document(text=str(i), metadata={}) for i in range(len(vectors))]
+    start = time.perf_counter()
+    store.add(docs, vectors)
+    # Partitions past train_min are trained in the background; time them too
+    store.wait_for_training()
+    return store, time.perf_counter() - start
+
+
+def run_queries(store, queries: np.ndarray, k: int, **params):
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        docs = store.query(q, k=k, **params)
+        latencies.append(time.perf_counter() - start)
+        results.append({int(d.text) for d in docs})
+    return results, np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="Number of chunks.")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default="flat,hnsw,ivf_flat,ivf_pq", help="Comma-separated index types.")
+    parser.add_argument("--ef-search", default="16,64,256", help="HNSW efSearch values to sweep.")
+    parser.add_argument("--nprobe", default="1,8,32", help="IVF nprobe values to sweep.")
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = ~4*sqrt(n)).")
+    parser.add_argument("--pq-m", type=int, default=16)
+    args = parser.parse_args()
+
+    from utils import setup_logging
+    setup_logging("WARNING")
+
+    vectors, queries = corpus(args.n, args.dim, args.queries)
+    print(f"{args.n:,} chunks x {args.dim} dims, {args.queries} queries, recall@{args.k} vs Flat")
+
+    exact, _ = build("flat", vectors, args)
+    truth, _ = run_queries(exact, queries, args.k)
+    del exact
+
+    print(f"{'index':<10}{'setting':<14}{'build s':>9}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    for index_type in args.types.split(","):
+        store, build_seconds = build(index_type, vectors, args)
+        if index_type == "hnsw":
+            settings = [("ef_search", int(v)) for v in args.ef_search.split(",")]
+        elif index_type.startswith("ivf"):
+            settings = [("nprobe", int(v)) for v in args.nprobe.split(",")]
+        else:
+            settings = [(None, None)]
+        for name, value in settings:
+            params = {name: value} if name else {}
+            found, latencies = run_queries(store, queries, args.k, **params)
+            recall = np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, truth)])
+            label = f"{name}={value}" if name else "exact"
+            print(f"{index_type:<10}{label:<14}{build_seconds:>9.1f}{recall:>8.3f}"
+                  f"{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 99):>9.2f}")
+        del store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Resident memory of the vector store at scale.
+
+Compares the old layout (FAISS IndexFlatL2 plus a Python List[List[float]] copy of every
+embedding) with the current VectorStore, which keeps a single contiguous float32 matrix in
+the index and serves full-precision vectors from memory-mapped segment files.
+Each mode runs in its own subprocess so RSS measurements do not interfere.
+
+    python benchmarks/bench_memory.py --n 1000000 --dim 1536
+    python benchmarks/bench_memory.py --n 20000 --dim 1536 --modes legacy,current
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is in KiB on Linux and bytes on macOS; only used where /proc is missing
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def batches(n: int, dim: int, batch: int):
+    import numpy as np
+    rng = np.random.default_rng(0)
+    for start in range(0, n, batch):
+        yield rng.random((min(batch, n - start), dim), dtype=np.float32)
+
+
+def run_legacy(n: int, dim: int, batch: int):
+    import numpy as np
+    import faiss
+    index = faiss.IndexFlatL2(dim)
+    embeddings = []
+    for vecs in batches(n, dim, batch):
+        # What the old VectorStore.add did: add to FAISS and keep a boxed Python copy
+        index.add(vecs)
+        embeddings.extend(vecs.tolist())
+    return index, embeddings
+
+
+def run_current(n: int, dim: int, batch: int):
+    import tempfile
+    from utils import Document
+    from vectorstore import VectorStore
+    store = VectorStore(dim)
+    store.checkpoint_rows = batch
+    # Documents are identical in both layouts, so share one object to isolate vector memory
+    doc = Document(text="", metadata={})
+    path = tempfile.mkdtemp(prefix="bench_memory_")
+    for vecs in batches(n, dim, batch):
+        store.add([doc] * len(vecs), vecs)
+        # As in the API, every ingest is saved; checkpointed chunks move from RAM to segment files
+        store.save(path)
+    return store
+
+
+def child(mode: str, n: int, dim: int, batch: int):
+    import numpy as np  # noqa: F401  (import cost is excluded from the baseline)
+    import faiss  # noqa: F401
+    from utils import setup_logging
+    setup_logging("WARNING")
+    baseline = rss_bytes()
+    start = time.perf_counter()
+    keep = run_legacy(n, dim, batch) if mode == "legacy" else run_current(n, dim, batch)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "mode": mode,
+        "rss_delta_bytes": rss_bytes() - baseline,
+        "seconds": elapsed,
+    }))
+    del keep
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=1_000_000, help="Number of chunks.")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension.")
+    parser.add_argument("--batch", type=int, default=10_000, help="Vectors per add() call.")
+    parser.add_argument("--modes", default="legacy,current", help="Comma-separated modes to run.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.n, args.dim, args.batch)
+        return
+
+    raw = args.n * args.dim * 4
+    print(f"{args.n:,} chunks x {args.dim} dims, raw float32 = {raw / 2**30:.2f} GiB")
+    print(f"{'mode':<10}{'RSS delta':>14}{'x raw':>8}{'seconds':>10}")
+    for mode in args.modes.split(","):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--n", str(args.n), "--dim", str(args.dim), "--batch", str(args.batch)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{mode:<10}{'failed (exit ' + str(proc.returncode) + ')':>14}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        delta = result["rss_delta_bytes"]
+        print(f"{mode:<10}{delta / 2**30:>11.2f} GiB{delta / raw:>8.2f}{result['seconds']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
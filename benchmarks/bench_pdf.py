@@ -0,0 +1,129 @@
+"""
+PDF extraction throughput and memory: serial vs the parallel, streaming DocumentIngestor.
+
+Writes a synthetic text-only PDF (or uses --pdf), then, in a fresh subprocess per mode,
+iterates DocumentIngestor.iter_pages and reports the time to the first page, total time,
+pages per second, the peak RSS of the consuming process and the peak RSS of each extraction
+worker. Pages are consumed and dropped as they arrive, as the chunk/embed pipeline does.
+With --main, the child imports an entry point's module first (e.g. main or api_main), as
+the workers re-import the main module they are spawned from, to check what that costs them.
+
+    python benchmarks/bench_pdf.py --pages 1000
+    python benchmarks/bench_pdf.py --pdf manual.pdf --workers 1,4,8
+    python benchmarks/bench_pdf.py --workers 4 --main api_main
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_memory import rss_bytes
+
+
+def write_pdf(path: str, pages: int, lines: int = 45):
+    """Minimal valid PDF with `pages` pages of Helvetica text, written without extra dependencies."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for p in range(pages):
+        text = " ".join(
+            f"({f'Page {p + 1} line {n}: the quick brown fox jumps over the lazy dog {p * lines + n}'}) Tj T*"
+            for n in range(lines)
+        )
+        stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text} ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        f.writelines(b"%010d 00000 n \n" % offset for offset in offsets)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def peak_rss_of(pid: int) -> int:
+    """Peak RSS of another process (VmHWM), 0 where /proc is missing."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def child(path: str, workers: int, main: str = None):
+    from utils import setup_logging
+    from ingestion import DocumentIngestor, pdf_ingestor
+    if main:
+        # As under `python <main>.py`: spawned workers import the main module before any task
+        sys.modules["__main__"] = importlib.import_module(main)
+    setup_logging("WARNING")
+
+    ingestor = DocumentIngestor(workers=workers)
+    baseline = rss_bytes()
+    peak, pages, first = baseline, 0, None
+    start = time.perf_counter()
+    for page in ingestor.iter_pages(path):
+        if first is None:
+            first = time.perf_counter() - start
+        pages += 1
+        peak = max(peak, rss_bytes())
+    total = time.perf_counter() - start
+    # The pool outlives the run; workers = 1 extracts in this process and has none
+    pids = list(pdf_ingestor._pool._processes) if pdf_ingestor._pool is not None else []
+    worker_rss = max((peak_rss_of(pid) for pid in pids), default=0)
+    print(json.dumps({"workers": workers, "pages": pages, "first_s": first, "total_s": total,
+                      "peak_rss_delta": peak - baseline, "worker_peak_rss": worker_rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000, help="Pages of the synthetic PDF.")
+    parser.add_argument("--pdf", help="Benchmark this PDF instead of a synthetic one.")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts (1 = serial).")
+    parser.add_argument("--main", help="Module the workers re-import as their main module, e.g. main or api_main.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.child_workers, args.main)
+        return
+
+    path = args.pdf
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="bench_pdf_"), "synthetic.pdf")
+        write_pdf(path, args.pages)
+    print(f"{path}: {os.path.getsize(path) / 2**20:.1f} MiB")
+    print(f"{'workers':>8}{'pages':>8}{'first page':>12}{'total':>10}{'pages/s':>10}{'peak RSS +':>12}{'worker RSS':>12}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        command = [sys.executable, __file__, "--child", path, f"--child-workers={workers}"]
+        if args.main:
+            command.append(f"--main={args.main}")
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{workers:>8}  failed (exit {proc.returncode})")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{workers:>8}{r['pages']:>8}{r['first_s']:>11.2f}s{r['total_s']:>9.2f}s"
+              f"{r['pages'] / r['total_s']:>10.0f}{r['peak_rss_delta'] / 2**20:>8.1f} MiB"
+              + (f"{r['worker_peak_rss'] / 2**20:>8.1f} MiB" if r['worker_peak_rss'] else f"{'-':>12}"))
+
+
+if __name__ == "__main__":
+    main()
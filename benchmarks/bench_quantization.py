@@ -0,0 +1,120 @@
+"""
+Memory saved and recall lost by scalar-quantized vector storage.
+
+For each storage mode (float32, float16, int8) a child process builds a VectorStore over the
+same clustered synthetic corpus, saving as it ingests so full-precision vectors end up in
+memory-mapped segment files, and reports the serialized size of its FAISS indexes and its RSS
+growth (which also includes the in-memory ingest buffer and allocator slack). It then measures
+recall@k against exact float32 search, with and without re-ranking the top k * rerank
+candidates from the memory-mapped float32 vectors, and p50 query latency.
+
+    python benchmarks/bench_quantization.py --n 200000 --dim 1536
+    python benchmarks/bench_quantization.py --n 50000 --dim 384 --type hnsw
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_memory import rss_bytes
+from bench_index import corpus
+
+
+def exact_neighbours(vectors, queries, k: int, block: int = 65536):
+    import numpy as np
+    best = []
+    for q in queries:
+        distances = np.concatenate([((vectors[s:s + block] - q) ** 2).sum(axis=1) for s in range(0, len(vectors), block)])
+        best.append(set(np.argpartition(distances, k)[:k].tolist()))
+    return best
+
+
+def child(storage: str, args):
+    import numpy as np
+    import faiss
+    from config import IndexConfig
+    from utils import Document, setup_logging
+    from vectorstore import VectorStore
+    setup_logging("WARNING")
+
+    vectors, queries = corpus(args.n, args.dim, args.queries)
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    baseline = rss_bytes()
+    store = VectorStore(args.dim, IndexConfig(type=args.type, storage=storage, train_min=0))
+    store.checkpoint_rows = args.batch
+    path = tempfile.mkdtemp(prefix="bench_quantization_")
+    for start in range(0, args.n, args.batch):
+        block = vectors[start:start + args.batch]
+        store.add([Document(text=str(start + i), metadata={}) for i in range(len(block))], block)
+        store.save(path)
+    store.wait_for_training()
+    store.checkpoint()
+    grown = rss_bytes() - baseline
+    index_bytes = sum(len(faiss.serialize_index(index)) for index in store._partitions.values())
+
+    results = []
+    for rerank in (0, args.rerank):
+        hits, latencies = 0, []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            docs = store.query(q, k=args.k, rerank=rerank)
+            latencies.append(time.perf_counter() - start)
+            hits += len({int(d.text) for d in docs} & expected)
+        results.append({
+            "rerank": rerank,
+            "recall": hits / (args.k * len(queries)),
+            "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        })
+    print(json.dumps({"storage": storage, "index_bytes": index_bytes, "rss_delta_bytes": grown, "results": results}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="Number of chunks.")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4, help="Candidates per result to re-rank in full precision.")
+    parser.add_argument("--type", default="flat", help="Index type (flat, hnsw, ivf_flat).")
+    parser.add_argument("--storage", default="float32,float16,int8", help="Comma-separated storage modes.")
+    parser.add_argument("--batch", type=int, default=10_000, help="Vectors per add() / save() call.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    raw = args.n * args.dim * 4
+    print(f"{args.n:,} chunks x {args.dim} dims ({args.type}), raw float32 = {raw / 2**30:.2f} GiB, recall@{args.k} vs exact")
+    print(f"{'storage':<10}{'index':>12}{'saved':>8}{'RSS delta':>14}{'rerank':>8}{'recall':>8}{'p50 ms':>9}")
+    reference = None
+    for storage in args.storage.split(","):
+        command = [sys.executable, __file__, "--child", storage] + [
+            f"--{name}={value}" for name, value in (
+                ("n", args.n), ("dim", args.dim), ("queries", args.queries), ("k", args.k),
+                ("rerank", args.rerank), ("type", args.type), ("batch", args.batch),
+            )
+        ]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{storage:<10}{'failed (exit ' + str(proc.returncode) + ')':>14}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        size, delta = result["index_bytes"], result["rss_delta_bytes"]
+        if reference is None and storage == "float32":
+            reference = size
+        saved = f"{1 - size / reference:.0%}" if reference else "-"
+        for row in result["results"]:
+            print(f"{storage:<10}{size / 2**30:>8.2f} GiB{saved:>8}{delta / 2**30:>10.2f} GiB"
+                  f"{row['rerank']:>8}{row['recall']:>8.3f}{row['p50_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
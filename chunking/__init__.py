@@ -1 +1,5 @@
+from .base import BaseChunker
 from .fixed_chunker import Chunker
+from .token_chunker import TokenChunker, SentenceChunker
+from .markdown_chunker import MarkdownChunker
+from .factory import create_chunker, CHUNK_STRATEGIES
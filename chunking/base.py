@@ -0,0 +1,109 @@
+from typing import List, Iterable, Iterator, Tuple, NamedTuple
+from utils import Document, Chunk, Tokenizer, get_tokenizer, logger
+
+
+class Unit(NamedTuple):
+    """A piece of text the token chunkers pack whole: a sentence, a paragraph, a Markdown block."""
+    start: int
+    end: int
+    tokens: int
+    # True when no chunk may span the boundary before this unit (a new section starts here)
+    breaks: bool = False
+
+
+class BaseChunker:
+    """
+    Chunkers are generators over document streams: subclasses only say where the chunks of
+    one text start and end (spans), and every chunk is an offset view of its document.
+    """
+
+    def split(self, documents: List[Document]) -> List[Chunk]:
+        """
+        Split documents into overlapping chunks.
+        """
+        all_chunks = list(self.iter_split(documents))
+        logger.info(f"Split {len(documents)} docs into {len(all_chunks)} chunks")
+        return all_chunks
+
+    def iter_split(self, documents: Iterable[Document]) -> Iterator[Chunk]:
+        """
+        Lazily split a stream of documents, yielding each document's chunks as soon as it arrives.
+        Chunks are offsets into their document and share its metadata (see utils.Chunk).
+        """
+        for doc in documents:
+            for start, end in self.spans(doc.text):
+                yield Chunk(doc, start, end)
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        raise NotImplementedError
+
+
+class TokenBoundedChunker(BaseChunker):
+    """
+    Base of the token-aware chunkers: no chunk is ever longer than max_tokens tokens as counted
+    by the tokenizer the embedding batch planner also uses, so batches can be packed exactly.
+    Subclasses cut text into units; units are packed greedily up to max_tokens, consecutive
+    chunks repeat up to overlap_tokens of trailing units, and a unit too long on its own is cut
+    at token boundaries.
+    """
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 0, tokenizer: Tokenizer = None, model: str = None):
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.tokenizer = tokenizer or get_tokenizer(model)
+
+    def units(self, text: str) -> List[Unit]:
+        raise NotImplementedError
+
+    def _unit(self, text: str, start: int, end: int, breaks: bool = False) -> Unit:
+        return Unit(start, end, self.tokenizer.count(text[start:end]), breaks)
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        chunk: List[Unit] = []
+        tokens = 0
+        for unit in self._fitting(text, self.units(text)):
+            if chunk and (unit.breaks or tokens + unit.tokens > self.max_tokens):
+                yield from self._emit(text, chunk)
+                chunk = [] if unit.breaks else self._overlap(chunk, unit)
+                tokens = sum(u.tokens for u in chunk)
+            chunk.append(unit)
+            tokens += unit.tokens
+        if chunk:
+            yield from self._emit(text, chunk)
+
+    def _fitting(self, text: str, units: Iterable[Unit]) -> Iterator[Unit]:
+        """Units with any over max_tokens cut into token windows."""
+        for unit in units:
+            if unit.tokens <= self.max_tokens:
+                yield unit
+                continue
+            pieces = self.tokenizer.spans(text[unit.start:unit.end], self.max_tokens, offset=unit.start)
+            for i, (start, end) in enumerate(pieces):
+                yield Unit(start, end, self.tokenizer.count(text[start:end]), unit.breaks and i == 0)
+
+    def _overlap(self, chunk: List[Unit], following: Unit) -> List[Unit]:
+        """Trailing units of the previous chunk to repeat, leaving room for the next unit."""
+        budget = min(self.overlap_tokens, self.max_tokens - following.tokens)
+        carried: List[Unit] = []
+        for unit in reversed(chunk):
+            if unit.tokens > budget:
+                break
+            budget -= unit.tokens
+            carried.insert(0, unit)
+        # Repeating the whole previous chunk would make no progress
+        return carried if len(carried) < len(chunk) else []
+
+    def _emit(self, text: str, chunk: List[Unit]) -> Iterator[Tuple[int, int]]:
+        start, end = chunk[0].start, chunk[-1].end
+        # Trim surrounding whitespace so chunks start and end on content
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            return
+        # Unit counts usually add up exactly; when a tokenizer merges across a boundary, re-cut
+        if self.tokenizer.count(text[start:end]) > self.max_tokens:
+            yield from self.tokenizer.spans(text[start:end], self.max_tokens, offset=start)
+            return
+        yield start, end
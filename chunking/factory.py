@@ -0,0 +1,23 @@
+from .base import BaseChunker
+from .fixed_chunker import Chunker
+from .token_chunker import TokenChunker, SentenceChunker
+from .markdown_chunker import MarkdownChunker
+
+CHUNK_STRATEGIES = ("fixed", "sentence", "token", "markdown")
+
+
+def create_chunker(strategy: str = "fixed", chunk_size: int = 500, chunk_overlap: int = 100,
+                   max_tokens: int = 256, overlap_tokens: int = 0, model: str = None) -> BaseChunker:
+    """
+    Chunker for a strategy: "fixed" cuts chunk_size characters overlapping by chunk_overlap;
+    the others never exceed max_tokens tokens of the embedding model's tokenizer.
+    """
+    if strategy == "fixed":
+        return Chunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if strategy == "sentence":
+        return SentenceChunker(max_tokens, overlap_tokens, model=model)
+    if strategy == "token":
+        return TokenChunker(max_tokens, overlap_tokens, model=model)
+    if strategy == "markdown":
+        return MarkdownChunker(max_tokens, overlap_tokens, model=model)
+    raise ValueError(f"Unknown chunking strategy '{strategy}'; expected one of {', '.join(CHUNK_STRATEGIES)}")
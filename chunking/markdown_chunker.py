@@ -0,0 +1,106 @@
+import re
+from typing import List, Tuple
+from .base import TokenBoundedChunker, Unit
+from .token_chunker import sentence_bounds
+
+HEADING = re.compile(r"^(#{1,6})\s")
+RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def markdown_blocks(text: str) -> List[Tuple[int, int, str, int]]:
+    """
+    (start, end, kind, heading level) of the blocks of a Markdown text, kind being "heading",
+    "rule" or "text" (paragraphs, lists, tables and fenced code, which is never split).
+    Blocks are contiguous: each runs up to the start of the next one.
+    """
+    blocks = []
+    pos = 0
+    current = None  # start of the open text block
+    fence = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if fence:
+            if stripped.startswith(fence):
+                fence = None
+        elif FENCE.match(line):
+            fence = FENCE.match(line).group(1)
+            if current is None:
+                current = pos
+        elif HEADING.match(line) or RULE.match(line):
+            if current is not None:
+                blocks.append([current, pos, "text", 0])
+                current = None
+            heading = HEADING.match(line)
+            blocks.append([pos, pos + len(line), "heading" if heading else "rule", len(heading.group(1)) if heading else 0])
+        elif not stripped:
+            if current is not None:
+                blocks.append([current, pos, "text", 0])
+                current = None
+        elif current is None:
+            current = pos
+        pos += len(line)
+    if current is not None:
+        blocks.append([current, pos, "text", 0])
+
+    # Close the gaps (blank lines) so consecutive blocks are contiguous
+    for block, following in zip(blocks, blocks[1:]):
+        block[1] = following[0]
+    if blocks:
+        blocks[-1][1] = len(text)
+    return [tuple(b) for b in blocks]
+
+
+class MarkdownChunker(TokenBoundedChunker):
+    """
+    Structure-aware chunks for Markdown such as scraper/pipelines.MarkdownPipeline produces.
+    Headings up to split_level (## by default, one crawled page each) and horizontal rules
+    start a new chunk; a heading is kept with the block that follows it; paragraphs, lists and
+    code blocks are packed whole, and only a block above max_tokens is cut, between sentences.
+    """
+
+    def __init__(self, max_tokens: int = 256, overlap_tokens: int = 0, split_level: int = 2, **kwargs):
+        super().__init__(max_tokens, overlap_tokens, **kwargs)
+        self.split_level = split_level
+
+    def units(self, text: str) -> List[Unit]:
+        units: List[Unit] = []
+        breaks = False
+        heading = None  # pending heading unit, glued to the next block
+        for start, end, kind, level in markdown_blocks(text):
+            if kind == "rule":
+                if heading is not None:
+                    units.append(heading)
+                    heading = None
+                breaks = True
+                continue
+            if kind == "heading":
+                unit = self._unit(text, start, end, breaks or level <= self.split_level)
+                # Sub-headings of an open heading stay with it (e.g. "## URL" then "### Headings")
+                if heading is not None and not unit.breaks and heading.tokens + unit.tokens <= self.max_tokens:
+                    heading = heading._replace(end=end, tokens=heading.tokens + unit.tokens)
+                else:
+                    if heading is not None:
+                        units.append(heading)
+                    heading = unit
+                breaks = False
+                continue
+
+            block = self._unit(text, start, end, breaks)
+            breaks = False
+            if block.tokens > self.max_tokens:
+                pieces = [self._unit(text, s, e) for s, e in sentence_bounds(text, start, end)]
+                pieces[0] = pieces[0]._replace(breaks=block.breaks)
+            else:
+                pieces = [block]
+            if heading is not None:
+                first = pieces[0]
+                if heading.tokens + first.tokens <= self.max_tokens:
+                    pieces[0] = Unit(heading.start, first.end, heading.tokens + first.tokens, heading.breaks or first.breaks)
+                else:
+                    units.append(heading)
+                heading = None
+            units.extend(pieces)
+        if heading is not None:
+            units.append(heading)
+        return units
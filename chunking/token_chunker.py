@@ -0,0 +1,36 @@
+import re
+from typing import List, Iterator, Tuple
+from .base import TokenBoundedChunker, Unit
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace;
+# or a blank line, which ends a paragraph (and a heading or list item without a full stop)
+SENTENCE_END = re.compile(r"[.!?…。！？]+[\"'”’)\]]*\s+|\n\s*\n")
+
+
+def sentence_bounds(text: str, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    """Contiguous sentence spans covering text[start:end], each keeping its trailing whitespace."""
+    end = len(text) if end is None else end
+    bounds = []
+    for match in SENTENCE_END.finditer(text, start, end):
+        if match.end() > start:
+            bounds.append((start, match.end()))
+            start = match.end()
+    if start < end:
+        bounds.append((start, end))
+    return bounds
+
+
+class TokenChunker(TokenBoundedChunker):
+    """Fixed windows of max_tokens tokens, overlapping by overlap_tokens, cut at token boundaries."""
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        for start, end in self.tokenizer.spans(text, self.max_tokens, self.overlap_tokens):
+            if text[start:end].strip():
+                yield start, end
+
+
+class SentenceChunker(TokenBoundedChunker):
+    """Whole sentences packed up to max_tokens; only a sentence longer than that is cut mid-way."""
+
+    def units(self, text: str) -> List[Unit]:
+        return [self._unit(text, start, end) for start, end in sentence_bounds(text)]
@@ -1 +1 @@
-from .config import LLMConfig, EmbeddingConfig, Settings, get_settings
+from .config import LLMConfig, EmbeddingConfig, IndexConfig, ChunkingConfig, Settings, get_settings
@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 from dotenv import load_dotenv
 
@@ -14,6 +14,7 @@ class LLMConfig:
     temperature: float
     max_tokens: Optional[int]
     api_version: Optional[str] = None
+    max_concurrency: int = 4    # generations in flight at once for batch queries
 
 @dataclass
 class EmbeddingConfig:
@@ -22,6 +23,34 @@ class EmbeddingConfig:
     api_key: Optional[str]
     base_url: Optional[str]
     api_version: Optional[str] = None
+    batch_size: int = 256       # max texts per embeddings request
+    batch_tokens: int = 100000  # max (estimated) tokens per embeddings request
+    max_concurrency: int = 4    # embeddings requests in flight at once
+    max_retries: int = 6        # retries per request on 429 / transient errors
+    cache_path: Optional[str] = None  # SQLite embedding cache; None disables it
+    cache_max_mb: int = 1024
+    query_batch_size: int = 32        # concurrent API queries embedded in one call
+    query_batch_wait_ms: float = 5.0  # how long the first query of a batch waits for others
+
+@dataclass
+class IndexConfig:
+    type: str = "flat"          # flat | hnsw | ivf_flat | ivf_pq
+    train_min: int = 20000      # partitions stay exact (flat) until they hold this many chunks
+    hnsw_m: int = 32            # HNSW graph degree
+    ef_construction: int = 40
+    ef_search: int = 64         # default per-query HNSW search depth
+    nlist: int = 0              # IVF lists; 0 picks ~4*sqrt(n) when the partition is trained
+    nprobe: int = 16            # default per-query IVF lists visited
+    pq_m: int = 16              # IVF-PQ sub-quantizers (must divide the embedding dimension)
+    pq_bits: int = 8
+    storage: str = "float32"    # float32 | float16 | int8: how flat / HNSW / IVF-Flat hold vectors in RAM
+    rerank: int = 0             # re-score the top k * rerank candidates with full-precision vectors (0 = off)
+
+@dataclass
+class ChunkingConfig:
+    strategy: str = "fixed"     # fixed | sentence | token | markdown
+    max_tokens: int = 256       # hard cap per chunk for the token-aware strategies
+    overlap_tokens: int = 32    # tokens repeated between consecutive chunks
 
 @dataclass
 class Settings:
@@ -29,6 +58,15 @@ class Settings:
     embedding: EmbeddingConfig
     vector_db_path: str
     api_token: Optional[str]
+    index: IndexConfig = field(default_factory=IndexConfig)
+    chunking: ChunkingConfig = field(default_factory=ChunkingConfig)
+    worker_threads: int = 8     # API pool for blocking work (parsing, chunking, FAISS, saving)
+    pdf_workers: int = 0        # processes extracting PDF pages in parallel; 0 = one per CPU
+    store_flush_interval: float = 1.0  # API: seconds a published change may wait to be saved
+    store_role: str = "writer"         # API: "writer" (ingests and queries) or "reader" (read-only replica)
+    store_poll_interval: float = 1.0   # API readers: seconds between checks for the writer's changes
+    ingest_workers: int = 2            # API: ingest jobs processed at once
+    ingest_queue_depth: int = 100      # API: ingest jobs allowed to wait; more are rejected with 429
 
 def get_settings() -> Settings:
     llm_provider = os.getenv("LLM_PROVIDER", "openai")
@@ -40,8 +78,11 @@ def get_settings() -> Settings:
         temperature=float(os.getenv("LLM_TEMPERATURE", "0.0")),
         max_tokens=int(os.getenv("LLM_MAX_TOKENS", "1000")) if os.getenv("LLM_MAX_TOKENS") else None,
         api_version=os.getenv("LLM_API_VERSION") or os.getenv("AZURE_OPENAI_API_VERSION"),
+        max_concurrency=int(os.getenv("LLM_CONCURRENCY", "4")),
     )
 
+    vector_db_path = os.getenv("VECTOR_DB_PATH", "storage")
+
     embed_provider = os.getenv("EMBEDDING_PROVIDER", "openai")
     embedding_config = EmbeddingConfig(
         provider=embed_provider,
@@ -49,11 +90,49 @@ def get_settings() -> Settings:
         api_key=os.getenv("EMBEDDING_API_KEY") or os.getenv("AZURE_OPENAI_API_KEY"),
         base_url=os.getenv("EMBEDDING_BASE_URL") or os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_version=os.getenv("EMBEDDING_API_VERSION") or os.getenv("AZURE_OPENAI_API_VERSION"),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "256")),
+        batch_tokens=int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000")),
+        max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", "4")),
+        max_retries=int(os.getenv("EMBEDDING_MAX_RETRIES", "6")),
+        # Set EMBEDDING_CACHE_PATH to an empty string to disable the cache
+        cache_path=os.getenv("EMBEDDING_CACHE_PATH", os.path.join(vector_db_path, "embedding_cache.sqlite3")) or None,
+        cache_max_mb=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")),
+        query_batch_size=int(os.getenv("EMBEDDING_QUERY_BATCH_SIZE", "32")),
+        query_batch_wait_ms=float(os.getenv("EMBEDDING_QUERY_BATCH_WAIT_MS", "5")),
+    )
+
+    index_config = IndexConfig(
+        type=os.getenv("VECTOR_INDEX_TYPE", "flat").lower(),
+        train_min=int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "20000")),
+        hnsw_m=int(os.getenv("VECTOR_INDEX_HNSW_M", "32")),
+        ef_construction=int(os.getenv("VECTOR_INDEX_EF_CONSTRUCTION", "40")),
+        ef_search=int(os.getenv("VECTOR_INDEX_EF_SEARCH", "64")),
+        nlist=int(os.getenv("VECTOR_INDEX_NLIST", "0")),
+        nprobe=int(os.getenv("VECTOR_INDEX_NPROBE", "16")),
+        pq_m=int(os.getenv("VECTOR_INDEX_PQ_M", "16")),
+        pq_bits=int(os.getenv("VECTOR_INDEX_PQ_BITS", "8")),
+        storage=os.getenv("VECTOR_STORAGE", "float32").lower(),
+        rerank=int(os.getenv("VECTOR_RERANK", "0")),
+    )
+
+    chunking_config = ChunkingConfig(
+        strategy=os.getenv("CHUNK_STRATEGY", "fixed").lower(),
+        max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", "256")),
+        overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32")),
     )
 
     return Settings(
         llm=llm_config, 
         embedding=embedding_config,
-        vector_db_path=os.getenv("VECTOR_DB_PATH", "storage"),
-        api_token=os.getenv("API_TOKEN")
+        vector_db_path=vector_db_path,
+        api_token=os.getenv("API_TOKEN"),
+        index=index_config,
+        chunking=chunking_config,
+        worker_threads=int(os.getenv("WORKER_THREADS", "8")),
+        pdf_workers=int(os.getenv("PDF_WORKERS", "0")),
+        store_flush_interval=float(os.getenv("STORE_FLUSH_INTERVAL", "1.0")),
+        store_role=os.getenv("STORE_ROLE", "writer").lower(),
+        store_poll_interval=float(os.getenv("STORE_POLL_INTERVAL", "1.0")),
+        ingest_workers=int(os.getenv("INGEST_WORKERS", "2")),
+        ingest_queue_depth=int(os.getenv("INGEST_QUEUE_DEPTH", "100")),
     )
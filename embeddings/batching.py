@@ -0,0 +1,87 @@
+import time
+import random
+import threading
+from typing import List, Tuple, Callable, Optional
+import openai
+from utils.tokens import get_tokenizer
+
+# Status codes worth retrying: rate limits, timeouts and transient server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def token_counter(model: str) -> Callable[[str], int]:
+    """Token counting function for a model; exact with tiktoken, a conservative estimate without."""
+    return get_tokenizer(model).count
+
+
+def plan_batches(texts: List[str], max_items: int, max_tokens: int,
+                 count_tokens: Callable[[str], int]) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Split texts into contiguous [start, end) ranges of at most max_items texts and max_tokens
+    tokens each. A single text above max_tokens gets a batch of its own.
+    Returns the ranges and the tokens of all the texts.
+    """
+    batches = []
+    start, tokens, total = 0, 0, 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text)
+        if i > start and (i - start >= max_items or tokens + n > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += n
+        total += n
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches, total
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def is_rate_limited(error: Exception) -> bool:
+    return isinstance(error, openai.APIStatusError) and error.status_code == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked to wait (retry-after-ms / Retry-After headers), if it said."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form; fall back to exponential backoff
+    return None
+
+
+def backoff_delay(attempt: int, error: Exception, base: float = 1.0, cap: float = 60.0) -> float:
+    """Server-provided Retry-After if present, otherwise exponential backoff with full jitter."""
+    hinted = retry_after(error)
+    if hinted is not None:
+        return min(hinted, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class Throttle:
+    """
+    Cool-down shared by all in-flight requests of a service: after a 429 every worker waits,
+    instead of each one hammering the provider until it gets its own 429.
+    """
+
+    def __init__(self):
+        self._until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self._until - time.monotonic())
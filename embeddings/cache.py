@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional, Dict
+import numpy as np
+from utils import logger
+
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 500
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache in a local SQLite file.
+    Entries are keyed by (provider, model, sha256 of the text) and evicted least recently used
+    first once the stored vectors exceed max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, model, hash)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._entries, self._bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        logger.info(f"Embedding cache at {path}: {self._entries} entries, {self._bytes / 2**20:.1f} MiB")
+
+    def get_many(self, provider: str, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector for each text (None for misses), looked up in a few batched queries."""
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), _MAX_PARAMS):
+                chunk = unique[start:start + _MAX_PARAMS]
+                rows = self._db.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE provider = ? AND model = ? "
+                    f"AND hash IN ({','.join('?' * len(chunk))})",
+                    [provider, model, *chunk],
+                ).fetchall()
+                found.update((h, np.frombuffer(v, dtype="<f4")) for h, v in rows)
+            if found:
+                self._touch(provider, model, list(found))
+            results = [found.get(h) for h in hashes]
+            hits = sum(r is not None for r in results)
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return results
+
+    def _touch(self, provider: str, model: str, hashes: List[bytes]):
+        now = time.time()
+        self._db.executemany(
+            "UPDATE embeddings SET last_used = ? WHERE provider = ? AND model = ? AND hash = ?",
+            [(now, provider, model, h) for h in hashes],
+        )
+
+    def put_many(self, provider: str, model: str, texts: List[str], vectors: np.ndarray):
+        now = time.time()
+        rows = {
+            text_hash(t): np.ascontiguousarray(v, dtype="<f4").tobytes()
+            for t, v in zip(texts, vectors)
+        }
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for h, blob in rows.items():
+                    replaced = self._db.execute(
+                        "SELECT LENGTH(vector) FROM embeddings WHERE provider = ? AND model = ? AND hash = ?",
+                        (provider, model, h),
+                    ).fetchone()
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (provider, model, hash, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                        (provider, model, h, blob, now),
+                    )
+                    if replaced:
+                        self._bytes -= replaced[0]
+                    else:
+                        self._entries += 1
+                    self._bytes += len(blob)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        while self._bytes > target and self._entries:
+            rows = self._db.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT ?", (_MAX_PARAMS,)
+            ).fetchall()
+            take = []
+            for rowid, size in rows:
+                if self._bytes <= target:
+                    break
+                take.append(rowid)
+                self._bytes -= size
+                self._entries -= 1
+            self._db.execute(f"DELETE FROM embeddings WHERE rowid IN ({','.join('?' * len(take))})", take)
+            evicted += len(take)
+        logger.info(f"Evicted {evicted} entries from the embedding cache")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,75 @@
+import time
+import asyncio
+from typing import List, Tuple, Callable, Awaitable
+import numpy as np
+from utils import logger, Histogram
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent single-text embedding requests into one embed call.
+    The first request of a batch opens a window of max_wait_ms; the batch is sent when the
+    window closes or max_batch texts are waiting, whichever comes first, and every caller
+    gets its own row back. Batches run concurrently, so a slow batch never holds the next one.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Awaitable[np.ndarray]], max_batch: int = 32, max_wait_ms: float = 5.0):
+        self._embed = embed
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer = None
+        self._tasks = set()
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+
+    async def embed(self, text: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, queued in batch:
+            self.wait_ms.observe((now - queued) * 1000)
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        try:
+            vectors = await self._embed([text for text, _, _ in batch])
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(batch)} queries failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), vector in zip(batch, vectors):
+            # Callers that gave up (client disconnected) have a cancelled future
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
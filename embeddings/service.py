@@ -1,25 +1,54 @@
-from typing import List
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import List, Optional, Iterable, Iterator, AsyncIterator, Tuple
 import numpy as np
-from openai import OpenAI, AzureOpenAI
-from sentence_transformers import SentenceTransformer
+from openai import OpenAI, AzureOpenAI, AsyncOpenAI, AsyncAzureOpenAI
 from config import EmbeddingConfig
-from utils import logger
+from utils import logger, run_blocking, Document
+from .batching import token_counter, plan_batches, is_retryable, is_rate_limited, backoff_delay, Throttle
+from .cache import EmbeddingCache
+from .microbatch import QueryBatcher
 
 class EmbeddingService:
     def __init__(self, config: EmbeddingConfig):
         self.config = config
         self.client = None
+        self.async_client = None
         self.model = None
+        # Requests in flight are bounded by this pool (sync) or semaphore (async), shared by every caller
+        self._executor = None
+        self._semaphore = None
+        self._throttle = Throttle()
+        self._count_tokens = token_counter(config.model)
+        # Tokens of the texts sent to the OpenAI/Azure API, as counted when batching them
+        self.tokens_sent = 0
+        self.cache = None
+        if config.cache_path and config.provider != "mock":
+            self.cache = EmbeddingCache(config.cache_path, config.cache_max_mb * 2**20)
+        self.query_batcher = QueryBatcher(self.aembed, config.query_batch_size, config.query_batch_wait_ms)
 
+        # Retries are handled by _retry_delay so rate-limit backoff is shared across batches
         if config.provider == "openai":
-            self.client = OpenAI(api_key=config.api_key, base_url=config.base_url)
+            self.client = OpenAI(api_key=config.api_key, base_url=config.base_url, max_retries=0)
+            self.async_client = AsyncOpenAI(api_key=config.api_key, base_url=config.base_url, max_retries=0)
         elif config.provider == "azure":
             self.client = AzureOpenAI(
                 api_key=config.api_key,
                 api_version=config.api_version,
-                azure_endpoint=config.base_url
+                azure_endpoint=config.base_url,
+                max_retries=0
+            )
+            self.async_client = AsyncAzureOpenAI(
+                api_key=config.api_key,
+                api_version=config.api_version,
+                azure_endpoint=config.base_url,
+                max_retries=0
             )
         elif config.provider == "huggingface":
+            # Imported here: torch is only loaded by processes that run a local model
+            from sentence_transformers import SentenceTransformer
             logger.info(f"Loading local embedding model: {config.model}")
             self.model = SentenceTransformer(config.model)
         elif config.provider == "mock":
@@ -27,20 +56,189 @@ class EmbeddingService:
         else:
             raise ValueError(f"Unsupported embedding provider: {config.provider}")
 
-    def embed(self, texts: List[str]) -> List[List[float]]:
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into an (n, dimension) float32 matrix, rows in the order of texts.
+        With a cache, the whole batch is looked up first and only the misses reach the model.
+        """
+        if self.cache is None or not texts:
+            return self._embed_uncached(texts)
+
+        cached = self.cache.get_many(self.config.provider, self.config.model, texts)
+        missing = self._misses(texts, cached)
+        fresh = None
+        if missing:
+            fresh = self._embed_uncached(missing)
+            self.cache.put_many(self.config.provider, self.config.model, missing, fresh)
+        return self._merge(texts, cached, missing, fresh)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """Async counterpart of embed(): remote calls use the async client, local work the shared executor."""
+        if self.cache is None or not texts:
+            return await self._aembed_uncached(texts)
+
+        cached = await run_blocking(self.cache.get_many, self.config.provider, self.config.model, texts)
+        missing = self._misses(texts, cached)
+        fresh = None
+        if missing:
+            fresh = await self._aembed_uncached(missing)
+            await run_blocking(self.cache.put_many, self.config.provider, self.config.model, missing, fresh)
+        return self._merge(texts, cached, missing, fresh)
+
+    def _group_size(self) -> int:
+        # Enough texts to keep every concurrent embeddings request busy
+        return self.config.batch_size * self.config.max_concurrency
+
+    def embed_stream(self, documents: Iterable[Document]) -> Iterator[Tuple[List[Document], np.ndarray]]:
+        """
+        Embed a stream of chunks group by group, yielding (chunks, vectors) for each group,
+        so only one group is held here while upstream extraction and chunking keep going.
+        """
+        documents = iter(documents)
+        while True:
+            group = list(islice(documents, self._group_size()))
+            if not group:
+                return
+            yield group, self.embed([d.text for d in group])
+
+    async def aembed_stream(self, documents: Iterator[Document]) -> AsyncIterator[Tuple[List[Document], np.ndarray]]:
+        """
+        Async counterpart of embed_stream(). The blocking upstream iterator is advanced on the
+        shared executor, and the next group is pulled while the current one is being embedded.
+        """
+        documents = iter(documents)
+        size = self._group_size()
+        pending = asyncio.ensure_future(run_blocking(lambda: list(islice(documents, size))))
+        try:
+            while True:
+                group = await pending
+                if not group:
+                    return
+                pending = asyncio.ensure_future(run_blocking(lambda: list(islice(documents, size))))
+                yield group, await self.aembed([d.text for d in group])
+        finally:
+            # Never abandon the iterator while a prefetch is still advancing it
+            if not pending.done():
+                await asyncio.gather(pending, return_exceptions=True)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        """Embed one query, batched with queries arriving concurrently from other requests."""
+        return await self.query_batcher.embed(text)
+
+    def _misses(self, texts: List[str], cached: List[Optional[np.ndarray]]) -> List[str]:
+        # Texts repeated within the batch are embedded once
+        return list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+
+    def _merge(self, texts: List[str], cached: List[Optional[np.ndarray]], missing: List[str], fresh: np.ndarray) -> np.ndarray:
+        if not missing:
+            logger.info(f"Embedding cache: all {len(texts)} texts cached")
+            return np.vstack(cached)
+        logger.info(f"Embedding cache: {len(texts) - sum(v is None for v in cached)} hits, {len(missing)} texts embedded")
+        rows = dict(zip(missing, fresh))
+        return np.vstack([v if v is not None else rows[t] for t, v in zip(texts, cached)])
+
+    def _embed_uncached(self, texts: List[str]) -> np.ndarray:
         if self.config.provider in ["openai", "azure"]:
-            response = self.client.embeddings.create(
-                input=texts,
-                model=self.config.model
-            )
-            return [data.embedding for data in response.data]
-        
+            return self._embed_batched(texts)
+
         elif self.config.provider == "huggingface":
-            embeddings = self.model.encode(texts)
-            return embeddings.tolist()
-        
+            return np.asarray(self.model.encode(texts), dtype="float32")
+
         elif self.config.provider == "mock":
             # Return random but consistent-sized embeddings (e.g., 384 dims)
-            return [[0.1] * 384 for _ in texts]
-        
-        return []
+            return np.full((len(texts), 384), 0.1, dtype="float32")
+
+        return np.empty((0, 0), dtype="float32")
+
+    async def _aembed_uncached(self, texts: List[str]) -> np.ndarray:
+        if self.config.provider in ["openai", "azure"]:
+            return await self._aembed_batched(texts)
+        # Local models are CPU-bound
+        return await run_blocking(self._embed_uncached, texts)
+
+    def _batches(self, texts: List[str]):
+        batches, tokens = plan_batches(texts, self.config.batch_size, self.config.batch_tokens, self._count_tokens)
+        self.tokens_sent += tokens
+        return batches
+
+    def _embed_batched(self, texts: List[str]) -> np.ndarray:
+        """
+        Split texts into count- and token-bounded batches and embed them concurrently,
+        at most config.max_concurrency requests at a time.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        batches = self._batches(texts)
+        if len(batches) == 1:
+            return self._embed_batch(texts)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.config.max_concurrency, thread_name_prefix="embed")
+        start = time.perf_counter()
+        # map() yields in submission order, so rows line up with texts
+        results = list(self._executor.map(lambda batch: self._embed_batch(texts[batch[0]:batch[1]]), batches))
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches in {time.perf_counter() - start:.1f}s")
+        return np.vstack(results)
+
+    async def _aembed_batched(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+        batches = self._batches(texts)
+        start = time.perf_counter()
+        # gather() returns results in argument order, so rows line up with texts
+        results = await asyncio.gather(*(self._aembed_batch(texts[lo:hi]) for lo, hi in batches))
+        if len(batches) > 1:
+            logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches in {time.perf_counter() - start:.1f}s")
+        return np.vstack(results)
+
+    def _vectors(self, response) -> np.ndarray:
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.asarray([item.embedding for item in data], dtype="float32")
+
+    def _retry_delay(self, error: Exception, attempt: int, count: int) -> float:
+        """
+        Seconds to sleep before retrying a failed request, or re-raise if it should not be retried.
+        A rate limit pauses every in-flight request through the shared throttle instead.
+        """
+        if attempt >= self.config.max_retries or not is_retryable(error):
+            raise error
+        delay = backoff_delay(attempt, error)
+        logger.warning(f"Embedding request for {count} texts failed ({error.__class__.__name__}), retry {attempt + 1} in {delay:.1f}s")
+        if is_rate_limited(error):
+            self._throttle.pause(delay)
+            return 0.0
+        return delay
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """One embeddings request, retried with backoff on rate limits and transient errors."""
+        attempt = 0
+        while True:
+            time.sleep(self._throttle.remaining())
+            try:
+                response = self.client.embeddings.create(
+                    input=texts,
+                    model=self.config.model
+                )
+                return self._vectors(response)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, len(texts))
+            attempt += 1
+            time.sleep(delay)
+
+    async def _aembed_batch(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            await asyncio.sleep(self._throttle.remaining())
+            async with self._semaphore:
+                try:
+                    response = await self.async_client.embeddings.create(
+                        input=texts,
+                        model=self.config.model
+                    )
+                    return self._vectors(response)
+                except Exception as e:
+                    delay = self._retry_delay(e, attempt, len(texts))
+            attempt += 1
+            await asyncio.sleep(delay)
@@ -1 +1,6 @@
-from .pdf_ingestor import DocumentIngestor
+from .pdf_ingestor import DocumentIngestor, FileDone
+from .jobs import IngestJob, IngestJobQueue, QueueFull
+# ingestion.directory is imported explicitly: it pulls in embeddings and the vector store,
+# which the spawned extraction workers (importing this package) should not have to load.
+# Workers also re-import the parent's main module, so api_main.py and main.py only import
+# or build those services once they run, not at import
@@ -0,0 +1,215 @@
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from chunking import BaseChunker
+from embeddings import EmbeddingService
+from vectorstore import VectorStore
+from config import IndexConfig
+from utils import logger, Document
+
+# Rejected records reported back in detail; the rest are only counted
+MAX_REPORTED_ERRORS = 20
+# Content hash registered with a document's first group, until the group holding its last chunk
+# commits the real hash: a document left half-stored by a failure is never taken as unchanged
+WRITING = "writing"
+
+# write(chunks, embeddings, content_hashes, replaces): add one batch, deleting the previous
+# chunks of the documents in replaces first, and commit it
+BatchWriter = Callable[[List[Document], np.ndarray, Dict[str, str], List[str]], None]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def parse_record(line: Union[str, bytes], collection: str = None) -> Document:
+    """
+    One NDJSON record {document_id, text, collection, metadata} as a Document carrying the
+    same metadata /ingest_text gives its chunks. Raises ValueError on a malformed record.
+    """
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("a record must be a JSON object")
+    document_id, text = record.get("document_id"), record.get("text")
+    if not isinstance(document_id, str) or not document_id:
+        raise ValueError("document_id must be a non-empty string")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text must be a non-empty string")
+    extra = record.get("metadata") or {}
+    if not isinstance(extra, dict):
+        raise ValueError("metadata must be an object")
+
+    metadata = {"source": "pdf_upload", **extra, "document_id": document_id}
+    collection = record.get("collection") or collection
+    if collection:
+        metadata["collection"] = collection
+    return Document(text=text, metadata=metadata)
+
+
+class BulkProgress:
+    """Counters for a bulk ingest, logged every `interval` seconds and reported by /jobs/{id}."""
+
+    def __init__(self, interval: float = 5.0):
+        self.documents = 0   # records accepted
+        self.unchanged = 0   # records whose document is already stored with the same text
+        self.rejected = 0    # malformed or repeated records
+        self.chunks = 0
+        self.embedded = 0
+        self.errors: List[dict] = []
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def reject(self, line: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+    def rates(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return f"{60 * self.documents / elapsed:.0f} documents/min, {self.embedded / elapsed:.1f} chunks/s"
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            logger.info(f"Bulk ingest: {self.documents} documents, {self.embedded}/{self.chunks} chunks embedded, "
+                        f"{self.unchanged} unchanged, {self.rejected} rejected; {self.rates()}")
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.documents} documents ingested, {self.unchanged} unchanged skipped, {self.rejected} rejected: "
+                f"{self.chunks} chunks in {elapsed:.1f}s ({self.rates()})")
+
+    def to_dict(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "documents": self.documents,
+            "unchanged": self.unchanged,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "embedded_chunks": self.embedded,
+            "documents_per_min": round(60 * self.documents / elapsed, 1),
+            "errors": self.errors,
+        }
+
+
+class BulkIngestor:
+    """
+    Ingest a stream of NDJSON records. Records are chunked as they are read, and chunks of
+    consecutive documents are packed into the same embedding groups (EMBEDDING_BATCH_SIZE x
+    EMBEDDING_CONCURRENCY chunks), so small documents do not each cost an embedding call or a
+    save. A writer thread commits each group while the next one is embedded. A document that is
+    already stored with the same text is skipped; one stored with a different text is replaced.
+    Groups committed before a failure stay committed; a document only partly committed keeps
+    the WRITING hash and is replaced by the next run.
+    """
+
+    def __init__(self, embed_svc: EmbeddingService, chunker: BaseChunker, write: BatchWriter,
+                 lookup: Callable[[str], Optional[dict]] = None, collection: str = None,
+                 progress: BulkProgress = None):
+        self.embed_svc = embed_svc
+        self.chunker = chunker
+        self.write = write
+        # document_id -> its registry entry in the store (VectorStore.document_info), or None
+        self.lookup = lookup or (lambda document_id: None)
+        self.collection = collection
+        self.progress = progress or BulkProgress()
+
+    def _documents(self, lines: Iterable[Union[str, bytes]]) -> Iterator[Tuple[Document, str, bool]]:
+        """(document, content hash, whether it replaces a stored version) for each record to ingest."""
+        seen = set()
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                doc = parse_record(line, self.collection)
+            except ValueError as e:
+                self.progress.reject(number, str(e))
+                continue
+            document_id = doc.metadata["document_id"]
+            if document_id in seen:
+                self.progress.reject(number, f"document_id {document_id} repeats an earlier record")
+                continue
+            seen.add(document_id)
+            content_hash = text_hash(doc.text)
+            stored = self.lookup(document_id)
+            if stored is not None and stored["content_hash"] == content_hash:
+                self.progress.unchanged += 1
+                continue
+            self.progress.documents += 1
+            yield doc, content_hash, stored is not None
+
+    def run(self, lines: Iterable[Union[str, bytes]]) -> BulkProgress:
+        progress = self.progress
+        config = self.embed_svc.config
+        group_size = config.batch_size * config.max_concurrency
+        buffer: List[Document] = []
+        hashes: Dict[str, str] = {}
+        replaces: List[str] = []
+        writes = deque()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-writer") as writer:
+            def flush():
+                nonlocal buffer, hashes, replaces
+                if buffer:
+                    embeddings = self.embed_svc.embed([c.text for c in buffer])
+                    progress.embedded += len(buffer)
+                    writes.append(writer.submit(self.write, buffer, embeddings, hashes, replaces))
+                buffer, hashes, replaces = [], {}, []
+                # One group being written while the next is embedded; wait for anything older
+                while len(writes) > 1:
+                    writes.popleft().result()
+                progress.maybe_report()
+
+            for doc, content_hash, replaced in self._documents(lines):
+                document_id = doc.metadata["document_id"]
+                chunks = 0
+                for chunk in self.chunker.iter_split([doc]):
+                    if len(buffer) >= group_size:
+                        flush()
+                    if not chunks:
+                        # The previous version is deleted with the group holding the first chunk
+                        hashes[document_id] = WRITING
+                        if replaced:
+                            replaces.append(document_id)
+                    buffer.append(chunk)
+                    chunks += 1
+                    progress.chunks += 1
+                if chunks:
+                    # Groups are flushed before a chunk is added, so the buffer holds the last one
+                    hashes[document_id] = content_hash
+            flush()
+            while writes:
+                writes.popleft().result()
+        return progress
+
+
+class StoreBatchWriter:
+    """BatchWriter over a store directory, for the CLI: each batch is one writer turn and one save."""
+
+    def __init__(self, store_path: str, index_config: IndexConfig = None):
+        self.store_path = store_path
+        self.index_config = index_config
+        self.store: Optional[VectorStore] = None
+        if VectorStore.exists(store_path):
+            self.store = VectorStore.load(store_path, index_config)
+
+    def lookup(self, document_id: str) -> Optional[dict]:
+        return self.store.document_info(document_id) if self.store is not None else None
+
+    def __call__(self, chunks: List[Document], embeddings: np.ndarray, content_hashes: Dict[str, str], replaces: List[str]):
+        if self.store is None:
+            self.store = VectorStore(embeddings.shape[1], self.index_config)
+        with self.store.writer():
+            for document_id in replaces:
+                self.store.delete_by_metadata("document_id", document_id)
+            self.store.add(chunks, embeddings, content_hashes)
+        self.store.save(self.store_path)
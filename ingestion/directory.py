@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterable, Iterator, Optional, Union
+import numpy as np
+from chunking import Chunker, BaseChunker
+from embeddings import EmbeddingService
+from vectorstore import VectorStore
+from config import IndexConfig
+from utils import logger, Document
+from .pdf_ingestor import DocumentIngestor, FileDone
+
+LEDGER_FILE = "ingested_files.json"
+PDF_EXTENSIONS = (".pdf",)
+
+
+def find_files(path: str, extensions=PDF_EXTENSIONS) -> List[str]:
+    """The file itself, or every matching file under a directory (recursively, sorted)."""
+    path = os.path.abspath(path)
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(extensions))
+    return found
+
+
+def file_hash(path: str, block: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(block), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class IngestLedger:
+    """
+    Files ingested into a store, kept next to it in ingested_files.json and keyed by absolute
+    path: size, mtime and SHA-256 at ingest time, plus whether the file was fully written.
+    A file is skipped when its size and mtime are unchanged or, failing that, its hash is.
+    """
+
+    def __init__(self, store_path: str):
+        self.path = os.path.join(store_path, LEDGER_FILE)
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def unchanged(self, path: str) -> bool:
+        entry = self.files.get(path)
+        if not entry or entry.get("status") != "done":
+            return False
+        stat = os.stat(path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if entry["size"] == stat.st_size and entry["sha256"] == file_hash(path):
+            # Touched but identical (copied, checked out again): remember the new mtime
+            entry["mtime_ns"] = stat.st_mtime_ns
+            return True
+        return False
+
+    def start(self, path: str):
+        """Record that chunks of path are about to be written, before they are."""
+        stat = os.stat(path)
+        self.files[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_hash(path),
+            "status": "writing",
+            "chunks": 0,
+        }
+
+    def finish(self, path: str, pages: int):
+        if path not in self.files:
+            self.start(path)  # a file without any text still counts as ingested
+        self.files[path].update(status="done", pages=pages, ingested_at=time.time())
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.files, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+class IngestProgress:
+    """Counters for a directory ingest, logged every `interval` seconds and summarised at the end."""
+
+    def __init__(self, files: int, skipped: int, interval: float = 5.0):
+        self.files = files
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.pages = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def rates(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rates = f"{self.pages / elapsed:.1f} pages/s, {self.chunks / elapsed:.1f} chunks/s"
+        # Only remote embedding providers count tokens (cache hits are not sent)
+        return rates + (f", {self.tokens / elapsed:.0f} embed tokens/s" if self.tokens else "")
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            logger.info(f"Ingested {self.done}/{self.files} files ({self.failed} failed), {self.pages} pages, "
+                        f"{self.chunks} chunks; {self.rates()}")
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.done} files ingested, {self.skipped} unchanged skipped, {self.failed} failed: "
+                f"{self.pages} pages, {self.chunks} chunks in {elapsed:.1f}s ({self.rates()})")
+
+
+class DirectoryIngestor:
+    """
+    Ingest a file or a directory tree into a store, appending to it if it exists.
+    Three stages overlap: PDF extraction fans files and page ranges out over the process pool,
+    the calling thread chunks and embeds in groups, and a single writer thread adds each group
+    to the store and saves it. Unchanged files (per the ledger) are skipped; changed ones have
+    their previous chunks deleted first.
+    """
+
+    def __init__(self, embed_svc: EmbeddingService, store_path: str, index_config: IndexConfig = None,
+                 chunk_size: int = 500, chunk_overlap: int = 100, pdf_workers: int = 0, collection: str = None,
+                 chunker: BaseChunker = None):
+        self.embed_svc = embed_svc
+        self.store_path = store_path
+        self.index_config = index_config
+        self.chunker = chunker or Chunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.ingestor = DocumentIngestor(workers=pdf_workers)
+        self.collection = collection
+        self.store: Optional[VectorStore] = None
+        self.ledger = IngestLedger(store_path)
+
+    def _metadata(self, path: str) -> dict:
+        # Absolute paths are stable across runs, so a changed file replaces its own chunks
+        metadata = {"document_id": path}
+        if self.collection:
+            metadata["collection"] = self.collection
+        return metadata
+
+    def _plan(self, files: List[str]) -> List[str]:
+        """Files that need ingesting; previous chunks of changed or half-written ones are deleted."""
+        todo = [path for path in files if not self.ledger.unchanged(path)]
+        stale = [path for path in todo if path in self.ledger.files]
+        if stale and self.store is not None:
+            for path in stale:
+                self.store.delete_by_metadata("document_id", path)
+            self.store.save(self.store_path)
+        for path in stale:
+            del self.ledger.files[path]
+        self.ledger.save()
+        return todo
+
+    def _chunks(self, items: Iterable[Union[Document, FileDone]], progress: IngestProgress) -> Iterator[Union[Document, FileDone]]:
+        for item in items:
+            if isinstance(item, FileDone):
+                yield item
+                continue
+            progress.pages += 1
+            yield from self.chunker.iter_split([item])
+
+    def _write(self, chunks: List[Document], embeddings: Optional[np.ndarray], finished: List[FileDone],
+               progress: IngestProgress):
+        """Writer thread: the only code that touches the store and the ledger while the pipeline runs."""
+        counts: Dict[str, int] = {}
+        for chunk in chunks:
+            path = chunk.metadata["document_id"]
+            counts[path] = counts.get(path, 0) + 1
+        if chunks:
+            # Intent first: a crash after this leaves the files marked for cleanup on the next run
+            for path in counts:
+                if self.ledger.files.get(path, {}).get("status") != "writing":
+                    self.ledger.start(path)
+            self.ledger.save()
+
+            if self.store is None:
+                self.store = VectorStore(len(embeddings[0]), self.index_config)
+            elif self.store.dimension != embeddings.shape[1]:
+                raise ValueError(f"Store at {self.store_path} holds {self.store.dimension}-d vectors, "
+                                 f"the embedding model returns {embeddings.shape[1]}-d")
+            self.store.add(chunks, embeddings, {path: self.ledger.files[path]["sha256"] for path in counts})
+            self.store.save(self.store_path)
+            for path, count in counts.items():
+                self.ledger.files[path]["chunks"] += count
+
+        for done in finished:
+            if done.failed:
+                progress.failed += 1
+                continue
+            self.ledger.finish(done.path, done.pages)
+            progress.done += 1
+        self.ledger.save()
+        progress.chunks += len(chunks)
+
+    def run(self, path: str) -> IngestProgress:
+        if VectorStore.exists(self.store_path):
+            self.store = VectorStore.load(self.store_path, self.index_config)
+
+        files = find_files(path)
+        todo = self._plan(files)
+        progress = IngestProgress(len(todo), len(files) - len(todo))
+        logger.info(f"Found {len(files)} files under {path}: {len(todo)} to ingest, {progress.skipped} unchanged")
+        if not todo:
+            return progress
+
+        group_size = self.embed_svc.config.batch_size * self.embed_svc.config.max_concurrency
+        stream = self._chunks(self.ingestor.iter_files(todo, metadata_for=self._metadata), progress)
+        buffer: List[Document] = []
+        finished: List[FileDone] = []
+        writes = deque()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer") as writer:
+            def flush():
+                nonlocal buffer, finished
+                embeddings = None
+                if buffer:
+                    sent = self.embed_svc.tokens_sent
+                    embeddings = self.embed_svc.embed([c.text for c in buffer])
+                    # Counted while batching the request, so the texts are not tokenized again
+                    progress.tokens += self.embed_svc.tokens_sent - sent
+                writes.append(writer.submit(self._write, buffer, embeddings, finished, progress))
+                buffer, finished = [], []
+                # One group being written while the next is embedded; wait for anything older
+                while len(writes) > 1:
+                    writes.popleft().result()
+                progress.maybe_report()
+
+            for item in stream:
+                if isinstance(item, FileDone):
+                    finished.append(item)
+                    continue
+                buffer.append(item)
+                if len(buffer) >= group_size:
+                    flush()
+            flush()
+            while writes:
+                writes.popleft().result()
+
+        return progress
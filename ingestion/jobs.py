@@ -0,0 +1,197 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+from utils import logger
+
+# Stages a job goes through, in order; extraction, chunking and embedding overlap (pages are
+# chunked and embedded as they are extracted), so a job is in the earliest one still running
+STAGES = ("queued", "extracting", "chunking", "embedding", "saving", "done")
+
+
+class QueueFull(Exception):
+    """Raised by IngestJobQueue.submit when max_queued jobs are already waiting."""
+
+
+class IngestJob:
+    """Progress of one ingest: stage, counters and timings, as reported by /jobs/{id}."""
+
+    def __init__(self, key: str, kind: str, document_id: str, collection: str = None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.kind = kind
+        self.document_id = document_id
+        self.collection = collection
+        self.status = "queued"   # queued, running, succeeded, failed
+        self.stage = "queued"
+        self.pages = 0
+        self.total_pages = None
+        self.chunks = 0
+        self.embedded = 0
+        # Counters of a multi-document job (e.g. a BulkProgress), whose to_dict() extends "progress"
+        self.details = None
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def track(self, items: Iterable, counter: str, stage: str) -> Iterator:
+        """Count items as they pass; once the stream is exhausted the job moves past stage."""
+        for item in items:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if counter == "pages" and self.total_pages is None:
+                self.total_pages = item.metadata.get("total_pages")
+            yield item
+        if STAGES.index(self.stage) <= STAGES.index(stage):
+            self.stage = STAGES[STAGES.index(stage) + 1]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        progress = {
+            "pages": self.pages,
+            "total_pages": self.total_pages,
+            "chunks": self.chunks,
+            "embedded_chunks": self.embedded,
+        }
+        if self.details is not None:
+            progress.update(self.details.to_dict())
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "document_id": self.document_id,
+            "collection": self.collection,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": progress,
+            "throughput": {
+                "elapsed_s": round(elapsed, 3),
+                "queued_s": round((self.started_at or end) - self.created_at, 3),
+                "pages_per_s": round(self.pages / elapsed, 2) if elapsed else 0.0,
+                "chunks_per_s": round(progress["embedded_chunks"] / elapsed, 2) if elapsed else 0.0,
+            },
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class IngestJobQueue:
+    """
+    Bounded pool of worker threads running ingest jobs, so HTTP handlers only validate and
+    enqueue. At most max_queued jobs wait (submit raises QueueFull beyond that, the API's 429);
+    a submission identical to one still queued or running (same key) returns that job instead
+    of a new one. Finished jobs are kept for /jobs/{id} until keep_finished newer ones exist.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 100, keep_finished: int = 1000):
+        self.max_queued = max(1, max_queued)
+        self.keep_finished = keep_finished
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._jobs: Dict[str, IngestJob] = OrderedDict()
+        self._inflight: Dict[str, IngestJob] = {}
+        self._closed = False
+        self.succeeded = 0
+        self.failed = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"ingest-job-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key: str, run: Callable[[IngestJob], dict], kind: str, document_id: str,
+               collection: str = None) -> Tuple[IngestJob, bool]:
+        """
+        Queue run(job), which returns the job's result. Returns (job, created); created is False
+        when an identical job was already in flight and that job is returned.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The ingest job queue is shut down")
+            job = self._inflight.get(key)
+            if job is not None:
+                return job, False
+            if len(self._queue) >= self.max_queued:
+                raise QueueFull(f"{len(self._queue)} ingest jobs are already queued")
+            job = IngestJob(key, kind, document_id, collection)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._queue.append((job, run))
+            self._cond.notify()
+            return job, True
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job: IngestJob) -> Optional[int]:
+        """0-based place of a queued job in the queue, None once it has started."""
+        with self._cond:
+            for i, (queued, _) in enumerate(self._queue):
+                if queued is job:
+                    return i
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": len(self._threads),
+                "queued": len(self._queue),
+                "running": len(self._inflight) - len(self._queue),
+                "max_queued": self.max_queued,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+            }
+
+    def close(self, timeout: float = None):
+        """Stop taking jobs, fail the ones still queued and wait for the running ones."""
+        with self._cond:
+            self._closed = True
+            dropped, self._queue = self._queue, deque()
+            for job, _ in dropped:
+                self._finish(job, error="Shut down before the job started")
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _finish(self, job: IngestJob, result: dict = None, error: str = None):
+        # Called with _cond held
+        job.finished_at = time.time()
+        if error is None:
+            job.status, job.stage, job.result = "succeeded", "done", result
+            self.succeeded += 1
+        else:
+            job.status, job.error = "failed", error
+            self.failed += 1
+        self._inflight.pop(job.key, None)
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[old.id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                job, run = self._queue.popleft()
+                job.status = "running"
+                job.stage = "extracting" if job.kind in ("pdf", "update") else "chunking"
+                job.started_at = time.time()
+            try:
+                result = run(job)
+            except Exception as e:
+                logger.error(f"Ingest job {job.id} ({job.kind} {job.document_id}) failed: {e}")
+                with self._cond:
+                    self._finish(job, error=str(e))
+                continue
+            with self._cond:
+                self._finish(job, result=result)
+            logger.info(f"Ingest job {job.id} ({job.kind} {job.document_id}) finished in {job.finished_at - job.started_at:.1f}s")
@@ -1,41 +1,195 @@
 import os
-from typing import List
+import multiprocessing
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import List, Iterator, Iterable, Tuple, Union, Callable, Optional
 from pypdf import PdfReader
 from utils import logger, Document
 
+_pool = None
+# Worker side: the reader of the last file, reused across its page ranges
+_worker_reader = (None, None)
+
+
+def _process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Extraction pool shared by every ingestor in this process, created on first use.
+    Workers are spawned rather than forked: the API process runs threads, and forking
+    one while another thread holds a lock (e.g. the logger's) can deadlock the child.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _extract_pages(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Worker: (index, text) of pages [start, end), from the worker's own reader."""
+    global _worker_reader
+    key = (path, os.stat(path).st_mtime_ns)
+    if _worker_reader[0] != key:
+        _worker_reader = (key, PdfReader(path))
+    reader = _worker_reader[1]
+    return [(i, reader.pages[i].extract_text()) for i in range(start, end)]
+
+
+@dataclass
+class FileDone:
+    """Marker in the iter_files() stream: every page of `path` has been yielded before it."""
+    path: str
+    pages: int = 0
+    failed: bool = False
+
+
 class DocumentIngestor:
+    def __init__(self, workers: int = 0, pages_per_task: int = 16):
+        # 0 uses every CPU; 1 extracts in the calling thread
+        self.workers = workers or os.cpu_count() or 1
+        self.pages_per_task = max(1, pages_per_task)
+
     def ingest(self, path: str, extra_metadata: dict = None) -> List[Document]:
         """
         Load a PDF and return a list of Documents (one per page or one for entire doc).
         """
+        try:
+            documents = list(self.iter_pages(path, extra_metadata))
+            if documents:
+                logger.info(f"Successfully ingested {len(documents)} pages from {os.path.basename(path)}")
+            return documents
+        except Exception as e:
+            logger.error(f"Failed to ingest PDF {path}: {e}")
+            return []
+
+    def iter_pages(self, path: str, extra_metadata: dict = None) -> Iterator[Document]:
+        """
+        Yield one Document per non-empty page, in page order, as soon as it is extracted.
+        Files that cannot be opened yield nothing; errors while extracting are raised.
+        """
         if not os.path.exists(path):
             logger.error(f"File not found: {path}")
-            return []
+            return
 
         try:
             reader = PdfReader(path)
-            documents = []
+            total = len(reader.pages)
+        except Exception as e:
+            logger.error(f"Failed to open PDF {path}: {e}")
+            return
+
+        filename = os.path.basename(path)
+        for i, text in self._extract(path, reader, total):
+            if text.strip():
+                yield self._page(filename, i, total, text, extra_metadata)
+
+    def _page(self, filename: str, i: int, total: int, text: str, extra_metadata: dict = None) -> Document:
+        metadata = {
+            "source": filename,
+            "page": i + 1,
+            "total_pages": total
+        }
+        if extra_metadata:
+            metadata.update(extra_metadata)
+
+        return Document(
+            text=text,
+            metadata=metadata
+        )
+
+    def iter_files(self, paths: Iterable[str],
+                   metadata_for: Callable[[str], dict] = None) -> Iterator[Union[Document, FileDone]]:
+        """
+        Pages of many PDFs, file after file, each file followed by a FileDone marker.
+        Files and their page ranges share one window of in-flight tasks on the extraction pool,
+        so small files are extracted in parallel with each other and large ones range by range.
+        A file that cannot be read is logged and reported as failed; the others carry on.
+        """
+        failed = set()
+        for path, total, task in self._ordered(self._file_tasks(paths, failed)):
             filename = os.path.basename(path)
-            
-            for i, page in enumerate(reader.pages):
-                text = page.extract_text()
+            if task is None:
+                yield FileDone(path, total if path not in failed else 0, path in failed)
+                continue
+            if path in failed:
+                continue
+            try:
+                pages = task.result()
+            except Exception as e:
+                logger.error(f"Failed to extract text from {path}: {e}")
+                failed.add(path)
+                continue
+            extra_metadata = metadata_for(path) if metadata_for else None
+            for i, text in pages:
                 if text.strip():
-                    metadata = {
-                        "source": filename,
-                        "page": i + 1,
-                        "total_pages": len(reader.pages)
-                    }
-                    if extra_metadata:
-                        metadata.update(extra_metadata)
-                        
-                    doc = Document(
-                        text=text,
-                        metadata=metadata
-                    )
-                    documents.append(doc)
-            
-            logger.info(f"Successfully ingested {len(documents)} pages from {filename}")
-            return documents
+                    yield self._page(filename, i, total, text, extra_metadata)
+
+    def _file_tasks(self, paths: Iterable[str], failed: set) -> Iterator[Tuple[str, int, Optional[tuple]]]:
+        # (path, total pages, page range) per range, then (path, total, None) to close the file
+        for path in paths:
+            try:
+                total = len(PdfReader(path).pages)
+            except Exception as e:
+                logger.error(f"Failed to open PDF {path}: {e}")
+                failed.add(path)
+                yield path, 0, None
+                continue
+            for start in range(0, total, self.pages_per_task):
+                yield path, total, (start, min(start + self.pages_per_task, total))
+            yield path, total, None
+
+    def _ordered(self, tasks: Iterator[Tuple[str, int, Optional[tuple]]]) -> Iterator[Tuple[str, int, Optional[Future]]]:
+        """Submit page ranges with at most two per worker in flight and hand them back in order."""
+        window = 2 * self.workers
+        pending = deque()
+        try:
+            for path, total, pages in tasks:
+                pending.append((path, total, self._submit(path, *pages) if pages else None))
+                if sum(task is not None for _, _, task in pending) >= window:
+                    while pending:
+                        item = pending.popleft()
+                        yield item
+                        if item[2] is not None:
+                            break
+            while pending:
+                yield pending.popleft()
+        finally:
+            for _, _, task in pending:
+                if task is not None:
+                    task.cancel()
+
+    def _submit(self, path: str, start: int, end: int) -> Future:
+        if self.workers > 1:
+            return _process_pool(self.workers).submit(_extract_pages, path, start, end)
+        # Serial mode: run the range now, in this process
+        future = Future()
+        try:
+            future.set_result(_extract_pages(path, start, end))
         except Exception as e:
-            logger.error(f"Failed to ingest PDF {path}: {e}")
-            return []
+            future.set_exception(e)
+        return future
+
+    def _extract(self, path: str, reader: PdfReader, total: int) -> Iterator[Tuple[int, str]]:
+        """
+        Page texts in order. Larger PDFs are cut into ranges of pages_per_task pages that
+        worker processes extract in parallel; at most two ranges per worker are in flight,
+        so memory is bounded by that window rather than by the length of the document.
+        """
+        if self.workers <= 1 or total <= self.pages_per_task:
+            for i, page in enumerate(reader.pages):
+                yield i, page.extract_text()
+            return
+
+        pool = _process_pool(self.workers)
+        window = 2 * self.workers
+        pending = deque()
+        try:
+            for start in range(0, total, self.pages_per_task):
+                pending.append(pool.submit(_extract_pages, path, start, min(start + self.pages_per_task, total)))
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            # Consumer stopped early or a range failed: drop ranges not started yet
+            for future in pending:
+                future.cancel()
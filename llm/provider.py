@@ -1,44 +1,66 @@
-from typing import Optional
-from openai import OpenAI, AzureOpenAI
+from typing import Optional, Iterator, AsyncIterator
+from openai import OpenAI, AzureOpenAI, AsyncOpenAI, AsyncAzureOpenAI
 import ollama
 from config import LLMConfig
 from utils import logger
 
+MOCK_RESPONSE = "This is a mock response because LLM_PROVIDER is set to 'mock'."
+
 class LLMService:
     def __init__(self, config: LLMConfig):
         self.config = config
         self.client = None
+        # Native async client used by agenerate(), so the API never blocks its event loop on the LLM
+        self.async_client = None
 
         if config.provider in ["openai", "openai_compatible"]:
             self.client = OpenAI(
                 api_key=config.api_key or "no-key-needed",
                 base_url=config.base_url
             )
+            self.async_client = AsyncOpenAI(
+                api_key=config.api_key or "no-key-needed",
+                base_url=config.base_url
+            )
         elif config.provider == "azure":
             self.client = AzureOpenAI(
                 api_key=config.api_key,
                 api_version=config.api_version,
                 azure_endpoint=config.base_url
             )
+            self.async_client = AsyncAzureOpenAI(
+                api_key=config.api_key,
+                api_version=config.api_version,
+                azure_endpoint=config.base_url
+            )
         elif config.provider == "ollama":
-            pass
+            self.async_client = ollama.AsyncClient()
         elif config.provider == "mock":
             logger.info("Using mock LLM service")
         else:
             raise ValueError(f"Unsupported LLM provider: {config.provider}")
 
+    def _messages(self, prompt: str, system_prompt: str) -> list:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _ollama_options(self) -> dict:
+        return {
+            "temperature": self.config.temperature,
+            "num_predict": self.config.max_tokens
+        }
+
     def generate(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> str:
         try:
             if self.config.provider == "mock":
-                return "This is a mock response because LLM_PROVIDER is set to 'mock'."
+                return MOCK_RESPONSE
             
             if self.config.provider in ["openai", "openai_compatible", "azure"]:
                 response = self.client.chat.completions.create(
                     model=self.config.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
+                    messages=self._messages(prompt, system_prompt),
                     temperature=self.config.temperature,
                     max_tokens=self.config.max_tokens
                 )
@@ -47,14 +69,8 @@ class LLMService:
             elif self.config.provider == "ollama":
                 response = ollama.chat(
                     model=self.config.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
-                    options={
-                        "temperature": self.config.temperature,
-                        "num_predict": self.config.max_tokens
-                    }
+                    messages=self._messages(prompt, system_prompt),
+                    options=self._ollama_options()
                 )
                 return response['message']['content']
         
@@ -63,3 +79,101 @@ class LLMService:
             raise e
         
         return ""
+
+    def generate_stream(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> Iterator[str]:
+        """Yield the answer in pieces as the model produces them."""
+        try:
+            if self.config.provider == "mock":
+                yield MOCK_RESPONSE
+                return
+
+            if self.config.provider in ["openai", "openai_compatible", "azure"]:
+                stream = self.client.chat.completions.create(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens,
+                    stream=True
+                )
+                for chunk in stream:
+                    # Azure sends content-filter chunks without choices
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+            elif self.config.provider == "ollama":
+                stream = ollama.chat(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    options=self._ollama_options(),
+                    stream=True
+                )
+                for part in stream:
+                    if part['message']['content']:
+                        yield part['message']['content']
+
+        except Exception as e:
+            logger.error(f"LLM Generation failed: {e}")
+            raise e
+
+    async def agenerate(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> str:
+        """Async counterpart of generate()."""
+        try:
+            if self.config.provider == "mock":
+                return MOCK_RESPONSE
+
+            if self.config.provider in ["openai", "openai_compatible", "azure"]:
+                response = await self.async_client.chat.completions.create(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens
+                )
+                return response.choices[0].message.content
+
+            elif self.config.provider == "ollama":
+                response = await self.async_client.chat(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    options=self._ollama_options()
+                )
+                return response['message']['content']
+
+        except Exception as e:
+            logger.error(f"LLM Generation failed: {e}")
+            raise e
+
+        return ""
+
+    async def agenerate_stream(self, prompt: str, system_prompt: str = "You are a helpful assistant.") -> AsyncIterator[str]:
+        """Async counterpart of generate_stream()."""
+        try:
+            if self.config.provider == "mock":
+                yield MOCK_RESPONSE
+                return
+
+            if self.config.provider in ["openai", "openai_compatible", "azure"]:
+                stream = await self.async_client.chat.completions.create(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    temperature=self.config.temperature,
+                    max_tokens=self.config.max_tokens,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+            elif self.config.provider == "ollama":
+                stream = await self.async_client.chat(
+                    model=self.config.model,
+                    messages=self._messages(prompt, system_prompt),
+                    options=self._ollama_options(),
+                    stream=True
+                )
+                async for part in stream:
+                    if part['message']['content']:
+                        yield part['message']['content']
+
+        except Exception as e:
+            logger.error(f"LLM Generation failed: {e}")
+            raise e
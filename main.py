@@ -2,13 +2,9 @@ import os
 import click
 from utils import logger, setup_logging
 from config import get_settings
-from ingestion import DocumentIngestor
-from chunking import Chunker
-from embeddings import EmbeddingService
-from vectorstore import VectorStore
-from retrieval import Retriever
-from llm import LLMService
-from rag import RAGPipeline
+from chunking import create_chunker, CHUNK_STRATEGIES
+# The services are imported by the commands that use them: spawned PDF extraction workers
+# re-import this module, and should not each load the embedding, LLM and FAISS libraries
 
 @click.group()
 def cli():
@@ -17,52 +13,104 @@ def cli():
 
 @cli.command()
 @click.option('--path', required=True, help='Path to the PDF file or directory.')
-@click.option('--output', default='storage', help='Directory to save the vector store.')
+@click.option('--output', default='storage', help='Vector store to create or append to.')
 @click.option('--chunk-size', default=500, help='Chunk size in characters.')
 @click.option('--overlap', default=100, help='Chunk overlap in characters.')
-def ingest(path, output, chunk_size, overlap):
-    """Ingest documents and create a vector store."""
+@click.option('--collection', default=None, help='Collection to tag the ingested chunks with.')
+@click.option('--strategy', type=click.Choice(CHUNK_STRATEGIES), default=None,
+              help='Chunking strategy (default: CHUNK_STRATEGY).')
+@click.option('--max-tokens', type=int, default=None, help='Token limit per chunk for the token-aware strategies.')
+def ingest(path, output, chunk_size, overlap, collection, strategy, max_tokens):
+    """Ingest a PDF or a directory of PDFs into a vector store, skipping unchanged files."""
+    from embeddings import EmbeddingService
+    from vectorstore import acquire_writer_lock
+    from ingestion.directory import DirectoryIngestor
     settings = get_settings()
-    
-    # 1. Ingest
-    ingestor = DocumentIngestor()
-    docs = ingestor.ingest(path)
-    if not docs:
+    # Held until the command exits
+    writer_lock = acquire_writer_lock(output)
+    if writer_lock is None:
+        logger.error(f"Another process (e.g. the API writer) is writing the vector store at {output}")
+        return
+
+    # Extraction fans out over a process pool, embedding runs here and one writer appends to the store
+    embed_svc = EmbeddingService(settings.embedding)
+    chunker = create_chunker(
+        strategy or settings.chunking.strategy, chunk_size=chunk_size, chunk_overlap=overlap,
+        max_tokens=max_tokens or settings.chunking.max_tokens, overlap_tokens=settings.chunking.overlap_tokens,
+        model=settings.embedding.model,
+    )
+    ingestor = DirectoryIngestor(
+        embed_svc, output, settings.index, pdf_workers=settings.pdf_workers, collection=collection, chunker=chunker
+    )
+    progress = ingestor.run(path)
+
+    if progress.files == 0 and progress.skipped == 0:
         logger.error("No documents ingested.")
         return
+    logger.info(f"Ingestion complete: {progress.summary()}. Vector store saved to {output}")
 
-    # 2. Chunk
-    chunker = Chunker(chunk_size=chunk_size, chunk_overlap=overlap)
-    chunks = chunker.split(docs)
+@cli.command(name='ingest-bulk')
+@click.option('--path', required=True, help="NDJSON file of {document_id, text, collection, metadata} records, or '-' for stdin.")
+@click.option('--output', default='storage', help='Vector store to create or append to.')
+@click.option('--chunk-size', default=500, help='Chunk size in characters.')
+@click.option('--overlap', default=100, help='Chunk overlap in characters.')
+@click.option('--collection', default=None, help='Collection for records that do not name one.')
+@click.option('--strategy', type=click.Choice(CHUNK_STRATEGIES), default=None,
+              help='Chunking strategy (default: CHUNK_STRATEGY).')
+@click.option('--max-tokens', type=int, default=None, help='Token limit per chunk for the token-aware strategies.')
+def ingest_bulk(path, output, chunk_size, overlap, collection, strategy, max_tokens):
+    """Ingest NDJSON text records, skipping documents stored with the same text."""
+    from embeddings import EmbeddingService
+    from vectorstore import acquire_writer_lock
+    from ingestion.bulk import BulkIngestor, StoreBatchWriter
+    settings = get_settings()
+    # Held until the command exits
+    writer_lock = acquire_writer_lock(output)
+    if writer_lock is None:
+        logger.error(f"Another process (e.g. the API writer) is writing the vector store at {output}")
+        return
 
-    # 3. Embed
     embed_svc = EmbeddingService(settings.embedding)
-    logger.info("Embedding chunks...")
-    texts = [c.text for c in chunks]
-    embeddings = embed_svc.embed(texts)
+    chunker = create_chunker(
+        strategy or settings.chunking.strategy, chunk_size=chunk_size, chunk_overlap=overlap,
+        max_tokens=max_tokens or settings.chunking.max_tokens, overlap_tokens=settings.chunking.overlap_tokens,
+        model=settings.embedding.model,
+    )
+    writer = StoreBatchWriter(output, settings.index)
+    ingestor = BulkIngestor(embed_svc, chunker, writer, lookup=writer.lookup, collection=collection)
+    with click.open_file(path, "rb") as f:
+        progress = ingestor.run(f)
 
-    # 4. Store
-    dimension = len(embeddings[0])
-    store = VectorStore(dimension)
-    store.add(chunks, embeddings)
-    store.save(output)
-    logger.info(f"Ingestion complete. Vector store saved to {output}")
+    for error in progress.errors:
+        logger.warning(f"Line {error['line']} rejected: {error['error']}")
+    logger.info(f"Bulk ingestion complete: {progress.summary()}. Vector store saved to {output}")
 
 @cli.command()
 @click.option('--query', 'question', required=True, help='Question to ask.')
 @click.option('--store-path', default='storage', help='Path to the vector store.')
 @click.option('--k', default=5, help='Number of chunks to retrieve.')
-def query(question, store_path, k):
+@click.option('--stream', is_flag=True, help='Print the answer as it is generated.')
+def query(question, store_path, k, stream):
     """Query the RAG system."""
+    from embeddings import EmbeddingService
+    from vectorstore import VectorStore
+    from retrieval import Retriever
+    from llm import LLMService
+    from rag import RAGPipeline
     settings = get_settings()
     
-    if not os.path.exists(store_path):
+    if not VectorStore.exists(store_path):
         logger.error(f"Store path not found: {store_path}")
         return
 
     # 1. Load Services
     embed_svc = EmbeddingService(settings.embedding)
-    store = VectorStore.load(store_path)
+    try:
+        # Read-only, so querying is safe while another process writes the store
+        store = VectorStore.load(store_path, read_only=True)
+    except FileNotFoundError:
+        # Legacy stores are migrated on their first (writable) load
+        store = VectorStore.load(store_path, settings.index)
     llm_svc = LLMService(settings.llm)
     
     # 2. Setup Pipeline
@@ -70,10 +118,33 @@ def query(question, store_path, k):
     pipeline = RAGPipeline(retriever, llm_svc)
     
     # 3. Run Query
+    if stream:
+        print("\n--- ANSWER ---")
+        for event, data in pipeline.query_stream(question, k=k):
+            if event == "token":
+                print(data["text"], end="", flush=True)
+        print("\n--------------\n")
+        return
+
     answer = pipeline.query(question, k=k)
     print("\n--- ANSWER ---")
     print(answer)
     print("--------------\n")
 
+@cli.command()
+@click.option('--store-path', default='storage', help='Path to the legacy vector store.')
+def migrate(store_path):
+    """Convert a legacy store.pkl + index.faiss store to the segment format."""
+    from vectorstore import VectorStore, acquire_writer_lock
+    if not VectorStore.exists(store_path):
+        logger.error(f"Store path not found: {store_path}")
+        return
+    writer_lock = acquire_writer_lock(store_path)
+    if writer_lock is None:
+        logger.error(f"Another process is writing the vector store at {store_path}")
+        return
+    store = VectorStore.load(store_path)
+    logger.info(f"Store at {store_path} is in segment format with {len(store.documents)} chunks")
+
 if __name__ == '__main__':
     cli()
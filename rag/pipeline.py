@@ -1,7 +1,10 @@
-from typing import List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterator, AsyncIterator, Tuple
 from llm import LLMService
 from retrieval import Retriever
-from utils import logger
+from vectorstore import MetadataFilter
+from utils import Document, logger
 
 DEFAULT_PROMPT_TEMPLATE = """You are a helpful assistant.
 Answer the question using ONLY the context below.
@@ -14,26 +17,130 @@ Question:
 {question}
 """
 
+NO_CONTEXT_ANSWER = "No relevant context found."
+
+SOURCE_FIELDS = ("source", "document_id", "collection", "page")
+
+def describe_sources(docs: List[Document]) -> List[dict]:
+    """Retrieved chunks as sent to streaming clients: citation metadata plus the chunk text."""
+    return [
+        {**{key: doc.metadata.get(key) for key in SOURCE_FIELDS}, "text": doc.text}
+        for doc in docs
+    ]
+
 class RAGPipeline:
     def __init__(self, retriever: Retriever, llm_service: LLMService, prompt_template: str = DEFAULT_PROMPT_TEMPLATE):
         self.retriever = retriever
         self.llm_service = llm_service
         self.prompt_template = prompt_template
 
-    def query(self, question: str, k: int = 5, collection: str = None) -> str:
+    def build_prompt(self, question: str, docs: List[Document]) -> str:
+        context_text = "\n\n".join([doc.text for doc in docs])
+        return self.prompt_template.format(context=context_text, question=question)
+
+    def query(self, question: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+              nprobe: int = None, ef_search: int = None) -> str:
         # 1. Retrieve
-        docs = self.retriever.retrieve(question, k=k, collection=collection)
+        docs = self.retriever.retrieve(question, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
         
         if not docs:
             logger.warning("No relevant context found.")
-            return "No relevant context found."
-        
-        # 2. Format Context
-        context_text = "\n\n".join([doc.text for doc in docs])
+            return NO_CONTEXT_ANSWER
         
-        # 3. Construct Prompt
-        prompt = self.prompt_template.format(context=context_text, question=question)
+        # 2. Format Context & Construct Prompt
+        prompt = self.build_prompt(question, docs)
         
-        # 4. Generate
+        # 3. Generate
         logger.info("Generating answer...")
         return self.llm_service.generate(prompt)
+
+    async def aquery(self, question: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                     nprobe: int = None, ef_search: int = None) -> str:
+        """Async counterpart of query() for the API: neither retrieval nor generation blocks the event loop."""
+        docs = await self.retriever.aretrieve(question, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
+
+        if not docs:
+            logger.warning("No relevant context found.")
+            return NO_CONTEXT_ANSWER
+
+        prompt = self.build_prompt(question, docs)
+        logger.info("Generating answer...")
+        return await self.llm_service.agenerate(prompt)
+
+    def query_stream(self, question: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                     nprobe: int = None, ef_search: int = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Yield (event, data) pairs: one "sources" event as soon as retrieval is done,
+        then a "token" event per piece of the answer as the LLM generates it.
+        """
+        docs = self.retriever.retrieve(question, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
+        yield "sources", {"sources": describe_sources(docs)}
+
+        if not docs:
+            logger.warning("No relevant context found.")
+            yield "token", {"text": NO_CONTEXT_ANSWER}
+            return
+
+        logger.info("Streaming answer...")
+        for text in self.llm_service.generate_stream(self.build_prompt(question, docs)):
+            yield "token", {"text": text}
+
+    async def aquery_stream(self, question: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                            nprobe: int = None, ef_search: int = None) -> AsyncIterator[Tuple[str, dict]]:
+        """Async counterpart of query_stream()."""
+        docs = await self.retriever.aretrieve(question, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
+        yield "sources", {"sources": describe_sources(docs)}
+
+        if not docs:
+            logger.warning("No relevant context found.")
+            yield "token", {"text": NO_CONTEXT_ANSWER}
+            return
+
+        logger.info("Streaming answer...")
+        async for text in self.llm_service.agenerate_stream(self.build_prompt(question, docs)):
+            yield "token", {"text": text}
+
+    def _answer(self, question: str, docs: List[Document]) -> dict:
+        """One batch result: the answer, or the error that stopped it, so one failure does not sink the batch."""
+        if not docs:
+            return {"question": question, "answer": NO_CONTEXT_ANSWER}
+        try:
+            return {"question": question, "answer": self.llm_service.generate(self.build_prompt(question, docs))}
+        except Exception as e:
+            return {"question": question, "error": str(e)}
+
+    async def _aanswer(self, question: str, docs: List[Document], semaphore: asyncio.Semaphore) -> dict:
+        if not docs:
+            return {"question": question, "answer": NO_CONTEXT_ANSWER}
+        async with semaphore:
+            try:
+                return {"question": question, "answer": await self.llm_service.agenerate(self.build_prompt(question, docs))}
+            except Exception as e:
+                return {"question": question, "error": str(e)}
+
+    def query_many(self, questions: List[str], k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                   nprobe: int = None, ef_search: int = None, max_concurrency: int = None) -> List[dict]:
+        """
+        Answer many questions sharing the same search options. Retrieval is one batched embed
+        call and one matrix search; answers are generated max_concurrency at a time (default
+        LLMConfig.max_concurrency) and returned in question order.
+        """
+        doc_lists = self.retriever.retrieve_many(questions, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
+        logger.info(f"Generating {len(questions)} answers...")
+        with ThreadPoolExecutor(max_workers=max_concurrency or self.llm_service.config.max_concurrency) as pool:
+            return list(pool.map(self._answer, questions, doc_lists))
+
+    async def aquery_many(self, questions: List[str], k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                          nprobe: int = None, ef_search: int = None, max_concurrency: int = None) -> AsyncIterator[dict]:
+        """Async counterpart of query_many(), yielding each result in order as soon as it and all before it are done."""
+        doc_lists = await self.retriever.aretrieve_many(questions, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search)
+        logger.info(f"Generating {len(questions)} answers...")
+        semaphore = asyncio.Semaphore(max_concurrency or self.llm_service.config.max_concurrency)
+        tasks = [asyncio.ensure_future(self._aanswer(q, docs, semaphore)) for q, docs in zip(questions, doc_lists)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            # The consumer stopped early (client disconnected): drop the generations still queued
+            for task in tasks:
+                task.cancel()
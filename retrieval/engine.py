@@ -1,14 +1,47 @@
 from typing import List
 from embeddings import EmbeddingService
 from vectorstore.faiss_store import VectorStore
-from utils import Document, logger
+from vectorstore.filters import MetadataFilter
+from utils import Document, logger, run_blocking
 
 class Retriever:
     def __init__(self, embedding_service: EmbeddingService, vector_store: VectorStore):
         self.embedding_service = embedding_service
         self.vector_store = vector_store
 
-    def retrieve(self, query: str, k: int = 5, collection: str = None) -> List[Document]:
-        logger.info(f"Retrieving context for query: {query} with collection: {collection}")
+    def retrieve(self, query: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                 nprobe: int = None, ef_search: int = None) -> List[Document]:
+        logger.info(f"Retrieving context for query: {query} with collection: {collection}, filters: {filters}")
         query_embedding = self.embedding_service.embed([query])[0]
-        return self.vector_store.query(query_embedding, k=k, collection=collection)
+        return self.vector_store.query(
+            query_embedding, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search
+        )
+
+    def retrieve_many(self, queries: List[str], k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                      nprobe: int = None, ef_search: int = None) -> List[List[Document]]:
+        """Context for many queries: one batched embed call and one FAISS search over the query matrix."""
+        logger.info(f"Retrieving context for {len(queries)} queries with collection: {collection}, filters: {filters}")
+        query_embeddings = self.embedding_service.embed(queries)
+        return self.vector_store.query_many(
+            query_embeddings, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search
+        )
+
+    async def aretrieve(self, query: str, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                        nprobe: int = None, ef_search: int = None) -> List[Document]:
+        """Async counterpart of retrieve(); the FAISS search runs on the shared executor."""
+        logger.info(f"Retrieving context for query: {query} with collection: {collection}, filters: {filters}")
+        query_embedding = await self.embedding_service.aembed_query(query)
+        return await run_blocking(
+            self.vector_store.query,
+            query_embedding, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search
+        )
+
+    async def aretrieve_many(self, queries: List[str], k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                             nprobe: int = None, ef_search: int = None) -> List[List[Document]]:
+        """Async counterpart of retrieve_many()."""
+        logger.info(f"Retrieving context for {len(queries)} queries with collection: {collection}, filters: {filters}")
+        query_embeddings = await self.embedding_service.aembed(queries)
+        return await run_blocking(
+            self.vector_store.query_many,
+            query_embeddings, k=k, collection=collection, filters=filters, nprobe=nprobe, ef_search=ef_search
+        )
@@ -1,19 +1,22 @@
 import os
 import multiprocessing
 import uvicorn
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from loguru import logger
 from dotenv import load_dotenv
+from crawl_pool import CrawlerPool, QueueFull
 
-# We don't import ANY scrapy/twisted stuff here to avoid reactor initialization in the main process
+# We don't import ANY scrapy/twisted stuff here to avoid reactor initialization in the main process;
+# crawls run in the long-lived worker processes of crawl_pool.CrawlerPool
 
 load_dotenv()
 
 app = FastAPI(title="LightRAG Scraper Service")
+crawler_pool: Optional[CrawlerPool] = None
 
 # Add CORS middleware
 app.add_middleware(
@@ -46,42 +49,23 @@ def verify_token(authorization: Optional[str] = Header(None)):
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "scraper"}
+    return {"status": "ok", "service": "scraper", "crawler_pool": crawler_pool.stats() if crawler_pool else None}
 
-def run_spider_sync(req_dict):
-    # LATE IMPORT to ensure reactor is fresh in this process
-    from scrapy.crawler import CrawlerProcess
-    from spiders.generic import GenericSpider
-    
-    # Force the Asyncio reactor for scrapy-playwright
-    process = CrawlerProcess({
-        'ITEM_PIPELINES': {
-            'pipelines.MarkdownPipeline': 300,
-        },
-        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'LOG_LEVEL': 'INFO',
-        'TWISTED_REACTOR': 'twisted.internet.asyncioreactor.AsyncioSelectorReactor',
-        'DOWNLOAD_HANDLERS': {
-            "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-            "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
-        },
-        'PLAYWRIGHT_BROWSER_TYPE': 'chromium',
-        'PLAYWRIGHT_LAUNCH_OPTIONS': {'headless': True},
-    })
-    
-    process.crawl(GenericSpider, 
-        urls=req_dict['urls'], 
-        selectors=req_dict['selectors'], 
-        document_id=req_dict['document_id'],
-        collection=req_dict.get('collection')
+@app.on_event("startup")
+def start_pool():
+    # Created here, not at import: spawned crawler workers import this module again
+    global crawler_pool
+    crawler_pool = CrawlerPool(
+        workers=int(os.getenv("CRAWL_WORKERS", "2")),
+        per_domain=int(os.getenv("CRAWL_PER_DOMAIN", "1")),
+        max_queued=int(os.getenv("CRAWL_QUEUE_DEPTH", "100")),
     )
-    process.start()
 
-async def crawl_in_process(req: ScrapeRequest):
-    req_dict = req.dict()
-    p = multiprocessing.Process(target=run_spider_sync, args=(req_dict,))
-    p.start()
-    logger.info(f"Spawned crawl process {p.pid} for {req.document_id}")
+@app.on_event("shutdown")
+def stop_pool():
+    # None if startup failed before the pool was created
+    if crawler_pool is not None:
+        crawler_pool.close()
 
 @app.get("/logs")
 async def get_crawler_logs(auth=Depends(verify_token)):
@@ -95,11 +79,29 @@ async def get_crawler_logs(auth=Depends(verify_token)):
     # Return as plain text for easy reading in browser
     return PlainTextResponse(content)
 
-@app.post("/crawl")
-async def start_crawl(req: ScrapeRequest, background_tasks: BackgroundTasks, auth=Depends(verify_token)):
-    logger.info(f"Accepted crawl request for doc_id: {req.document_id}")
-    background_tasks.add_task(crawl_in_process, req)
-    return {"status": "accepted", "document_id": req.document_id, "message": "Crawl started in background"}
+@app.post("/crawl", status_code=202)
+async def start_crawl(req: ScrapeRequest, auth=Depends(verify_token)):
+    try:
+        job = crawler_pool.submit(req.dict())
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"{e}, retry later.", headers={"Retry-After": "30"})
+    position = crawler_pool.position(job)
+    logger.info(f"Accepted crawl request for doc_id: {req.document_id} (job {job.id}, queue position {position})")
+    return {
+        "status": "accepted",
+        "document_id": req.document_id,
+        "job_id": job.id,
+        "job_status": job.status,
+        "queue_position": position,
+        "message": "Crawl started" if position is None else "Crawl queued",
+    }
+
+@app.get("/crawl/{job_id}")
+async def crawl_status(job_id: str, auth=Depends(verify_token)):
+    job = crawler_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Crawl job {job_id} not found")
+    return {**job.to_dict(), "queue_position": crawler_pool.position(job)}
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
@@ -0,0 +1,317 @@
+import time
+import uuid
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from loguru import logger
+
+# Nothing from scrapy/twisted/playwright is imported at module level: this module is loaded by
+# the API process too, and each worker process installs its own reactor
+
+# Chromium DevTools port of worker i; crawls connect to the worker's browser instead of launching one
+CDP_BASE_PORT = 9300
+
+
+class QueueFull(Exception):
+    """Raised by CrawlerPool.submit when max_queued crawls are already waiting."""
+
+
+class CrawlJob:
+    """One /crawl request, as reported by /crawl/{job_id}."""
+
+    def __init__(self, request: dict):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.document_id = request["document_id"]
+        self.domains = {urlparse(url).hostname or url for url in request["urls"]}
+        self.status = "queued"   # queued, running, succeeded, failed
+        self.worker = None
+        self.pages = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "document_id": self.document_id,
+            "urls": self.request["urls"],
+            "status": self.status,
+            "worker": self.worker,
+            "pages": self.pages,
+            "queued_s": round((self.started_at or end) - self.created_at, 3),
+            "elapsed_s": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+
+class CrawlerPool:
+    """
+    A fixed set of long-lived crawler processes. Each one starts a headless Chromium once and
+    runs its crawls in a single reactor, connecting scrapy-playwright to that browser over CDP,
+    so a crawl no longer pays for a process, a reactor and a browser launch, and the number of
+    browsers is bounded by the pool size whatever the request rate. Crawls wait in a FIFO queue
+    (submit raises QueueFull beyond max_queued, the API's 429). A worker takes the oldest crawl
+    none of whose domains already has per_domain crawls running. A worker that dies is
+    replaced and its crawl marked failed. Finished jobs are kept until keep_finished newer ones
+    exist.
+    """
+
+    def __init__(self, workers: int = 2, per_domain: int = 1, max_queued: int = 100, keep_finished: int = 1000):
+        self.per_domain = max(1, per_domain)
+        self.max_queued = max(1, max_queued)
+        self.keep_finished = keep_finished
+        # spawn, not fork: the API process runs threads, and workers must import twisted fresh
+        self._ctx = multiprocessing.get_context("spawn")
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._jobs: Dict[str, CrawlJob] = OrderedDict()
+        self._running: Dict[int, CrawlJob] = {}       # worker -> its crawl
+        self._domains: Dict[str, int] = {}             # domain -> crawls running on it
+        self._workers: List[Optional[multiprocessing.Process]] = [None] * max(1, workers)
+        # One pipe per worker (crawls out, results back), so a worker that dies mid-write
+        # cannot wedge a channel the others share
+        self._conns: List = [None] * len(self._workers)
+        self._closed = False
+        self.succeeded = 0
+        self.failed = 0
+        self.restarts = 0
+        for i in range(len(self._workers)):
+            self._start_worker(i)
+        self._thread = threading.Thread(target=self._run, name="crawler-pool", daemon=True)
+        self._thread.start()
+
+    def submit(self, request: dict) -> CrawlJob:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The crawler pool is shut down")
+            if len(self._queue) >= self.max_queued:
+                raise QueueFull(f"{len(self._queue)} crawls are already queued")
+            job = CrawlJob(request)
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._dispatch()
+            return job
+
+    def get(self, job_id: str) -> Optional[CrawlJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job: CrawlJob) -> Optional[int]:
+        """0-based place of a queued crawl in the queue, None once it has started."""
+        with self._cond:
+            for i, queued in enumerate(self._queue):
+                if queued is job:
+                    return i
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": len(self._workers),
+                "busy": len(self._running),
+                "queued": len(self._queue),
+                "max_queued": self.max_queued,
+                "per_domain": self.per_domain,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "restarts": self.restarts,
+            }
+
+    def close(self, timeout: float = 10.0):
+        """Fail the queued crawls, stop the workers (and their browsers) and the dispatcher."""
+        with self._cond:
+            self._closed = True
+            dropped, self._queue = self._queue, deque()
+            for job in dropped:
+                self._finish(job, error="Shut down before the crawl started")
+            for conn in self._conns:
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass  # that worker is already gone
+        for process in self._workers:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._thread.join(timeout)
+
+    def _start_worker(self, i: int):
+        self._conns[i], child = self._ctx.Pipe()
+        process = self._ctx.Process(target=crawl_worker, args=(i, child), name=f"crawler-{i}", daemon=True)
+        process.start()
+        child.close()
+        self._workers[i] = process
+        logger.info(f"Started crawler worker {i} (pid {process.pid})")
+
+    def _dispatch(self):
+        # Called with _cond held: hand queued crawls to idle workers, oldest eligible first
+        for i in range(len(self._workers)):
+            if i in self._running:
+                continue
+            job = next((j for j in self._queue
+                        if all(self._domains.get(d, 0) < self.per_domain for d in j.domains)), None)
+            if job is None:
+                return
+            self._queue.remove(job)
+            job.status, job.worker, job.started_at = "running", i, time.time()
+            self._running[i] = job
+            for domain in job.domains:
+                self._domains[domain] = self._domains.get(domain, 0) + 1
+            self._conns[i].send((job.id, job.request))
+            logger.info(f"Crawl {job.id} ({job.document_id}) started on worker {i}")
+
+    def _finish(self, job: CrawlJob, pages: int = 0, error: str = None):
+        # Called with _cond held
+        job.finished_at = time.time()
+        job.pages = pages
+        if error is None:
+            job.status = "succeeded"
+            self.succeeded += 1
+        else:
+            job.status, job.error = "failed", error
+            self.failed += 1
+        if self._running.get(job.worker) is job:
+            del self._running[job.worker]
+            for domain in job.domains:
+                self._domains[domain] -= 1
+                if not self._domains[domain]:
+                    del self._domains[domain]
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[old.id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                conns = list(self._conns)
+                sentinels = [process.sentinel for process in self._workers]
+            # Wakes on a result or on a worker exiting; the timeout bounds how long close() waits
+            ready = wait(conns + sentinels, timeout=1.0)
+            with self._cond:
+                if self._closed:
+                    return
+                for worker, conn in enumerate(conns):
+                    if conn not in ready:
+                        continue
+                    try:
+                        job_id, pages, error = conn.recv()
+                    except (EOFError, OSError):
+                        continue  # the worker died; handled below
+                    job = self._running.get(worker)
+                    if job is not None and job.id == job_id:
+                        self._finish(job, pages, error)
+                        log = logger.info if error is None else logger.error
+                        log(f"Crawl {job.id} ({job.document_id}) on worker {worker} finished: {pages} pages"
+                            + (f", {error}" if error else ""))
+                for i, process in enumerate(self._workers):
+                    if not process.is_alive():
+                        # Crashed (e.g. the browser took the process down): replace it
+                        logger.error(f"Crawler worker {i} exited with code {process.exitcode}, restarting it")
+                        job = self._running.get(i)
+                        if job is not None:
+                            self._finish(job, error=f"Crawler worker exited with code {process.exitcode}")
+                        self.restarts += 1
+                        self._start_worker(i)
+                self._dispatch()
+
+
+def crawl_worker(worker: int, conn):
+    """Worker process: one reactor and one browser for every crawl it is given."""
+    # LATE IMPORTS so this process installs the asyncio reactor scrapy-playwright needs
+    from scrapy.utils.reactor import install_reactor
+    install_reactor("twisted.internet.asyncioreactor.AsyncioSelectorReactor")
+    from twisted.internet import reactor
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.utils.log import configure_logging
+    from spiders.generic import GenericSpider
+
+    port = CDP_BASE_PORT + worker
+    browser = {"ready": threading.Event(), "closed": threading.Event(), "up": False}
+    threading.Thread(target=run_browser, args=(port, browser), daemon=True).start()
+    browser["ready"].wait()
+
+    settings = {
+        'ITEM_PIPELINES': {
+            'pipelines.MarkdownPipeline': 300,
+        },
+        'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'LOG_LEVEL': 'INFO',
+        'TWISTED_REACTOR': 'twisted.internet.asyncioreactor.AsyncioSelectorReactor',
+        'DOWNLOAD_HANDLERS': {
+            "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+            "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
+        },
+        'PLAYWRIGHT_BROWSER_TYPE': 'chromium',
+        # Each crawl opens its own context in the worker's running browser, and closing the
+        # crawl disconnects from the browser instead of shutting it down
+        'PLAYWRIGHT_CDP_URL': f"http://127.0.0.1:{port}",
+    }
+    if not browser["up"]:
+        # Fall back to a browser launched (and closed) by each crawl
+        del settings['PLAYWRIGHT_CDP_URL']
+        settings['PLAYWRIGHT_LAUNCH_OPTIONS'] = {'headless': True}
+    # CrawlerProcess did this for the one-shot processes; a CrawlerRunner leaves it to us
+    configure_logging(settings)
+    runner = CrawlerRunner(settings)
+
+    def start(job_id: str, request: dict):
+        crawler = runner.create_crawler(GenericSpider)
+        d = runner.crawl(crawler,
+            urls=request['urls'],
+            selectors=request['selectors'],
+            document_id=request['document_id'],
+            collection=request.get('collection')
+        )
+        pages = lambda: crawler.stats.get_value("item_scraped_count", 0) if crawler.stats else 0
+        d.addCallbacks(lambda _: conn.send((job_id, pages(), None)),
+                       lambda failure: conn.send((job_id, pages(), failure.getErrorMessage())))
+
+    def receive():
+        # Blocking reads stay off the reactor thread
+        while True:
+            try:
+                task = conn.recv()
+            except EOFError:
+                task = None  # the pool is gone
+            if task is None:
+                reactor.callFromThread(stop)
+                return
+            reactor.callFromThread(start, *task)
+
+    def stop():
+        d = runner.join()
+        d.addBoth(lambda _: reactor.stop())
+
+    threading.Thread(target=receive, daemon=True).start()
+    reactor.run(installSignalHandlers=False)
+    browser["closed"].set()
+
+
+def run_browser(port: int, browser: dict):
+    """Keep a headless Chromium with DevTools on port open until browser["closed"] is set."""
+    from playwright.sync_api import sync_playwright
+
+    try:
+        with sync_playwright() as playwright:
+            chromium = playwright.chromium.launch(headless=True, args=[f"--remote-debugging-port={port}"])
+            logger.info(f"Crawler browser listening on port {port}")
+            browser["up"] = True
+            browser["ready"].set()
+            browser["closed"].wait()
+            chromium.close()
+    except Exception as e:
+        logger.error(f"Launching the crawler browser on port {port} failed, crawls will launch their own: {e}")
+    finally:
+        browser["ready"].set()
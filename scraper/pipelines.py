@@ -1,5 +1,6 @@
 import os
 from loguru import logger
+from scrapy.utils.defer import deferred_from_coro
 from rag_client import LightRAGClient
 
 class MarkdownPipeline:
@@ -17,7 +18,7 @@ class MarkdownPipeline:
         # Initialize deduplication set
         self.seen_texts = set()
 
-    def process_item(self, item, spider):
+    async def process_item(self, item, spider):
         url = item.get("url")
         headings = item.get("headings", [])
         paragraphs = item.get("paragraphs", [])
@@ -52,8 +53,12 @@ class MarkdownPipeline:
         with open(log_path, "a", encoding="utf-8") as f:
             f.write(markdown)
 
-        # PUSH DIRECTLY from pipeline in this architecture
-        logger.info(f"Pipeline pushing content to LightRAG for {document_id}")
-        self.rag_client.ingest_text(document_id, markdown, collection=collection)
+        # PUSH DIRECTLY from pipeline in this architecture; pages are batched and sent in the
+        # background, this only waits when RAG_MAX_IN_FLIGHT requests are already outstanding
+        await self.rag_client.push(document_id, markdown, collection=collection)
         
         return item
+
+    def close_spider(self, spider):
+        # The crawl only finishes once every buffered page is sent or spooled
+        return deferred_from_coro(self.rag_client.close())
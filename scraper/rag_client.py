@@ -1,30 +1,198 @@
 import os
-import requests
+import json
+import time
+import uuid
+import random
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import httpx
 from loguru import logger
 
+# A batch is sent once it holds this many pages or characters, whichever comes first
+MAX_BATCH_CHARS = 1_000_000
+# After a batch has exhausted its retries, new batches go straight to the spool for this long
+# instead of each waiting out its own retries against an API that is down
+SPOOL_ONLY_SECONDS = 30.0
+
+
 class LightRAGClient:
+    """
+    Pushes crawled pages to the LightRAG API without stalling the crawl. Pages are buffered
+    per (document_id, collection) and sent as one /ingest_text request per batch of up to
+    RAG_BATCH_PAGES pages, over one pooled connection set, with at most RAG_MAX_IN_FLIGHT
+    requests at once (push() waits for a free slot, which slows the crawl to the API's pace).
+    Connection errors, 429 and 5xx answers are retried with exponential backoff, honouring
+    Retry-After. A batch the API rejects as too large (413) is split in half and each half
+    sent on its own. A batch that still fails, or that the API rejects (e.g. 401/403 after a
+    token rotation), is counted as failed and written to RAG_SPOOL_DIR; close() flushes the
+    buffers and sends the spool again, and what is still undeliverable then stays spooled for
+    the next crawl. No page is dropped.
+    """
+
     def __init__(self):
-        self.base_url = os.getenv("LIGHTRAG_API_URL", "http://localhost:8000")
+        self.base_url = os.getenv("LIGHTRAG_API_URL", "http://localhost:8000").rstrip("/")
         self.api_token = os.getenv("API_TOKEN")
+        self.batch_pages = max(1, int(os.getenv("RAG_BATCH_PAGES", "20")))
+        self.max_in_flight = max(1, int(os.getenv("RAG_MAX_IN_FLIGHT", "4")))
+        self.max_retries = max(0, int(os.getenv("RAG_MAX_RETRIES", "5")))
+        self.spool_dir = os.getenv("RAG_SPOOL_DIR", os.path.join(os.getcwd(), "rag-spool"))
 
-    def ingest_text(self, document_id: str, text: str, collection: str = None):
-        url = f"{self.base_url}/ingest_text"
         headers = {}
         if self.api_token:
             headers["Authorization"] = f"Bearer {self.api_token}"
-        
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url, headers=headers, timeout=60,
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight),
+        )
+        self._buffers: Dict[Tuple[str, Optional[str]], List[str]] = {}
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._tasks = set()
+        self._spool_only_until = 0.0
+        self.pages = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+        self.spooled = 0
+
+    async def push(self, document_id: str, text: str, collection: str = None):
+        """Buffer one page; sends its batch in the background once the batch is full."""
+        key = (document_id, collection)
+        buffer = self._buffers.setdefault(key, [])
+        buffer.append(text)
+        self.pages += 1
+        if len(buffer) >= self.batch_pages or sum(len(t) for t in buffer) >= MAX_BATCH_CHARS:
+            del self._buffers[key]
+            await self._start(self._batch(document_id, collection, buffer))
+
+    async def close(self):
+        """Send every buffered page, wait for all requests, retry the spool and close the pool."""
+        try:
+            for (document_id, collection), buffer in list(self._buffers.items()):
+                await self._start(self._batch(document_id, collection, buffer))
+            self._buffers.clear()
+            if self._tasks:
+                await asyncio.gather(*self._tasks)
+            # Spooled batches are sent at the end, when the API has had the longest to come back
+            self._spool_only_until = 0.0
+            for path in self._spooled_files():
+                await self._slots.acquire()
+                task = asyncio.ensure_future(self._resend(path))
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+            if self._tasks:
+                await asyncio.gather(*self._tasks)
+        finally:
+            await self._client.aclose()
+        left = len(self._spooled_files())
+        log = logger.error if left else logger.info
+        log(f"LightRAG client: {self.pages} pages in {self.batches} batches sent, {self.retries} retries, "
+            f"{self.failed} batches failed, {self.spooled} spooled"
+            + (f", {left} still undelivered in {self.spool_dir}" if left else ""))
+
+    @staticmethod
+    def _batch(document_id: str, collection: Optional[str], pages: List[str]) -> dict:
+        # Pages are kept apart (and spooled that way) so a batch can be split
+        return {"document_id": document_id, "collection": collection, "pages": pages}
+
+    @staticmethod
+    def _form(batch: dict) -> dict:
         data = {
-            "document_id": document_id,
-            "text": text
+            "document_id": batch["document_id"],
+            "text": "\n".join(batch["pages"]),
+            # Crawled pages are Markdown (see pipelines.MarkdownPipeline): chunk along their structure
+            "strategy": "markdown"
         }
-        if collection:
-            data["collection"] = collection
-        
-        try:
-            logger.info(f"Pushing crawled content to LightRAG: {document_id}")
-            response = requests.post(url, data=data, headers=headers, timeout=60)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to push to LightRAG: {e}")
-            return None
+        if batch["collection"]:
+            data["collection"] = batch["collection"]
+        return data
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _start(self, batch: dict):
+        await self._slots.acquire()
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    async def _send(self, batch: dict):
+        if time.monotonic() < self._spool_only_until or not await self._post(batch):
+            self._spool(batch)
+
+    async def _resend(self, path: str):
+        if time.monotonic() < self._spool_only_until:
+            return  # the API is still down; left for the next crawl
+        with open(path, "r", encoding="utf-8") as f:
+            batch = json.load(f)
+        if "pages" not in batch:
+            # Spooled before batches kept their pages apart
+            batch = {"document_id": batch["document_id"], "collection": batch.get("collection"), "pages": [batch["text"]]}
+        if await self._post(batch):
+            os.remove(path)
+
+    async def _post(self, batch: dict) -> bool:
+        """
+        Send one batch, retrying transient failures. True once it is delivered (a split batch:
+        once each half is delivered or spooled), False if it should be spooled.
+        """
+        document_id, pages = batch["document_id"], batch["pages"]
+        for attempt in range(self.max_retries + 1):
+            delay = min(30.0, 2 ** attempt) * (0.5 + random.random() / 2)
+            try:
+                response = await self._client.post("/ingest_text", data=self._form(batch))
+            except httpx.TransportError as e:
+                error = str(e) or type(e).__name__
+            else:
+                if response.is_success:
+                    self.batches += 1
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        body = None
+                    if not isinstance(body, dict):
+                        # Delivered all the same, e.g. through a proxy answering with an empty body
+                        logger.warning(f"LightRAG accepted {len(pages)} pages of {document_id} without a job in its "
+                                       f"answer: {response.status_code} {response.text[:200]!r}")
+                        return True
+                    logger.info(f"Pushed {len(pages)} pages of {document_id} to LightRAG (job {body.get('job_id')})")
+                    return True
+                if response.status_code == 413 and len(pages) > 1:
+                    half = len(pages) // 2
+                    logger.warning(f"LightRAG rejected a batch of {len(pages)} pages of {document_id} as too large, splitting it")
+                    await self._send({**batch, "pages": pages[:half]})
+                    await self._send({**batch, "pages": pages[half:]})
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    # Sending it again now cannot help (auth, validation, size); it is kept in the
+                    # spool for a later attempt, e.g. once the token is fixed
+                    logger.error(f"LightRAG rejected a batch of {len(pages)} pages of {document_id}: "
+                                 f"{response.status_code} {response.text[:200]}")
+                    self.failed += 1
+                    return False
+                error = f"{response.status_code} {response.text[:200]}"
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            if attempt == self.max_retries:
+                logger.error(f"Failed to push a batch of {document_id} to LightRAG after {attempt + 1} attempts: {error}")
+                self.failed += 1
+                self._spool_only_until = time.monotonic() + SPOOL_ONLY_SECONDS
+                return False
+            self.retries += 1
+            logger.warning(f"Pushing a batch of {document_id} to LightRAG failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def _spool(self, batch: dict):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(batch, f)
+        os.replace(path + ".tmp", path)
+        self.spooled += 1
+        logger.warning(f"Spooled {len(batch['pages'])} pages of {batch['document_id']} to {path}")
+
+    def _spooled_files(self) -> List[str]:
+        if not os.path.isdir(self.spool_dir):
+            return []
+        return sorted(os.path.join(self.spool_dir, name) for name in os.listdir(self.spool_dir) if name.endswith(".json"))
@@ -6,6 +6,16 @@ BASE_URL = "http://127.0.0.1:8000"
 DOC_ID = "sim_studio_test_001"
 PDF_PATH = "sample.pdf"
 
+def wait_for_job(job_id, timeout=300):
+    """Ingests are queued as jobs: poll until this one has finished."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BASE_URL}/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(1)
+    return job
+
 def test_flow():
     print("--- Starting LightRAG API Integration Test ---")
     
@@ -26,6 +36,8 @@ def test_flow():
             data={"document_id": DOC_ID}
         )
     print(f"Ingest Status: {r.status_code} - {r.json()}")
+    job = wait_for_job(r.json()["job_id"])
+    print(f"Ingest Job: {job['status']} - {job['result'] or job['error']}")
 
     # 3. Query
     print("\nQuerying: 'What is this document about?'")
@@ -43,6 +55,8 @@ def test_flow():
             data={"document_id": DOC_ID}
         )
     print(f"Update Status: {r.status_code} - {r.json()}")
+    job = wait_for_job(r.json()["job_id"])
+    print(f"Update Job: {job['status']} - {job['result'] or job['error']}")
 
     # 5. Delete
     print(f"\nDeleting document {DOC_ID}...")
@@ -0,0 +1,82 @@
+import json
+import pytest
+from config import EmbeddingConfig
+from embeddings import EmbeddingService
+from chunking import Chunker
+from ingestion.bulk import BulkIngestor, StoreBatchWriter, WRITING, text_hash
+
+TEXT = "".join(f"{i:03d} " * 25 for i in range(4))  # four 100-character chunks
+
+
+def ingestor(write, lookup, chunker=None):
+    # Mock embeddings, two chunks per group
+    config = EmbeddingConfig(provider="mock", model="mock", api_key=None, base_url=None, batch_size=2, max_concurrency=1)
+    return BulkIngestor(EmbeddingService(config), chunker or Chunker(chunk_size=100, chunk_overlap=0), write, lookup)
+
+
+def records(*docs):
+    return [json.dumps({"document_id": document_id, "text": text}) for document_id, text in docs]
+
+
+class FailingWriter(StoreBatchWriter):
+    """Fails the nth batch it is given."""
+
+    def __init__(self, store_path: str, fail_on: int):
+        super().__init__(store_path)
+        self.calls = 0
+        self.fail_on = fail_on
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise IOError("disk full")
+        super().__call__(*args)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store")
+
+
+def test_unchanged_documents_are_skipped_and_changed_ones_replaced(path):
+    writer = StoreBatchWriter(path)
+    progress = ingestor(writer, writer.lookup).run(records(("a", TEXT), ("b", "short text")))
+    assert (progress.documents, progress.chunks) == (2, 5)
+
+    writer = StoreBatchWriter(path)
+    progress = ingestor(writer, writer.lookup).run(records(("a", TEXT), ("b", "other text")))
+    assert (progress.documents, progress.unchanged) == (1, 1)
+    info = writer.store.document_info("b")
+    assert info["chunks"] == 1
+    assert info["content_hash"] == text_hash("other text")
+    assert writer.store.document_info("a")["chunks"] == 4
+
+
+def test_document_spanning_groups_is_not_unchanged_after_a_failed_group(path):
+    writer = FailingWriter(path, fail_on=2)
+    with pytest.raises(IOError):
+        ingestor(writer, writer.lookup).run(records(("a", TEXT)))
+    # The first group is committed, but not with the document's hash
+    info = StoreBatchWriter(path).lookup("a")
+    assert info["chunks"] == 2
+    assert info["content_hash"] == WRITING
+
+    writer = StoreBatchWriter(path)
+    progress = ingestor(writer, writer.lookup).run(records(("a", TEXT)))
+    assert (progress.documents, progress.unchanged) == (1, 0)
+    info = writer.store.document_info("a")
+    assert info["chunks"] == 4
+    assert info["content_hash"] == text_hash(TEXT)
+
+    writer = StoreBatchWriter(path)
+    progress = ingestor(writer, writer.lookup).run(records(("a", TEXT)))
+    assert (progress.documents, progress.unchanged) == (0, 1)
+
+
+def test_hash_is_committed_with_the_group_holding_the_last_chunk(path):
+    # The document's last chunk fills a group exactly, so the next flush comes after it
+    text = TEXT[:200]
+    writer = FailingWriter(path, fail_on=2)
+    with pytest.raises(IOError):
+        ingestor(writer, writer.lookup).run(records(("a", text), ("b", TEXT)))
+    assert StoreBatchWriter(path).lookup("a")["content_hash"] == text_hash(text)
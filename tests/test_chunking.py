@@ -0,0 +1,95 @@
+import pytest
+from utils import Document
+from chunking import create_chunker, MarkdownChunker, CHUNK_STRATEGIES
+
+PROSE = " ".join(f"Sentence number {i} talks about topic {i % 7} at some length." for i in range(80))
+RUN_ON = "word " * 600  # no sentence ends at all
+
+# One crawled page as scraper/pipelines.MarkdownPipeline writes it
+PAGE = """## URL: https://example.com/{name}
+
+### Headings
+{name} title | {name} subtitle
+
+### Content
+{body}
+
+- first item of {name}
+- second item of {name}
+"""
+
+CODE = """## URL: https://example.com/code
+
+### Content
+An introduction to the function below, long enough to fill most of a chunk on its own.
+
+```python
+def function():
+
+    # A blank line inside the fence does not end the block
+    return "value"
+```
+
+---
+
+Footer.
+"""
+
+
+def markdown(*names: str) -> str:
+    return "\n".join(PAGE.format(name=name, body=PROSE if name == "long" else f"Short body of {name}.") for name in names)
+
+
+def chunks_of(chunker, text: str):
+    return [(c.start, c.end, c.text) for c in chunker.iter_split([Document(text=text, metadata={})])]
+
+
+@pytest.mark.parametrize("strategy", [s for s in CHUNK_STRATEGIES if s != "fixed"])
+@pytest.mark.parametrize("max_tokens, overlap_tokens", [(32, 0), (64, 16)])
+@pytest.mark.parametrize("text", [PROSE, RUN_ON, markdown("alpha", "long", "beta") + CODE], ids=["prose", "run-on", "markdown"])
+def test_no_chunk_exceeds_max_tokens(strategy, max_tokens, overlap_tokens, text):
+    chunker = create_chunker(strategy, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    chunks = chunks_of(chunker, text)
+    assert chunks
+    assert all(chunker.tokenizer.count(t) <= max_tokens for _, _, t in chunks)
+    # Together the chunks cover every word of the text (a Markdown rule is a break, not content)
+    covered = set()
+    for start, end, _ in chunks:
+        covered.update(range(start, end))
+    rule = text.find("\n---\n") + 1
+    assert all(i in covered for i, ch in enumerate(text) if not ch.isspace() and not rule <= i < rule + 3)
+
+
+def test_markdown_chunks_stay_within_their_page():
+    text = markdown("alpha", "beta", "gamma")
+    pages = [text.index(f"## URL: https://example.com/{name}") for name in ("alpha", "beta", "gamma")] + [len(text)]
+    chunker = MarkdownChunker(max_tokens=200, overlap_tokens=20)
+    chunks = chunks_of(chunker, text)
+    for start, end, _ in chunks:
+        page = max(i for i, page_start in enumerate(pages) if page_start <= start)
+        assert end <= pages[page + 1]
+    # Each page's heading starts a chunk, together with the block that follows it
+    starts = {start for start, _, _ in chunks}
+    assert set(pages[:-1]) <= starts
+    first = next(t for s, _, t in chunks if s == pages[1])
+    assert "beta title" in first
+
+
+def test_markdown_code_blocks_stay_whole_and_rules_break():
+    chunker = MarkdownChunker(max_tokens=40)
+    texts = [t for _, _, t in chunks_of(chunker, CODE)]
+    code = CODE[CODE.index("```python"):CODE.index("```\n\n---") + 3]
+    assert chunker.tokenizer.count(code) <= 40
+    assert code in texts
+    # The footer after the horizontal rule is a chunk of its own
+    assert texts[-1] == "Footer."
+
+
+def test_markdown_long_section_is_split_between_sentences():
+    text = markdown("long")
+    chunker = MarkdownChunker(max_tokens=60)
+    body = [t for _, _, t in chunks_of(chunker, text) if "Sentence number" in t]
+    assert len(body) > 1
+    # Cut only between sentences; the list after the section may join the last piece
+    assert all(t.split("\n\n- ")[0].endswith(".") for t in body)
+    assert all(t.startswith("Sentence number") for t in body[1:])
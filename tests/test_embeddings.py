@@ -0,0 +1,146 @@
+import asyncio
+import random
+import threading
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from config import EmbeddingConfig
+from embeddings import EmbeddingService
+from embeddings import cache as cache_module
+from embeddings.batching import plan_batches
+from embeddings.cache import EmbeddingCache
+
+
+def words(text: str) -> int:
+    return len(text.split())
+
+
+def test_batches_respect_item_and_token_limits():
+    texts = [" ".join(["w"] * n) for n in (3, 4, 2, 9, 1, 1, 1, 1, 5)]
+    batches, tokens = plan_batches(texts, max_items=3, max_tokens=8, count_tokens=words)
+    assert tokens == 27
+    # Contiguous, in order and covering every text
+    assert [lo for lo, _ in batches] == [0] + [hi for _, hi in batches[:-1]]
+    assert batches[-1][1] == len(texts)
+    for lo, hi in batches:
+        assert hi - lo <= 3
+        # Only a text over the limit on its own may exceed it
+        assert sum(words(t) for t in texts[lo:hi]) <= 8 or hi - lo == 1
+    assert (3, 4) in batches  # the 9-token text
+
+
+def test_no_batches_for_no_texts():
+    assert plan_batches([], 10, 100, words) == ([], 0)
+
+
+class FakeEmbeddings:
+    """An embeddings API answering with each text's number, in a shuffled order, after a short delay."""
+
+    def __init__(self):
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _response(self, input, model):
+        with self._lock:
+            self.requests.append(list(input))
+        data = [SimpleNamespace(index=i, embedding=[float(text.split()[-1]), 0.0]) for i, text in enumerate(input)]
+        random.shuffle(data)
+        return SimpleNamespace(data=data)
+
+    def create(self, input, model):
+        threading.Event().wait(random.random() / 100)
+        return self._response(input, model)
+
+    async def acreate(self, input, model):
+        await asyncio.sleep(random.random() / 100)
+        return self._response(input, model)
+
+
+@pytest.fixture
+def service():
+    config = EmbeddingConfig(provider="mock", model="text-embedding-3-small", api_key=None, base_url=None,
+                             batch_size=7, batch_tokens=40, max_concurrency=3)
+    svc = EmbeddingService(config)
+    # The OpenAI code path, against a fake API
+    config.provider = "openai"
+    fake = FakeEmbeddings()
+    svc.client = SimpleNamespace(embeddings=SimpleNamespace(create=fake.create))
+    svc.async_client = SimpleNamespace(embeddings=SimpleNamespace(create=fake.acreate))
+    svc.fake = fake
+    return svc
+
+
+def texts_of(n: int):
+    # Uneven lengths, so token limits and item limits both cut batches
+    return [" ".join(["word"] * (i % 9)) + f" {i}" for i in range(n)]
+
+
+def test_embed_keeps_input_order_across_concurrent_batches(service):
+    texts = texts_of(100)
+    vectors = service.embed(texts)
+    assert vectors[:, 0].tolist() == list(range(100))
+    assert len(service.fake.requests) > 1
+    for request in service.fake.requests:
+        assert len(request) <= 7
+        assert sum(service._count_tokens(t) for t in request) <= 40 or len(request) == 1
+    assert service.tokens_sent == sum(service._count_tokens(t) for t in texts)
+
+
+def test_aembed_keeps_input_order(service):
+    vectors = asyncio.run(service.aembed(texts_of(60)))
+    assert vectors[:, 0].tolist() == list(range(60))
+    assert all(len(request) <= 7 for request in service.fake.requests)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Strictly increasing last_used times, however fast the test runs
+    ticks = iter(range(1, 1_000_000))
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def vectors(*values):
+    return np.array([[v, 0, 0, 0] for v in values], dtype="float32")
+
+
+def test_cache_counts_hits_and_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("openai", "m", ["a", "b"], vectors(1, 2))
+    found = cache.get_many("openai", "m", ["a", "c", "b", "a"])
+    assert [None if v is None else v[0] for v in found] == [1, None, 2, 1]
+    assert (cache.hits, cache.misses) == (3, 1)
+    # Keyed by provider and model too
+    assert cache.get_many("azure", "m", ["a"]) == [None]
+    assert cache.get_many("openai", "other", ["a"]) == [None]
+    assert cache.stats()["hit_rate"] == 3 / 6
+
+    cache.close()
+    reopened = EmbeddingCache(str(tmp_path / "cache.db"))
+    assert reopened.stats()["entries"] == 2
+    assert reopened.get_many("openai", "m", ["b"])[0][0] == 2
+
+
+def test_cache_evicts_least_recently_used_at_its_size_cap(tmp_path, clock):
+    # 16-byte vectors: room for 10
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_bytes=160)
+    cache.put_many("openai", "m", [f"t{i}" for i in range(10)], vectors(*range(10)))
+    assert cache.stats()["entries"] == 10
+    cache.get_many("openai", "m", ["t0", "t1"])  # now the most recently used
+
+    cache.put_many("openai", "m", ["t10"], vectors(10))
+    # Over the cap: evicted down to 90% of it, oldest first
+    assert cache.stats()["bytes"] <= 144
+    left = [t for t, v in zip([f"t{i}" for i in range(11)], cache.get_many("openai", "m", [f"t{i}" for i in range(11)]))
+            if v is not None]
+    assert left == ["t0", "t1"] + [f"t{i}" for i in range(4, 11)]
+
+
+def test_service_only_embeds_cache_misses(service, tmp_path):
+    service.cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    first = service.embed(["x 1", "y 2"])
+    second = service.embed(["y 2", "z 3", "x 1", "z 3"])
+    assert second[:, 0].tolist() == [2, 3, 1, 3]
+    np.testing.assert_array_equal(second[[2, 0]], first)
+    # Only "z 3" reached the API the second time, once
+    assert service.fake.requests[-1] == ["z 3"]
+    assert (service.cache.hits, service.cache.misses) == (2, 4)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from utils import Document
+from vectorstore import VectorStore, MetadataFilter
+
+DIM = 8
+N = 300
+VECTORS = np.random.default_rng(0).random((N, DIM), dtype="float32")
+
+
+@pytest.fixture(scope="module")
+def store():
+    docs = []
+    for i in range(N):
+        metadata = {"document_id": f"doc{i % 30}", "source": "rare.pdf" if i % 50 == 0 else "common.pdf", "page": i % 10}
+        if i % 3 == 0:
+            metadata["collection"] = "hr"
+        docs.append(Document(text=f"chunk {i}", metadata=metadata))
+    store = VectorStore(DIM)
+    store.add(docs, VECTORS)
+    return store
+
+
+def brute_force(store, query, k, keep):
+    rows = [i for i in range(N) if keep(store.table[i].metadata)]
+    distances = ((VECTORS[rows] - query) ** 2).sum(axis=1)
+    return [f"chunk {rows[j]}" for j in np.argsort(distances, kind="stable")[:k]]
+
+
+@pytest.mark.parametrize("filters, keep", [
+    (MetadataFilter(sources=["rare.pdf"]), lambda m: m["source"] == "rare.pdf"),
+    (MetadataFilter(document_ids=["doc7", "doc8"]), lambda m: m["document_id"] in ("doc7", "doc8")),
+    (MetadataFilter(page_min=3, page_max=4), lambda m: 3 <= m["page"] <= 4),
+    (MetadataFilter(collections=["hr"], page_max=0), lambda m: m.get("collection") == "hr" and m["page"] == 0),
+])
+def test_filtered_query_returns_exactly_k_matches(store, filters, keep):
+    query = np.full(DIM, 0.5, dtype="float32")
+    results = store.query(query, k=5, filters=filters)
+    assert len(results) == 5
+    assert all(keep(doc.metadata) for doc in results)
+    # Exact on flat partitions: the same as ranking only the matching chunks
+    assert [doc.text for doc in results] == brute_force(store, query, 5, keep)
+
+
+def test_filter_with_fewer_matches_than_k_returns_them_all(store):
+    results = store.query(np.zeros(DIM, dtype="float32"), k=20, filters=MetadataFilter(sources=["rare.pdf"]))
+    assert sorted(doc.text for doc in results) == sorted(f"chunk {i}" for i in range(0, N, 50))
+
+
+def test_collection_query_with_filter(store):
+    query = np.full(DIM, 0.2, dtype="float32")
+    filters = MetadataFilter(document_ids=["doc3"])
+    results = store.query(query, k=4, collection="hr", filters=filters)
+    # The hr partition plus chunks without a collection: doc3's chunks are all in hr (3 | i)
+    keep = lambda m: m["document_id"] == "doc3"
+    assert [doc.text for doc in results] == brute_force(store, query, 4, keep)
+
+
+def test_empty_list_matches_nothing(store):
+    assert store.query(np.zeros(DIM, dtype="float32"), k=5, filters=MetadataFilter(sources=[])) == []
@@ -0,0 +1,130 @@
+import time
+import threading
+import pytest
+from utils import Document
+from ingestion.jobs import IngestJobQueue, QueueFull
+
+
+def wait(job, timeout: float = 5.0):
+    deadline = time.time() + timeout
+    while not job.finished:
+        assert time.time() < deadline, f"job {job.id} did not finish"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture
+def queue():
+    q = IngestJobQueue(workers=1, max_queued=2)
+    yield q
+    q.close(timeout=5)
+
+
+def block(queue):
+    """Occupy the single worker until the returned event is set."""
+    gate = threading.Event()
+    job, _ = queue.submit("blocker", lambda job: gate.wait(), "text", "blocker")
+    while job.status != "running":
+        time.sleep(0.01)
+    return gate
+
+
+def test_identical_submission_in_flight_is_deduplicated(queue):
+    gate = block(queue)
+    first, created = queue.submit("key", lambda job: {"chunks": 1}, "text", "doc")
+    again, created_again = queue.submit("key", lambda job: {"chunks": 2}, "text", "doc")
+    assert created and not created_again
+    assert again is first
+    assert queue.position(first) == 0
+
+    gate.set()
+    assert wait(first).result == {"chunks": 1}
+    assert queue.stats()["succeeded"] == 2
+
+
+def test_resubmission_after_the_job_finished_runs_again(queue):
+    first, _ = queue.submit("key", lambda job: {"run": 1}, "text", "doc")
+    wait(first)
+    second, created = queue.submit("key", lambda job: {"run": 2}, "text", "doc")
+    assert created
+    assert second.id != first.id
+    assert wait(second).result == {"run": 2}
+    assert queue.get(first.id) is first
+
+
+def test_full_queue_raises_queue_full(queue):
+    gate = block(queue)
+    queue.submit("a", lambda job: None, "text", "a")
+    queue.submit("b", lambda job: None, "text", "b")
+    with pytest.raises(QueueFull):
+        queue.submit("c", lambda job: None, "text", "c")
+    # A duplicate of a queued job is not a new job, so it is still accepted
+    job, created = queue.submit("a", lambda job: None, "text", "a")
+    assert not created
+    gate.set()
+    wait(job)
+    assert queue.stats()["queued"] == 0
+
+
+def test_failing_job_reports_its_error(queue):
+    def run(job):
+        raise ValueError("Failed to extract text from PDF.")
+
+    job, _ = queue.submit("bad", run, "pdf", "doc")
+    wait(job)
+    assert job.status == "failed"
+    assert job.error == "Failed to extract text from PDF."
+    assert job.to_dict()["error"] == "Failed to extract text from PDF."
+    assert queue.stats()["failed"] == 1
+    # The key is free again once the job has failed
+    _, created = queue.submit("bad", lambda job: None, "pdf", "doc")
+    assert created
+
+
+def test_stages_and_progress(queue):
+    seen = {}
+    pages = [Document(text=f"page {i}", metadata={"page": i, "total_pages": 3}) for i in range(3)]
+
+    def run(job):
+        seen["start"] = job.stage
+        for _ in job.track(pages, "pages", "extracting"):
+            pass
+        seen["after_pages"] = job.stage
+        for _ in job.track(range(7), "chunks", "chunking"):
+            pass
+        seen["after_chunks"] = job.stage
+        for _ in job.track(range(7), "embedded", "embedding"):
+            pass
+        seen["after_embedding"] = job.stage
+        return {"chunks": 7}
+
+    gate = block(queue)
+    job, _ = queue.submit("doc", run, "pdf", "doc")
+    assert (job.status, job.stage) == ("queued", "queued")
+    gate.set()
+    wait(job)
+
+    assert seen == {"start": "extracting", "after_pages": "chunking",
+                    "after_chunks": "embedding", "after_embedding": "saving"}
+    assert (job.status, job.stage) == ("succeeded", "done")
+    report = job.to_dict()
+    assert report["progress"] == {"pages": 3, "total_pages": 3, "chunks": 7, "embedded_chunks": 7}
+    assert report["result"] == {"chunks": 7}
+    assert queue.position(job) is None
+
+
+def test_text_jobs_start_at_chunking(queue):
+    job, _ = queue.submit("t", lambda job: job.stage, "text", "doc")
+    assert wait(job).result == "chunking"
+
+
+def test_close_fails_queued_jobs():
+    queue = IngestJobQueue(workers=1, max_queued=5)
+    gate = block(queue)
+    queued, _ = queue.submit("a", lambda job: None, "text", "a")
+    threading.Timer(0.1, gate.set).start()
+    queue.close(timeout=5)
+    assert queued.status == "failed"
+    assert "Shut down" in queued.error
+    with pytest.raises(RuntimeError):
+        queue.submit("b", lambda job: None, "text", "b")
@@ -0,0 +1,70 @@
+import os
+import numpy as np
+import pytest
+from utils import Document
+from vectorstore import VectorStore
+from vectorstore import segment as seg
+
+DIM = 8
+
+
+def add(store: VectorStore, document_id: str, n: int, content_hash: str = None, collection: str = None):
+    metadata = {"document_id": document_id, "source": f"{document_id}.pdf"}
+    if collection:
+        metadata["collection"] = collection
+    docs = [Document(text=f"{document_id} chunk {i}", metadata=dict(metadata)) for i in range(n)]
+    vectors = np.random.default_rng(len(store.registry)).random((n, DIM), dtype="float32")
+    store.add(docs, vectors, {document_id: content_hash} if content_hash else None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store")
+
+
+@pytest.fixture
+def store(path):
+    store = VectorStore(DIM)
+    store.tombstone_ratio = 1.0   # deletes stay tombstones until compacted explicitly
+    add(store, "a", 5, "hash-a1")
+    add(store, "b", 3, "hash-b", collection="hr")
+    store.save(path)
+    return store
+
+
+def test_registry_is_replayed_from_the_wal(store, path):
+    add(store, "c", 4, "hash-c")
+    add(store, "a", 2, "hash-a2")   # re-ingested: more chunks and a new hash
+    store.delete_by_metadata("document_id", "b")
+    store.save(path)
+    assert store._wal.rows == 6   # not checkpointed: everything above is only in the log
+
+    loaded = VectorStore.load(path)
+    assert loaded.registry.entries == store.registry.entries
+    assert loaded.document_info("a") == {**store.document_info("a"), "chunks": 7, "content_hash": "hash-a2"}
+    assert loaded.document_info("c")["content_hash"] == "hash-c"
+    assert loaded.document_info("b") is None
+    assert loaded.registry.ids_of("a").tolist() == [0, 1, 2, 3, 4, 12, 13]
+
+
+def test_registry_survives_checkpoint_and_compaction(store, path):
+    add(store, "c", 4, "hash-c")
+    store.delete_by_metadata("document_id", "a")
+    store.save(path)
+    store.checkpoint()
+    generation = store.generation
+    assert os.path.exists(os.path.join(path, seg.registry_name(generation)))
+
+    loaded = VectorStore.load(path)
+    assert loaded._wal.rows == 0
+    assert loaded.list_documents() == store.list_documents()
+    assert set(loaded.list_documents()) == {"b", "c"}
+
+    # Compaction drops the deleted chunks; ids, and so the registry, stay as they were
+    store.compact()
+    assert store.rows == 7
+    assert not os.path.exists(os.path.join(path, seg.registry_name(generation)))
+    loaded = VectorStore.load(path)
+    assert loaded.registry.entries == store.registry.entries
+    info = loaded.document_info("b")
+    assert (info["source"], info["collection"], info["content_hash"], info["chunks"]) == ("b.pdf", "hr", "hash-b", 3)
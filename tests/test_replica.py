@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from utils import Document
+from vectorstore import VectorStore
+from vectorstore.replica import StoreReplica
+
+DIM = 8
+
+
+def add(store: VectorStore, start: int, n: int):
+    docs = [Document(text=f"chunk {i}", metadata={"document_id": f"doc{i // 10}", "source": "test"})
+            for i in range(start, start + n)]
+    store.add(docs, vectors_for(start, n))
+
+
+def vectors_for(start: int, n: int) -> np.ndarray:
+    return np.stack([np.random.default_rng(i).random(DIM, dtype="float32") * 10 for i in range(start, start + n)])
+
+
+def nearest_text(store: VectorStore, i: int) -> str:
+    return store.query(vectors_for(i, 1)[0], k=1)[0].text
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store")
+
+
+@pytest.fixture
+def writer(path):
+    store = VectorStore(DIM)
+    store.tombstone_ratio = 1.0   # compacted explicitly below
+    add(store, 0, 20)
+    store.save(path)
+    return store
+
+
+def test_catch_up_applies_wal_appends(writer, path):
+    replica = VectorStore.load(path, read_only=True)
+    assert replica.catch_up() == 0
+
+    add(writer, 20, 10)
+    writer.delete_by_metadata("document_id", "doc0")
+    assert replica.catch_up() == 0   # nothing logged before the writer saves
+    writer.save(path)
+
+    assert replica.catch_up() > 0
+    assert replica.count == writer.count == 20
+    assert nearest_text(replica, 25) == "chunk 25"
+    assert nearest_text(replica, 5) != "chunk 5"
+    assert replica.list_documents() == writer.list_documents()
+    assert replica.generation == writer.generation
+    with pytest.raises(RuntimeError):
+        replica.save(path)
+
+
+def test_replica_moves_to_a_new_generation(writer, path):
+    replica = StoreReplica(path, poll_interval=3600)   # refreshed by hand below
+    try:
+        before = replica.store
+        add(writer, 20, 10)
+        writer.save(path)
+        assert replica.refresh() is before   # a log append is caught up in place
+        assert before.count == 30
+
+        writer.delete_by_metadata("document_id", "doc1")
+        writer.save(path)
+        writer.compact()
+        store = replica.refresh()
+        assert store is not before
+        assert (replica.reloads, store.generation) == (2, writer.generation)
+        assert store.rows == store.count == 20
+        assert nearest_text(store, 27) == "chunk 27"
+        # A query on the old version still answers from the files it has mapped
+        assert nearest_text(before, 3) == "chunk 3"
+    finally:
+        replica.close()
@@ -0,0 +1,294 @@
+import os
+import threading
+import numpy as np
+import pytest
+from utils import Document
+from vectorstore import VectorStore, MetadataFilter
+from vectorstore import segment as seg
+
+DIM = 8
+
+
+def make_docs(start: int, n: int):
+    docs = [Document(text=f"chunk {i}", metadata={"document_id": f"doc{i // 10}", "source": "test"})
+            for i in range(start, start + n)]
+    return docs, vectors_for(start, n)
+
+
+def vectors_for(start: int, n: int) -> np.ndarray:
+    # Deterministic, well separated vectors: chunk i is its own nearest neighbour
+    return np.stack([np.random.default_rng(i).random(DIM, dtype="float32") * 10 for i in range(start, start + n)])
+
+
+def add(store: VectorStore, start: int, n: int):
+    docs, vectors = make_docs(start, n)
+    store.add(docs, vectors)
+
+
+def texts(store: VectorStore):
+    return [doc.text for doc in store.iter_documents()]
+
+
+def assert_same_store(a: VectorStore, b: VectorStore):
+    assert a.count == b.count
+    assert texts(a) == texts(b)
+    np.testing.assert_array_equal(a.ids, b.ids)
+    np.testing.assert_array_equal(a.table.vectors(0, a.rows), b.table.vectors(0, b.rows))
+    assert a.list_documents() == b.list_documents()
+
+
+def nearest_text(store: VectorStore, i: int) -> str:
+    return store.query(vectors_for(i, 1)[0], k=1)[0].text
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store")
+
+
+def test_save_appends_to_wal_and_reloads(path):
+    store = VectorStore(DIM)
+    add(store, 0, 20)
+    store.save(path)
+    add(store, 20, 15)
+    store.save(path)
+
+    assert len(store._manifest["segments"]) == 1
+    assert store._wal.rows == 15
+    loaded = VectorStore.load(path)
+    assert_same_store(store, loaded)
+    assert nearest_text(loaded, 27) == "chunk 27"
+
+
+def test_replay_drops_torn_wal_tail(path):
+    store = VectorStore(DIM)
+    add(store, 0, 10)
+    store.save(path)
+    add(store, 10, 10)
+    store.save(path)
+    wal_path = store._wal.path
+    good_size = os.path.getsize(wal_path)
+    add(store, 20, 10)
+    store.save(path)
+
+    # Crash in the middle of the last append: only part of its record reached the disk
+    with open(wal_path, "r+b") as f:
+        f.truncate(good_size + (os.path.getsize(wal_path) - good_size) // 2)
+
+    loaded = VectorStore.load(path)
+    assert loaded.count == 20
+    assert texts(loaded) == [f"chunk {i}" for i in range(20)]
+    assert os.path.getsize(wal_path) == good_size
+
+    # The log stays appendable after the truncation
+    add(loaded, 100, 5)
+    loaded.save(path)
+    again = VectorStore.load(path)
+    assert again.count == 25
+    assert nearest_text(again, 102) == "chunk 102"
+
+
+def test_replay_drops_record_with_bad_checksum(path):
+    store = VectorStore(DIM)
+    add(store, 0, 10)
+    store.save(path)
+    add(store, 10, 10)
+    store.save(path)
+    wal_path = store._wal.path
+    good_size = os.path.getsize(wal_path)
+    add(store, 20, 10)
+    store.save(path)
+
+    with open(wal_path, "r+b") as f:
+        f.seek(good_size + 20)
+        byte = f.read(1)
+        f.seek(good_size + 20)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    loaded = VectorStore.load(path)
+    assert loaded.count == 20
+    assert os.path.getsize(wal_path) == good_size
+
+
+def test_checkpoint_at_checkpoint_rows(path):
+    store = VectorStore(DIM)
+    store.checkpoint_rows = 50
+    add(store, 0, 10)
+    store.save(path)
+    wal_id = store._manifest["wal"]
+
+    add(store, 10, 30)
+    store.save(path)
+    assert len(store._manifest["segments"]) == 1
+    assert store._wal.rows == 30
+
+    add(store, 40, 30)
+    store.save(path)
+    # 60 logged rows >= checkpoint_rows: rolled into a second segment and a fresh log
+    assert [s["count"] for s in store._manifest["segments"]] == [10, 60]
+    assert store._manifest["wal"] == wal_id + 1
+    assert store._wal.rows == 0
+    assert store.table.segment_rows == store.rows == 70
+    assert not os.path.exists(os.path.join(path, "wal-%06d.log" % wal_id))
+
+    loaded = VectorStore.load(path)
+    assert loaded._wal.rows == 0
+    assert_same_store(store, loaded)
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to name fsynced descriptors")
+def test_checkpoint_is_durable_before_the_wal_is_removed(path, monkeypatch):
+    store = VectorStore(DIM)
+    add(store, 0, 10)
+    store.save(path)
+    add(store, 10, 10)
+    store.save(path)
+    old_wal = os.path.join(path, "wal-%06d.log" % store._manifest["wal"])
+
+    events = []
+    fsync, remove = os.fsync, os.remove
+    monkeypatch.setattr(os, "fsync", lambda fd: (events.append(("fsync", os.readlink(f"/proc/self/fd/{fd}"))), fsync(fd)))
+    monkeypatch.setattr(os, "remove", lambda p: (events.append(("remove", os.path.realpath(p))), remove(p)))
+    store.checkpoint()
+
+    synced = [p for event, p in events if event == "fsync"]
+    wal_removed = events.index(("remove", os.path.realpath(old_wal)))
+    manifest = os.path.realpath(os.path.join(path, seg.MANIFEST_FILE))
+    # Everything the new manifest references was fsynced before it, and the directory after it
+    segment = os.path.join(path, seg.SEGMENTS_DIR, store._manifest["segments"][-1]["name"])
+    segment_files = [os.path.realpath(os.path.join(segment + ".tmp", name)) for name in os.listdir(segment)]
+    registry = os.path.realpath(os.path.join(path, seg.registry_name(store._manifest["generation"]))) + ".tmp"
+    manifest_synced = synced.index(manifest + ".tmp")
+    assert all(synced.index(p) < manifest_synced for p in segment_files + [registry])
+    assert ("fsync", os.path.realpath(path)) in events[manifest_synced + 1:wal_removed]
+
+
+def test_reload_after_compaction_is_equal(path):
+    store = VectorStore(DIM)
+    for start in range(0, 50, 10):
+        add(store, start, 10)
+        store.save(path)
+        store.checkpoint()
+    assert len(store._manifest["segments"]) == 5
+    generation = store.generation
+
+    store.compact()
+    assert len(store._manifest["segments"]) == 1
+    assert store.generation > generation
+    segments = os.listdir(os.path.join(path, seg.SEGMENTS_DIR))
+    assert segments == [store._manifest["segments"][0]["name"]]
+
+    loaded = VectorStore.load(path)
+    assert_same_store(store, loaded)
+    for i in (0, 17, 49):
+        assert nearest_text(loaded, i) == f"chunk {i}"
+
+
+def test_compaction_concurrent_with_add_and_save(path):
+    store = VectorStore(DIM)
+    store.checkpoint_rows = 25
+    for start in range(0, 200, 20):
+        add(store, start, 20)
+        store.save(path)
+    assert len(store._manifest["segments"]) > 2
+
+    errors = []
+
+    def ingest():
+        try:
+            for start in range(1000, 1300, 10):
+                add(store, start, 10)
+                store.save(path)
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    for _ in range(3):
+        store.compact()
+    writer.join()
+    store.wait_for_compaction()
+    store.save(path)
+
+    assert not errors
+    expected = [f"chunk {i}" for i in list(range(200)) + list(range(1000, 1300))]
+    assert sorted(texts(store)) == sorted(expected)
+    loaded = VectorStore.load(path)
+    assert_same_store(store, loaded)
+    for i in (3, 150, 1005, 1299):
+        assert nearest_text(loaded, i) == f"chunk {i}"
+
+
+def test_deleted_chunks_are_excluded_from_queries():
+    store = VectorStore(DIM)
+    add(store, 0, 30)
+    store.delete_by_metadata("document_id", "doc1")   # chunks 10-19
+
+    assert store.count == 20
+    assert store._deleted_count == 10 and store.rows == 30   # tombstoned, not yet removed
+    # The exact vector of a deleted chunk no longer finds it
+    assert nearest_text(store, 15) != "chunk 15"
+    # Asking for every chunk returns exactly the live ones
+    found = {doc.text for doc in store.query(vectors_for(15, 1)[0], k=30)}
+    assert found == {f"chunk {i}" for i in list(range(10)) + list(range(20, 30))}
+    # Combined with a filter, the tombstones stay excluded
+    docs = store.query(vectors_for(15, 1)[0], k=30, filters=MetadataFilter(document_ids=["doc1", "doc2"]))
+    assert {doc.text for doc in docs} == {f"chunk {i}" for i in range(20, 30)}
+    assert "doc1" not in store.list_documents()
+
+
+def test_deletes_are_replayed_from_the_wal(path):
+    store = VectorStore(DIM)
+    store.tombstone_ratio = 1.0   # keep the delete in the log instead of compacting it away
+    add(store, 0, 30)
+    store.save(path)
+    store.delete_by_metadata("document_id", "doc0")
+    store.save(path)
+    assert store._manifest["tombstones"] == 0   # only in the log so far
+
+    loaded = VectorStore.load(path)
+    assert loaded.count == 20
+    assert "doc0" not in loaded.list_documents()
+    assert nearest_text(loaded, 5) != "chunk 5"
+    assert_same_store(store, loaded)
+
+
+def test_tombstone_ratio_triggers_compaction(path):
+    store = VectorStore(DIM)
+    store.tombstone_ratio = 0.2
+    add(store, 0, 50)
+    store.save(path)
+
+    store.delete_by_metadata("document_id", "doc0")   # 10 of 50: not above the ratio
+    assert store._compactor is None
+    store.delete_by_metadata("document_id", "doc1")   # 20 of 50
+    store.wait_for_compaction()
+
+    assert store.rows == store.count == 30
+    assert store._deleted_count == 0
+    assert store._manifest["tombstones"] == 0
+    loaded = VectorStore.load(path)
+    assert_same_store(store, loaded)
+
+
+def test_ids_are_stable_across_compaction(path):
+    store = VectorStore(DIM)
+    store.tombstone_ratio = 1.0   # compacted explicitly below
+    add(store, 0, 40)
+    store.save(path)
+    store.delete_by_metadata("document_id", "doc1")
+    before = {int(i): doc.text for i, doc in zip(store.ids, store.table)
+              if not store._deleted[i]}
+
+    store.compact()
+    after = {int(i): doc.text for i, doc in zip(store.ids, store.table)}
+    assert after == before
+    # Ids of dropped chunks are not handed out again
+    add(store, 100, 5)
+    assert store.ids[-5:].tolist() == list(range(40, 45))
+    assert store.query(vectors_for(102, 1)[0], k=1)[0].text == "chunk 102"
+
+    store.save(path)
+    loaded = VectorStore.load(path)
+    np.testing.assert_array_equal(loaded.ids, store.ids)
+    assert nearest_text(loaded, 25) == "chunk 25"
@@ -1,2 +1,5 @@
 from .logging import logger, setup_logging
-from .models import Document
+from .models import Document, Chunk
+from .concurrency import run_blocking, configure_executor, ReadWriteLock
+from .metrics import Histogram
+from .tokens import Tokenizer, get_tokenizer
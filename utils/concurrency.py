@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+_executor = None
+_max_workers = 8
+
+
+def configure_executor(max_workers: int):
+    """Set the size of the shared blocking-work pool; takes effect if it has not been created yet."""
+    global _max_workers
+    _max_workers = max(1, max_workers)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_max_workers, thread_name_prefix="blocking")
+    return _executor
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run blocking or CPU-bound work (PDF parsing, chunking, FAISS search, saving) on the
+    shared bounded pool, so the event loop keeps serving other requests meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(func, *args, **kwargs))
+
+
+class ReadWriteLock:
+    """
+    Many concurrent readers or one writer. Writer-preferring: once a writer waits, new
+    readers queue behind it, so a steady stream of queries cannot starve ingestion.
+    Not reentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
@@ -0,0 +1,29 @@
+import threading
+from bisect import bisect_left
+from typing import Sequence
+
+
+class Histogram:
+    """Fixed-bucket histogram: counts of observations at or below each upper bound."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = sorted(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound:g}" for bound in self.bounds] + ["le_inf"]
+            return {
+                "count": self.count,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "buckets": dict(zip(labels, self.counts)),
+            }
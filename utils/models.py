@@ -1,13 +1,51 @@
 from dataclasses import dataclass, field
 from typing import Dict, Any, List
 
-@dataclass
+@dataclass(slots=True)
 class Document:
     text: str
     metadata: Dict[str, Any] = field(default_factory=dict)
-    
+
+    def to_dict(self):
+        return {
+            "text": self.text,
+            "metadata": self.metadata
+        }
+
+    def __setstate__(self, state):
+        # Pickles written before Document had __slots__ (legacy store.pkl) carry a plain __dict__
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **(state[1] or {})}
+        self.text = state["text"]
+        self.metadata = state.get("metadata", {})
+
+
+class Chunk:
+    """
+    A span of a parent Document kept as (start, end) offsets. The text is sliced from the
+    parent only when read (to embed or return it), and the metadata is the parent's own dict,
+    shared by every chunk of that document rather than copied into each one.
+    """
+    __slots__ = ("parent", "start", "end")
+
+    def __init__(self, parent: Document, start: int, end: int):
+        self.parent = parent
+        self.start = start
+        self.end = end
+
+    @property
+    def text(self) -> str:
+        return self.parent.text[self.start:self.end]
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.parent.metadata
+
     def to_dict(self):
         return {
             "text": self.text,
             "metadata": self.metadata
         }
+
+    def __repr__(self):
+        return f"Chunk(text={self.text!r}, metadata={self.metadata!r})"
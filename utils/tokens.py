@@ -0,0 +1,78 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to a character-based estimate
+    tiktoken = None
+
+# Without tiktoken a text of n characters is counted as n // CHARS_PER_TOKEN + 1 tokens.
+# English averages ~4 characters per token; 3 keeps denser text under the limit too
+CHARS_PER_TOKEN = 3
+
+
+class Tokenizer:
+    """
+    Token counts and token-bounded spans for a model's encoding: exact with tiktoken, a
+    conservative character-based estimate without it. The chunkers and the embedding batch
+    planner share one instance per model, so their counts always agree.
+    """
+
+    def __init__(self, model: str = None):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model or "")
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(text) // CHARS_PER_TOKEN + 1
+
+    def spans(self, text: str, max_tokens: int, overlap: int = 0, offset: int = 0) -> List[Tuple[int, int]]:
+        """
+        Cut text into consecutive (start, end) character spans of at most max_tokens tokens,
+        each starting `overlap` tokens before the previous one ended. Offsets are shifted by
+        `offset`, so spans of a slice can be expressed in the coordinates of the whole text.
+        """
+        max_tokens = max(1, max_tokens)
+        overlap = min(max(0, overlap), max_tokens - 1)
+        spans = []
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            _, starts = self.encoding.decode_with_offsets(tokens)
+            starts.append(len(text))
+            i = 0
+            while i < len(tokens):
+                j = min(i + max_tokens, len(tokens))
+                # A window re-encoded on its own can merge differently; shrink until it fits
+                while j > i + 1 and self.count(text[starts[i]:starts[j]]) > max_tokens:
+                    j -= 1
+                spans.append((offset + starts[i], offset + starts[j]))
+                if j >= len(tokens):
+                    break
+                i = max(i + 1, j - overlap)
+            return spans
+
+        # Estimate: windows of max_chars, backing off to the last space when there is one
+        max_chars = max_tokens * CHARS_PER_TOKEN - 1
+        overlap_chars = overlap * CHARS_PER_TOKEN
+        start = 0
+        while start < len(text):
+            end = min(start + max_chars, len(text))
+            if end < len(text):
+                space = text.rfind(" ", start + max_chars // 2, end)
+                if space > start:
+                    end = space + 1
+            spans.append((offset + start, offset + end))
+            if end >= len(text):
+                break
+            start = max(start + 1, end - overlap_chars)
+        return spans
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model: str = None) -> Tokenizer:
+    return Tokenizer(model)
@@ -1 +1,4 @@
 from .faiss_store import VectorStore
+from .filters import MetadataFilter
+from .flusher import StoreFlusher
+from .replica import StoreReplica, acquire_writer_lock
@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class GrowableArray:
+    """
+    Contiguous numpy buffer with amortised O(1) appends.
+    1-D when width is None, otherwise (n, width) rows.
+    """
+
+    def __init__(self, dtype, width: int = None, capacity: int = 1024):
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self._size = 0
+        self._data = np.empty(self._shape(capacity), dtype=self.dtype)
+
+    def _shape(self, rows: int) -> tuple:
+        return (rows,) if self.width is None else (rows, self.width)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.dtype).reshape(self._shape(-1))
+        needed = self._size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(self._shape(max(needed, int(len(self._data) * 1.5) + 1)), dtype=self.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:needed] = values
+        self._size = needed
+
+    def view(self) -> np.ndarray:
+        """View of the filled part; invalidated by the next extend()."""
+        return self._data[:self._size]
+
+    def clear(self):
+        self._size = 0
@@ -1,119 +1,1026 @@
 import os
 import pickle
-from typing import List, Tuple
+import threading
+from contextlib import contextmanager
+from typing import List, Tuple, Iterator, Dict, Optional
 import numpy as np
 import faiss
-from utils import Document, logger
+from config import IndexConfig
+from utils import Document, logger, ReadWriteLock
+from . import segment as seg
+from . import index_factory
+from .wal import WriteAheadLog, wal_name, ADD, DELETE, DOCUMENTS
+from .registry import DocumentRegistry, INFO_FIELDS, id_runs
+from .filters import MetadataFilter, Vocabulary, CATEGORY_COLUMNS, MISSING, category_key, page_number
+
+# Chunks without a collection form the base layer, which every collection query also searches
+BASE_PARTITION = ""
+
+
+def partition_of(metadata: dict) -> str:
+    return metadata.get("collection") or BASE_PARTITION
+
+
+def _selector(bitmap: np.ndarray) -> faiss.IDSelector:
+    """FAISS selector over a little-endian packed bitmap indexed by chunk id; bitmap must outlive it."""
+    return faiss.IDSelectorBitmap(len(bitmap) * 8, faiss.swig_ptr(bitmap))
+
 
 class VectorStore:
-    def __init__(self, dimension: int):
+    """
+    Concurrency: one writer at a time (_lock) and any number of concurrent queries. A
+    mutation is applied to the in-memory state under the exclusive side of a reader-writer
+    lock and published as a new version when it is released; queries hold the shared side,
+    so each sees one complete version, never a half-applied add or delete. Saving, segment
+    writes and the compaction merge only hold _lock, so they never stall queries. Likewise a
+    partition that reaches config.train_min keeps being served by its initial (flat) index
+    while a background thread trains its HNSW / IVF index from a snapshot of its rows; only
+    the swap is published.
+    Other processes can follow a store as read-only replicas (load(read_only=True), see
+    replica.StoreReplica): they map the committed segments and index files instead of copying
+    them, and tail the write-ahead log.
+    """
+    # Roll the write-ahead log into a segment once it holds this many chunks
+    checkpoint_rows = 10_000
+    # Merge segments in the background once there are more than this many
+    max_segments = 8
+    # Physically drop deleted chunks in the background once this fraction of rows are tombstones
+    tombstone_ratio = 0.2
+    # Per-value filter bitmaps kept between queries
+    filter_cache_size = 256
+    # Rewrite a trained partition's index file at checkpoint once it has grown by this fraction
+    index_rewrite_ratio = 0.1
+    # Rows handed to FAISS per add when indexing a range of the table
+    index_block_rows = 65536
+
+    def __init__(self, dimension: int, config: IndexConfig = None):
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(dimension)
-        self.documents: List[Document] = []
-        self.embeddings: List[List[float]] = []
+        self.config = index_factory.validate(config or IndexConfig())
+        # Rows (documents, vectors, ids, partition codes) in ascending stable-id order
+        self.table = seg.ChunkTable(dimension)
+        self._next_id = 0
+
+        # One FAISS index per collection, keyed by partition code; ids are global
+        self._partitions: Dict[int, faiss.Index] = {}
+        # Read-only replicas: memory-mapped index files, keyed by partition code. _partitions then
+        # only holds the chunks those files do not cover, and the chunks of partitions without
+        # an index file are scanned straight from the segment vectors.
+        self.read_only = False
+        self._shared: Dict[int, faiss.Index] = {}
+        # Value <-> code mappings of the partition and category columns
+        self._vocab: Dict[str, Vocabulary] = {name: Vocabulary() for name in ("partition",) + CATEGORY_COLUMNS}
+        # document_id -> its live chunk ids and ingest details
+        self.registry = DocumentRegistry()
+
+        # Tombstones: deleted chunk ids that are still physically present, skipped by queries
+        self._deleted = np.zeros(0, dtype=bool)
+        self._deleted_count = 0
+        self._pending_deletes: List[np.ndarray] = []
+
+        # Packed id bitmaps handed to FAISS: live chunks, and chunks per (column, value code)
+        self._live_bitmap = None
+        self._value_bitmaps: Dict[Tuple[str, int], np.ndarray] = {}
+        self._derived = None
+
+        # Persistence state: the directory this store is bound to and its committed manifest
+        self.path = None
+        self._manifest = None
+        self._wal = None
+        self._persisted_rows = 0   # rows stored in segments or the write-ahead log
+        self._lock = threading.RLock()
+        # Queries read (shared), publishing a mutation writes (exclusive); version counts publishes
+        self._rw = ReadWriteLock()
+        self._cache_lock = threading.Lock()
+        self.version = 0
+        self._publisher = None
+        self._compactor = None
+        self._compacting = False
+        self._reserved_segments = set()
+        self._trainer = None
+
+    @property
+    def documents(self) -> seg.ChunkTable:
+        """All stored chunks (including tombstoned ones) as a lazily decoded sequence of Documents."""
+        return self.table
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Chunk id of every row, in ascending order."""
+        return self.table.ids
+
+    @property
+    def rows(self) -> int:
+        return len(self.table)
 
-    def add(self, documents: List[Document], embeddings: List[List[float]]):
+    @property
+    def count(self) -> int:
+        """Number of live (not deleted) chunks."""
+        return self.rows - self._deleted_count
+
+    @property
+    def partitions(self) -> Dict[str, int]:
+        """Live chunk count per partition (collection name, "" for the base layer)."""
+        names = self._vocab["partition"].values
+        codes = self.table.column("partition")
+        live = ~self._deleted[self.ids]
+        counts = np.bincount(codes[live], minlength=len(names))
+        return {name: int(counts[code]) for code, name in enumerate(names)}
+
+    def _rows_of(self, ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.ids, ids)
+
+    def _metadata_columns(self, metadatas: List[dict]) -> Dict[str, np.ndarray]:
+        """Partition, category and page columns for a batch of chunk metadata."""
+        columns = {"partition": self._vocab["partition"].encode(partition_of(m) for m in metadatas)}
+        for name in CATEGORY_COLUMNS:
+            columns[name] = self._vocab[name].encode(category_key(m.get(name)) for m in metadatas)
+        columns["page"] = np.asarray([page_number(m.get("page")) for m in metadatas], dtype="int32")
+        return columns
+
+    def _missing_column(self, segment: seg.Segment, name: str, first_row: int) -> np.ndarray:
+        """Derive columns for segments written before they existed."""
+        if name == "ids":
+            return np.arange(first_row, first_row + len(segment), dtype="int64")
+        # Metadata is decoded once per segment for all of its missing columns
+        if self._derived is None or self._derived[0] != segment.path:
+            metadatas = [segment.metadata(i) for i in range(len(segment))]
+            self._derived = (segment.path, self._metadata_columns(metadatas))
+        return self._derived[1][name]
+
+    @contextmanager
+    def _publish(self):
+        """Apply a mutation exclusively of queries; it becomes visible as the next version."""
+        if self._publisher == threading.get_ident():
+            yield  # nested in writer(): published with the enclosing mutation
+            return
+        with self._rw.write():
+            self._publisher = threading.get_ident()
+            try:
+                yield
+            finally:
+                self._publisher = None
+                self.version += 1
+
+    @contextmanager
+    def writer(self):
+        """
+        Group several mutations (e.g. delete a document's old chunks and add the new ones)
+        into one writer turn, published to queries as a single version.
+        """
+        with self._lock, self._publish():
+            yield self
+
+    def iter_documents(self) -> Iterator[Document]:
+        """Iterate over live documents in row order (not isolated from concurrent writes)."""
+        if not self._deleted_count:
+            yield from self.table
+            return
+        deleted = self._deleted[self.ids]
+        for row, doc in enumerate(self.table):
+            if not deleted[row]:
+                yield doc
+
+    def add(self, documents: List[Document], embeddings, content_hashes: Dict[str, str] = None):
+        """
+        Add chunks and their embeddings. content_hashes optionally maps document_id to a hash
+        of the ingested content (file or text), recorded in the document registry.
+        """
         if not documents:
             return
-        
-        # Convert embeddings to numpy array
-        embeddings_np = np.array(embeddings).astype('float32')
-        self.index.add(embeddings_np)
-        self.documents.extend(documents)
-        self.embeddings.extend(embeddings)
+
+        # Accepts a (n, dimension) array or a list of lists; no extra Python-side copy is kept
+        embeddings_np = np.ascontiguousarray(embeddings, dtype="float32").reshape(-1, self.dimension)
+        if embeddings_np.shape[0] != len(documents):
+            raise ValueError(f"Got {len(documents)} documents but {embeddings_np.shape[0]} embeddings")
+        self._check_writable()
+        with self._lock:
+            with self._publish():
+                ids = np.arange(self._next_id, self._next_id + len(documents), dtype="int64")
+                self._add_rows(documents, embeddings_np, ids, content_hashes, train=False)
+            self.train_async()
         logger.info(f"Added {len(documents)} documents to vector store")
 
-    def query(self, query_embedding: List[float], k: int = 5, allowed_sources: List[str] = None, collection: str = None) -> List[Document]:
-        if not self.documents:
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("This vector store is a read-only replica; changes go through the writer")
+
+    def _add_rows(self, documents: List[Document], vectors: np.ndarray, ids: np.ndarray,
+                  content_hashes: Dict[str, str] = None, train: bool = True):
+        """Append rows; with train, partitions they take past config.train_min are trained inline."""
+        columns = self._metadata_columns([doc.metadata for doc in documents])
+        columns["ids"] = ids
+        self._index_rows(self._partitions, vectors, ids, columns["partition"])
+        self.table.append(documents, vectors, columns)
+        if train:
+            self._train_partitions(self._partitions, self.table, np.unique(columns["partition"]).tolist())
+        self._reserve_ids(int(ids[-1]) + 1)
+        self._clear_bitmaps()
+        self._register(documents, ids, columns["document_id"], content_hashes or {})
+
+    def _register(self, documents: List[Document], ids: np.ndarray, codes: np.ndarray, content_hashes: Dict[str, str]):
+        """Add rows to the registry entries of their documents (chunks without a document_id are not listed)."""
+        names = self._vocab["document_id"].values
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        for group in np.split(order, bounds):
+            code = int(codes[group[0]])
+            if code == MISSING:
+                continue
+            name = names[code]
+            self.registry.add(name, ids[group], documents[group[0]].metadata, content_hashes.get(name))
+
+    def _index_rows(self, partitions: Dict[int, faiss.Index], vectors: np.ndarray, ids: np.ndarray, codes: np.ndarray):
+        """Add rows to the partition index of their collection."""
+        ids = np.ascontiguousarray(ids, dtype="int64")
+        for code in np.unique(codes).tolist():
+            index = partitions.get(code)
+            if index is None:
+                index = partitions[code] = index_factory.initial_index(self.config, self.dimension)
+            mask = codes == code
+            if mask.all():
+                index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), ids)
+            else:
+                index.add_with_ids(np.ascontiguousarray(vectors[mask], dtype="float32"), ids[mask])
+
+    def _build_partitions(self, table: seg.ChunkTable) -> Dict[int, faiss.Index]:
+        partitions: Dict[int, faiss.Index] = {}
+        self._extend_partitions(partitions, table, 0, len(table))
+        self._train_partitions(partitions, table)
+        return partitions
+
+    def _load_partitions(self, path: str, entries: dict) -> Dict[int, faiss.Index]:
+        """
+        Read the stored partition indexes and add the chunks they do not cover: partitions
+        without a stored index, and chunks ingested after it was written.
+        A read-only replica maps the index files into _shared instead, and leaves partitions
+        without one to be scanned in place.
+        """
+        partitions: Dict[int, faiss.Index] = {}
+        self._shared = {}
+        covered = np.zeros(len(self._vocab["partition"]), dtype="int64")
+        for code, entry in entries.items():
+            file = os.path.join(path, entry["file"])
+            if self.read_only:
+                self._shared[int(code)] = index_factory.read_index(file, mmap=True)
+            else:
+                partitions[int(code)] = index_factory.read_index(file)
+            covered[int(code)] = entry["next_id"]
+        table = self.table
+        missing = table.ids >= covered[table.column("partition")]
+        if self.read_only:
+            missing &= np.isin(table.column("partition"), list(self._shared))
+        self._extend_partitions(partitions, table, 0, len(table), missing)
+        self._train_partitions(partitions, table)
+        return partitions
+
+    def _extend_partitions(self, partitions: Dict[int, faiss.Index], table: seg.ChunkTable,
+                           start: int, end: int, mask: np.ndarray = None):
+        """Index rows [start, end) of table, or only those where mask (indexed from start) is set."""
+        columns = table.columns(start, end)
+        pos = 0
+        for block in table.vector_blocks(start, end):
+            for lo in range(0, len(block), self.index_block_rows):
+                hi = min(lo + self.index_block_rows, len(block))
+                rows = slice(pos + lo, pos + hi)
+                vectors, ids, codes = block[lo:hi], columns["ids"][rows], columns["partition"][rows]
+                if mask is not None and not mask[rows].all():
+                    keep = mask[rows]
+                    if not keep.any():
+                        continue
+                    vectors, ids, codes = vectors[keep], ids[keep], codes[keep]
+                self._index_rows(partitions, vectors, ids, codes)
+            pos += len(block)
+
+    def _train_partitions(self, partitions: Dict[int, faiss.Index], table: seg.ChunkTable, codes: List[int] = None):
+        """Rebuild initial partitions that have reached config.train_min as the configured index type."""
+        if self.read_only:
+            return  # training is left to the writer, whose index files replicas map on reload
+        for code in (list(partitions) if codes is None else codes):
+            index = partitions.get(code)
+            if index is None or not index_factory.wants_training(self.config, index):
+                continue
+            rows = np.flatnonzero(table.column("partition") == code)
+            logger.info(f"Training {self.config.type}/{self.config.storage} index for partition '{self._vocab['partition'].values[code]}' ({len(rows)} chunks)")
+            partitions[code] = index_factory.build_index(self.config, self.dimension, table.take_vectors(rows), table.ids[rows])
+
+    def _untrained(self) -> List[int]:
+        if self.read_only:
             return []
-            
-        query_np = np.array([query_embedding]).astype('float32')
-        
-        # If no filter, just do a normal search
-        if not allowed_sources and not collection:
-            distances, indices = self.index.search(query_np, k)
-            results = []
-            for idx in indices[0]:
-                if idx != -1 and idx < len(self.documents):
-                    results.append(self.documents[idx])
-            return results
-
-        # If filter is provided, we search for more items and filter them
-        search_k = min(len(self.documents), k * 10)
-        distances, indices = self.index.search(query_np, search_k)
-        
-        results = []
-        for idx in indices[0]:
-            if idx == -1 or idx >= len(self.documents):
+        return [code for code, index in self._partitions.items() if index_factory.wants_training(self.config, index)]
+
+    def train_async(self):
+        """Start training the partitions that have reached config.train_min in the background."""
+        with self._lock:
+            if self._trainer is not None or not self._untrained():
+                return
+            self._trainer = threading.Thread(target=self._train_in_background, name="vectorstore-trainer", daemon=True)
+            self._trainer.start()
+
+    def _train_in_background(self):
+        try:
+            while True:
+                with self._lock:
+                    codes = self._untrained()
+                    if not codes:
+                        self._trainer = None
+                        return
+                for code in codes:
+                    self._train_partition(code)
+        except Exception as e:
+            logger.error(f"Background index training failed: {e}")
+            with self._lock:
+                self._trainer = None
+
+    def _train_partition(self, code: int):
+        """
+        Train one partition's index from a snapshot of its rows without holding the store lock,
+        then add the chunks ingested meanwhile and swap it in. A compaction that rebuilt the
+        partitions in the meantime makes the trained index stale; it is dropped.
+        """
+        with self._lock:
+            initial = self._partitions.get(code)
+            if initial is None or not index_factory.wants_training(self.config, initial):
+                return
+            table = self.table
+            next_id = self._next_id
+            rows = np.flatnonzero(table.column("partition") == code)
+            vectors, ids = table.take_vectors(rows), table.ids[rows]
+        logger.info(f"Training {self.config.type}/{self.config.storage} index for partition '{self._vocab['partition'].values[code]}' ({len(rows)} chunks)")
+        trained = index_factory.build_index(self.config, self.dimension, vectors, ids)
+
+        with self._lock:
+            if self._partitions.get(code) is not initial:
+                return
+            start = int(np.searchsorted(self.ids, next_id))
+            added = {code: trained}
+            self._extend_partitions(added, self.table, start, self.rows,
+                                    self.table.column("partition")[start:] == code)
+            with self._publish():
+                self._partitions[code] = added[code]
+
+    def wait_for_training(self, timeout: float = None):
+        trainer = self._trainer
+        if trainer is not None:
+            trainer.join(timeout)
+
+    def _write_indexes(self, previous: dict, generation: int) -> dict:
+        """
+        Write the trained partition indexes that have no file yet or have grown by
+        index_rewrite_ratio since theirs was written. Untrained partitions are rebuilt from the
+        segment vectors on load instead. Only valid while every indexed chunk is in a segment.
+        """
+        entries = {}
+        for code, index in self._partitions.items():
+            if index_factory.is_initial(self.config, index):
                 continue
-            
-            doc = self.documents[idx]
-            match = False
-            
-            # Logic: If collection 'xyz' is active, search 'pdf_upload' OR 'xyz'
-            # Base Knowledge (pdf_upload) is ALWAYS queried
-            doc_source = doc.metadata.get("source")
-            doc_collection = doc.metadata.get("collection")
-            
-            if doc_source == "pdf_upload":
-                match = True
-            elif collection and doc_collection == collection:
-                match = True
-            
-            if match:
-                results.append(doc)
-                if len(results) >= k:
-                    break
-        
+            entry = previous.get(str(code))
+            if entry is None or index.ntotal >= (1 + self.index_rewrite_ratio) * entry["ntotal"]:
+                name = index_factory.index_file_name(code, generation)
+                index_factory.write_index(index, os.path.join(self.path, name))
+                entry = {"file": name, "next_id": self._next_id, "ntotal": index.ntotal}
+            entries[str(code)] = entry
+        return entries
+
+    def _reserve_ids(self, next_id: int):
+        """Advance the id counter and grow the tombstone bitmap to cover it."""
+        self._next_id = max(self._next_id, next_id)
+        if len(self._deleted) < self._next_id:
+            grown = np.zeros(max(self._next_id, 2 * len(self._deleted)), dtype=bool)
+            grown[:len(self._deleted)] = self._deleted
+            self._deleted = grown
+
+    def _tombstone(self, ids: np.ndarray) -> np.ndarray:
+        """Mark ids deleted; ids that are unknown or already deleted are ignored. Returns the ids marked."""
+        ids = np.asarray(ids, dtype="int64")
+        all_ids = self.ids
+        rows = np.searchsorted(all_ids, ids)
+        present = rows < len(all_ids)
+        present[present] = all_ids[rows[present]] == ids[present]
+        ids = ids[present]
+        ids = ids[~self._deleted[ids]]
+        if len(ids):
+            self._deleted[ids] = True
+            self._deleted_count += len(ids)
+            self._live_bitmap = None
+            self._unregister(ids)
+        return ids
+
+    def _unregister(self, ids: np.ndarray):
+        """Drop deleted ids from the registry entries of their documents."""
+        codes = self.table.column("document_id")[self._rows_of(ids)]
+        names = self._vocab["document_id"].values
+        for code in np.unique(codes).tolist():
+            if code != MISSING:
+                self.registry.remove(names[code], ids[codes == code])
+
+    def _clear_bitmaps(self):
+        self._live_bitmap = None
+        self._value_bitmaps = {}
+
+    def _id_bitmap(self, ids: np.ndarray) -> np.ndarray:
+        bits = np.zeros(self._next_id, dtype=bool)
+        bits[ids] = True
+        return np.packbits(bits, bitorder="little")
+
+    def _value_bitmap(self, column: str, code: int) -> np.ndarray:
+        """Bitmap of the chunks whose column holds code, cached until rows change."""
+        key = (column, code)
+        bitmap = self._value_bitmaps.get(key)
+        if bitmap is None:
+            bitmap = self._id_bitmap(self.ids[self.table.column(column) == code])
+            # Concurrent queries share the cache
+            with self._cache_lock:
+                if len(self._value_bitmaps) >= self.filter_cache_size:
+                    self._value_bitmaps.pop(next(iter(self._value_bitmaps)))
+                self._value_bitmaps[key] = bitmap
+        return bitmap
+
+    def _category_bitmap(self, column: str, values: List[str]) -> np.ndarray:
+        """OR of the per-value bitmaps; values never seen in the store match nothing."""
+        vocab = self._vocab[column]
+        codes = sorted({vocab.get(v) for v in values} - {MISSING})
+        if len(codes) == 1:
+            return self._value_bitmap(column, codes[0])
+        bitmap = np.zeros((self._next_id + 7) // 8, dtype=np.uint8)
+        for code in codes:
+            np.bitwise_or(bitmap, self._value_bitmap(column, code), out=bitmap)
+        return bitmap
+
+    def _filter_bitmap(self, filters: MetadataFilter) -> Optional[np.ndarray]:
+        """
+        Compile the filter's column predicates (and tombstones) into one packed bitmap over chunk
+        ids, or None when every chunk passes. Collections are handled by partition pruning instead.
+        """
+        bitmap = None
+        if self._deleted_count:
+            if self._live_bitmap is None:
+                self._live_bitmap = np.packbits(~self._deleted[:self._next_id], bitorder="little")
+            bitmap = self._live_bitmap
+        for column, values in filters.category_terms():
+            allowed = self._category_bitmap(column, values)
+            bitmap = allowed if bitmap is None else bitmap & allowed
+        if filters.has_page_range():
+            pages = self.table.column("page")
+            mask = pages != MISSING
+            if filters.page_min is not None:
+                mask &= pages >= filters.page_min
+            if filters.page_max is not None:
+                mask &= pages <= filters.page_max
+            allowed = self._id_bitmap(self.ids[mask])
+            bitmap = allowed if bitmap is None else bitmap & allowed
+        return bitmap
+
+    def _partition_codes(self, collection: str = None, collections: List[str] = None) -> List[int]:
+        """
+        Partitions a query has to search: everything, or the base layer plus one collection,
+        narrowed to the filter's collections when it names any.
+        """
+        vocab = self._vocab["partition"]
+        codes = set(range(len(vocab)))
+        if collection:
+            codes &= {vocab.get(BASE_PARTITION), vocab.get(collection)}
+        if collections is not None:
+            codes &= {vocab.get(c or BASE_PARTITION) for c in collections}
+        return sorted(codes)
+
+    def _partitions_for(self, codes: List[int]) -> List[faiss.Index]:
+        """Indexes holding the chunks of these partitions (for a replica, its own and the mapped ones)."""
+        return [
+            index for code in codes
+            for index in (self._partitions.get(code), self._shared.get(code)) if index is not None
+        ]
+
+    def _scan_codes(self, codes: List[int]) -> List[int]:
+        """Partitions whose segment chunks a replica scans in place, having no index file to map."""
+        if not self.read_only:
+            return []
+        return [code for code in codes if code not in self._shared]
+
+    def _scan_segments(self, query_np: np.ndarray, k: int, codes: List[int],
+                       bitmap: np.ndarray = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Exact top-k per segment over the rows of the given partitions (and in the bitmap),
+        computed by FAISS directly on the memory-mapped segment vectors.
+        """
+        table = self.table
+        n = table.segment_rows
+        allowed = np.isin(table.column("partition")[:n], codes)
+        if bitmap is not None:
+            bits = np.unpackbits(bitmap, count=self._next_id, bitorder="little").astype(bool)
+            allowed &= bits[table.ids[:n]]
+        nq = len(query_np)
+        results = []
+        start = 0
+        for segment in table.segments:
+            rows = allowed[start:start + len(segment)]
+            if rows.any():
+                mask = np.packbits(rows, bitorder="little")
+                distances = np.empty((nq, k), dtype="float32")
+                labels = np.empty((nq, k), dtype="int64")
+                faiss.knn_L2sqr(
+                    faiss.swig_ptr(query_np), faiss.swig_ptr(segment.vectors), self.dimension, nq, len(segment), k,
+                    faiss.swig_ptr(distances), faiss.swig_ptr(labels), None,
+                    faiss.IDSelectorBitmap(len(segment), faiss.swig_ptr(mask)),
+                )
+                found = labels >= 0
+                labels[found] = table.ids[start + labels[found]]
+                results.append((distances, labels))
+            start += len(segment)
         return results
 
-    def delete_by_metadata(self, key: str, value: str):
-        """Remove documents that match a metadata key/value pair and rebuild index."""
-        indices_to_keep = [
-            i for i, doc in enumerate(self.documents) 
-            if doc.metadata.get(key) != value
+    def _search(self, query_np: np.ndarray, k: int, partitions: List[faiss.Index], bitmap: np.ndarray = None,
+                nprobe: int = None, ef_search: int = None, scan_codes: List[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k over several partition indexes: each is searched for k and the results merged.
+        Chunks outside the bitmap (tombstones, filtered out) are skipped inside FAISS.
+        nprobe / ef_search override the configured defaults for IVF / HNSW partitions.
+        A replica also scans the segment chunks of scan_codes.
+        """
+        # bitmap stays referenced by the caller for the duration of the search
+        selector = _selector(bitmap) if bitmap is not None else None
+        nprobe = nprobe or self.config.nprobe
+        ef_search = ef_search or self.config.ef_search
+
+        results = [
+            index.search(query_np, k, params=index_factory.search_parameters(index, selector, nprobe, ef_search))
+            for index in partitions if index.ntotal
         ]
-        
-        if len(indices_to_keep) == len(self.documents):
-            return # Nothing to delete
-
-        logger.info(f"Deleting documents where {key}={value}. Total chunks: {len(self.documents)} -> {len(indices_to_keep)}")
-        
-        # Filter docs and embeddings
-        self.documents = [self.documents[i] for i in indices_to_keep]
-        self.embeddings = [self.embeddings[i] for i in indices_to_keep]
-        
-        # Rebuild index
-        self.index = faiss.IndexFlatL2(self.dimension)
-        if self.embeddings:
-            embeddings_np = np.array(self.embeddings).astype('float32')
-            self.index.add(embeddings_np)
+        if scan_codes:
+            results.extend(self._scan_segments(query_np, k, scan_codes, bitmap))
+        if not results:
+            return np.full((len(query_np), k), np.inf, dtype="float32"), np.full((len(query_np), k), -1, dtype="int64")
+        if len(results) == 1:
+            return results[0]
+        distances = np.hstack([d for d, _ in results])
+        ids = np.hstack([i for _, i in results])
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def _documents_for(self, ids: np.ndarray) -> List[Document]:
+        ids = ids[ids != -1]
+        return [self.table[row] for row in self._rows_of(ids).tolist()]
+
+    def query(self, query_embedding: List[float], k: int = 5, allowed_sources: List[str] = None,
+              collection: str = None, filters: MetadataFilter = None,
+              nprobe: int = None, ef_search: int = None, rerank: int = None) -> List[Document]:
+        """
+        Return the k nearest live chunks that pass the metadata filter. With a collection, only
+        the base layer and that collection's partition are searched. Filters are applied inside
+        the FAISS search, so with exact (flat float32) partitions the result is exact and holds k
+        chunks whenever k chunks match; HNSW / IVF partitions and quantized storage trade some
+        recall for speed and memory.
+        With rerank > 1, k * rerank candidates are fetched and re-scored against the
+        full-precision vectors read from the memory-mapped segments.
+        """
+        filters = (filters or MetadataFilter()).restrict_sources(allowed_sources)
+        return self.query_many([query_embedding], k, collection, filters, nprobe, ef_search, rerank)[0]
+
+    def query_many(self, query_embeddings, k: int = 5, collection: str = None, filters: MetadataFilter = None,
+                   nprobe: int = None, ef_search: int = None, rerank: int = None) -> List[List[Document]]:
+        """
+        query() for a matrix of embeddings sharing one collection and filter: the filter bitmap
+        is compiled once and each partition is searched once for all rows.
+        """
+        query_np = np.asarray(query_embeddings, dtype="float32").reshape(len(query_embeddings), -1)
+        with self._rw.read():
+            return self._query_many(query_np, k, collection, filters, nprobe, ef_search, rerank)
+
+    def _query_many(self, query_np: np.ndarray, k: int, collection: str, filters: MetadataFilter,
+                    nprobe: int, ef_search: int, rerank: int) -> List[List[Document]]:
+        if self.count == 0 or len(query_np) == 0:
+            return [[] for _ in range(len(query_np))]
+
+        filters = filters or MetadataFilter()
+        codes = self._partition_codes(collection, filters.collections)
+        partitions = self._partitions_for(codes)
+        scan_codes = self._scan_codes(codes)
+        bitmap = self._filter_bitmap(filters)
+        if not (partitions or scan_codes) or (bitmap is not None and not bitmap.any()):
+            return [[] for _ in range(len(query_np))]
+
+        query_np = np.ascontiguousarray(query_np)
+        rerank = self.config.rerank if rerank is None else rerank
+        if rerank > 1:
+            distances, ids = self._search(query_np, k * rerank, partitions, bitmap, nprobe, ef_search, scan_codes)
+            return [self._documents_for(self._rerank(q, row, k)) for q, row in zip(query_np, ids)]
+        distances, ids = self._search(query_np, k, partitions, bitmap, nprobe, ef_search, scan_codes)
+        return [self._documents_for(row) for row in ids]
+
+    def _rerank(self, query: np.ndarray, ids: np.ndarray, k: int) -> np.ndarray:
+        """Re-score candidate ids exactly against their float32 vectors and keep the best k."""
+        table = self.table
+        ids = ids[ids != -1]
+        vectors = table.take_vectors(np.searchsorted(table.ids, ids))
+        distances = ((vectors - query) ** 2).sum(axis=1)
+        return ids[np.argsort(distances, kind="stable")[:k]]
+
+    def _rows_matching(self, key: str, value) -> np.ndarray:
+        if key in CATEGORY_COLUMNS and isinstance(value, str):
+            code = self._vocab[key].get(value)
+            if code == MISSING:
+                return np.empty(0, dtype="int64")
+            return np.flatnonzero(self.table.column(key) == code)
+        return np.asarray([
+            i for i, doc in enumerate(self.table)
+            if doc.metadata.get(key) == value
+        ], dtype="int64")
+
+    def delete_by_metadata(self, key: str, value: str):
+        """
+        Tombstone documents that match a metadata key/value pair.
+        Queries skip them immediately; space is reclaimed by a background compaction.
+        A document_id is looked up in the registry, so deleting one document costs time
+        proportional to its chunks rather than to the store.
+        """
+        self._check_writable()
+        with self._lock:
+            if key == "document_id":
+                ids = self.registry.ids_of(category_key(value))
+            else:
+                ids = self.ids[self._rows_matching(key, value)]
+            with self._publish():
+                deleted = self._delete_ids(ids)
+            if deleted:
+                logger.info(f"Deleting documents where {key}={value}. Live chunks: {self.count + len(ids)} -> {self.count}")
+
+    def _delete_ids(self, ids: np.ndarray) -> int:
+        dead = self._tombstone(ids) if len(ids) else ids
+        if not len(dead):
+            return 0 # Nothing to delete
+
+        self._pending_deletes.append(dead)
+        if self.path is not None and self._deleted_count > self.tombstone_ratio * self.rows:
+            self.compact_async()
+        return len(dead)
+
+    def list_documents(self) -> Dict[str, dict]:
+        """Source, collection, chunk count, ingest time and content hash of every document."""
+        with self._rw.read():
+            return self.registry.summary()
+
+    def document_info(self, document_id: str) -> Optional[dict]:
+        """Source, collection, chunk count, ingest time and content hash of one document, or None."""
+        with self._rw.read():
+            entry = self.registry.get(category_key(document_id))
+            return {name: entry[name] for name in INFO_FIELDS + ("chunks",)} if entry else None
 
     def save(self, path: str):
-        """Save index, documents, and embeddings to disk."""
-        if not os.path.exists(path):
-            os.makedirs(path, exist_ok=True)
-            
-        faiss.write_index(self.index, os.path.join(path, "index.faiss"))
-        state = {
-            "documents": self.documents,
-            "embeddings": self.embeddings,
-            "dimension": self.dimension
-        }
-        with open(os.path.join(path, "store.pkl"), "wb") as f:
-            pickle.dump(state, f)
+        """
+        Persist pending changes.
+        Saving to the store's own directory appends only the new chunks and deleted ids to the
+        write-ahead log; the first save to a directory writes a full segment.
+        """
+        self._check_writable()
+        with self._lock:
+            if self._needs_full_write(path):
+                self._write_full(path)
+            else:
+                self._append_pending()
+                if self._wal.rows >= self.checkpoint_rows:
+                    self.checkpoint()
         logger.info(f"Vector store saved to {path}")
 
+    def _needs_full_write(self, path: str) -> bool:
+        return (
+            self.path is None
+            or os.path.abspath(path) != os.path.abspath(self.path)
+            or not seg.has_manifest(path)
+        )
+
+    def _append_pending(self):
+        n = self.rows
+        if n > self._persisted_rows:
+            p = self._persisted_rows
+            self._wal.append(self.table[p:n], self.table.vectors(p, n), self.ids[p:n])
+            self._persisted_rows = n
+        # Deletes are logged after adds so replay never resurrects a deleted chunk
+        if self._pending_deletes:
+            self._wal.append_delete(np.concatenate(self._pending_deletes))
+            self._pending_deletes = []
+        self._wal.append_documents(self.registry.take_changes())
+
+    def _write_full(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        previous = seg.read_manifest(path) if seg.has_manifest(path) else {}
+        seq = previous.get("next_segment", 0)
+        name = seg.segment_name(seq)
+        n = self.rows
+        seg.write_segment(
+            os.path.join(path, seg.SEGMENTS_DIR, name),
+            self.table, self.table.vector_blocks(0, n), self.table.columns(0, n)
+        )
+
+        self.path = path
+        self.registry.take_changes()  # the full write commits a registry snapshot
+        self._commit({
+            "dimension": self.dimension,
+            "count": n,
+            "segments": [{"name": name, "count": n}],
+            "next_segment": seq + 1,
+            "wal": previous.get("wal", -1) + 1,
+            "generation": previous.get("generation", 0),
+        }, write_indexes=True)
+        self._persisted_rows = n
+        self._pending_deletes = []
+        table = self.table.reopen(seg.open_segments(path, self._manifest), n)
+        with self._publish():
+            self.table = table
+
+    def _commit(self, manifest: dict, write_indexes: bool = False):
+        """
+        Publish a manifest (with the current tombstones, partition names and index files), switch
+        to its write-ahead log and drop files it no longer references.
+        write_indexes may only be set when the segments hold every indexed chunk.
+        """
+        dead = np.flatnonzero(self._deleted[:self._next_id])
+        indexes = manifest.get("indexes", {})
+        if write_indexes:
+            indexes = self._write_indexes(indexes, manifest["generation"] + 1)
+        manifest = {
+            **manifest,
+            "index": index_factory.spec(self.config),
+            "indexes": indexes,
+            "next_id": self._next_id,
+            "partitions": list(self._vocab["partition"].values),
+            "categories": {name: list(self._vocab[name].values) for name in CATEGORY_COLUMNS},
+            "tombstones": len(dead),
+            "documents": len(self.registry),
+            "generation": manifest["generation"] + 1,
+        }
+        if len(dead):
+            seg.write_tombstones(self.path, manifest["generation"], dead)
+        seg.write_registry(self.path, manifest["generation"], self.registry.entries)
+        seg.write_manifest(self.path, manifest)
+        self._manifest = manifest
+        wal_path = os.path.join(self.path, wal_name(manifest["wal"]))
+        if self._wal is None or self._wal.path != wal_path:
+            self._wal = WriteAheadLog(wal_path)
+        seg.remove_stale_files(self.path, manifest, keep=self._reserved_segments)
+
+    def checkpoint(self):
+        """Roll the chunks held in the write-ahead log into a new immutable segment."""
+        self._check_writable()
+        with self._lock:
+            if self._needs_full_write(self.path or ""):
+                raise RuntimeError("checkpoint() needs a store that has been saved to disk")
+            self._append_pending()
+            start, end = self.table.segment_rows, self.rows
+            if end == start:
+                return
+            manifest = dict(self._manifest)
+            name = seg.segment_name(manifest["next_segment"])
+            seg.write_segment(
+                os.path.join(self.path, seg.SEGMENTS_DIR, name),
+                self.table[start:end], self.table.vector_blocks(start, end), self.table.columns(start, end)
+            )
+            manifest["segments"] = manifest["segments"] + [{"name": name, "count": end - start}]
+            manifest["count"] = end
+            manifest["next_segment"] += 1
+            manifest["wal"] += 1
+            self._commit(manifest, write_indexes=True)
+            # Same rows, now read from the segment: swapped in without waiting for a query to end
+            table = self.table.reopen(seg.open_segments(self.path, self._manifest), end)
+            with self._publish():
+                self.table = table
+            logger.info(f"Checkpointed {end - start} chunks into segment {name}")
+
+            if len(manifest["segments"]) > self.max_segments:
+                self.compact_async()
+
+    def compact(self):
+        """
+        Merge all committed segments into one and physically drop tombstoned chunks.
+        The merge and the index rebuild run without the store lock, so this is safe to run
+        in a background thread while queries and ingests continue; only the swap is locked.
+        """
+        self._check_writable()
+        with self._lock:
+            if self.path is None or self._compacting:
+                return
+            self._compacting = True
+        try:
+            self._compact()
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _compact(self):
+        with self._lock:
+            self.checkpoint()
+            dead = np.flatnonzero(self._deleted[:self._next_id])
+            if len(self._manifest["segments"]) < 2 and not len(dead):
+                return
+            snapshot = list(self._manifest["segments"])
+            table = self.table
+            snapshot_rows = table.segment_rows
+            deleted = self._deleted.copy()
+            # Reserve the merged segment's name so concurrent checkpoints neither reuse nor delete it
+            name = seg.segment_name(self._manifest["next_segment"])
+            self._manifest = {**self._manifest, "next_segment": self._manifest["next_segment"] + 1}
+            self._reserved_segments.add(name)
+            path = self.path
+
+        try:
+            starts = np.cumsum([0] + [len(s) for s in table.segments]).tolist()
+            columns = [table.columns(lo, hi) for lo, hi in zip(starts[:-1], starts[1:])]
+            keep = [~deleted[cols["ids"]] for cols in columns]
+            merged_path = os.path.join(path, seg.SEGMENTS_DIR, name)
+            count = seg.merge_segments(merged_path, table.segments, columns, keep)
+            merged_table = seg.ChunkTable(self.dimension, [seg.Segment(merged_path, count, self.dimension)])
+            partitions = self._build_partitions(merged_table)
+
+            # The swap renumbers rows and removes the merged segments: no query may be in flight
+            with self._lock, self._publish():
+                current = self._manifest["segments"]
+                if self.path != path or current[:len(snapshot)] != snapshot:
+                    # The store was rewritten while merging; the merged copy is stale
+                    return
+                # Chunks ingested while merging are copied over from the live table
+                self._extend_partitions(partitions, self.table, snapshot_rows, self.rows)
+                dropped = snapshot_rows - count
+                self._deleted[dead] = False
+                self._deleted_count -= len(dead)
+                self._clear_bitmaps()
+                self._partitions = partitions
+
+                covered_rows = self.table.segment_rows
+                # Chunks and deletes made while merging are logged first: the registry snapshot
+                # committed below includes them
+                self._append_pending()
+                # Index files written before the merge still hold the dropped chunks
+                self._commit({
+                    **self._manifest,
+                    "segments": [{"name": name, "count": count}] + current[len(snapshot):],
+                    "count": self._manifest["count"] - dropped,
+                    "indexes": {},
+                }, write_indexes=covered_rows == self.rows)
+                self.table = self.table.reopen(seg.open_segments(path, self._manifest), covered_rows)
+                self._persisted_rows -= dropped
+            logger.info(f"Compacted {len(snapshot)} segments into {name}, dropping {dropped} deleted chunks")
+        finally:
+            with self._lock:
+                self._reserved_segments.discard(name)
+                if self.path == path:
+                    seg.remove_stale_files(path, self._manifest, keep=self._reserved_segments)
+
+    def compact_async(self):
+        """Start a background compaction unless one is already running."""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background, name="vectorstore-compactor", daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Background compaction failed: {e}")
+
+    def wait_for_compaction(self, timeout: float = None):
+        if self._compactor is not None:
+            self._compactor.join(timeout)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        """True if a vector store (current or legacy format) is present at path."""
+        return seg.has_manifest(path) or seg.has_legacy_store(path)
+
+    @property
+    def generation(self) -> int:
+        """Generation of the committed manifest this store was loaded from or last saved as."""
+        return self._manifest["generation"] if self._manifest else 0
+
     @classmethod
-    def load(cls, path: str) -> 'VectorStore':
-        """Load from disk."""
-        with open(os.path.join(path, "store.pkl"), "rb") as f:
+    def load(cls, path: str, config: IndexConfig = None, read_only: bool = False) -> 'VectorStore':
+        """
+        Load from disk, migrating a legacy pickle store on first use.
+        Without a config the store keeps the index configuration it was saved with; with a
+        different one, its partition indexes are rebuilt to match.
+        read_only opens a replica of a store that another process writes: segments and index
+        files are memory-mapped rather than copied, nothing on disk is modified (the stored
+        index configuration is kept, the log is not truncated, no file is cleaned up), and
+        catch_up() follows the write-ahead log.
+        """
+        if read_only and not seg.has_manifest(path):
+            raise FileNotFoundError(f"No vector store at {path}")
+        if not seg.has_manifest(path) and seg.has_legacy_store(path):
+            return cls.migrate(path, config)
+
+        manifest = seg.read_manifest(path)
+        stored = index_factory.from_spec(manifest["index"])
+        instance = cls(manifest["dimension"], stored if read_only else config or stored)
+        instance.read_only = read_only
+        if instance.config != stored:
+            logger.info(f"Vector index configuration changed from {stored.type} to {instance.config.type}, rebuilding indexes")
+            manifest["indexes"] = {}
+        instance._vocab["partition"] = Vocabulary(manifest["partitions"])
+        for name in CATEGORY_COLUMNS:
+            instance._vocab[name] = Vocabulary(manifest["categories"].get(name, []))
+        instance.table = seg.ChunkTable(instance.dimension, seg.open_segments(path, manifest), instance._missing_column)
+        instance._derived = None
+        instance._partitions = instance._load_partitions(path, manifest["indexes"])
+        if instance.rows:
+            instance._reserve_ids(int(instance.ids[-1]) + 1)
+        instance._reserve_ids(manifest["next_id"])
+        registry = seg.read_registry(path, manifest)
+        if registry is not None:
+            instance.registry = DocumentRegistry(registry)
+        instance._tombstone(seg.read_tombstones(path, manifest))
+        if registry is None:
+            instance._rebuild_registry()
+        instance.path = path
+        instance._manifest = manifest
+
+        # Replay chunks and deletes that were logged after the last checkpoint (e.g. before a crash)
+        instance._wal = WriteAheadLog(os.path.join(path, wal_name(manifest["wal"])))
+        instance._replay(truncate=not read_only)
+        instance._persisted_rows = instance.rows
+        if instance._wal.rows:
+            logger.info(f"Replayed {instance._wal.rows} chunks from the write-ahead log")
+        if not read_only:
+            # Files of a replaced generation may still be mapped by replicas, which reload on
+            # the new manifest; removing them only drops the name
+            seg.remove_stale_files(path, manifest)
+
+        logger.info(f"Vector store loaded from {path} with {instance.count} documents in {len(instance._partitions)} partitions")
+        return instance
+
+    def _replay(self, truncate: bool = True) -> int:
+        """Apply the write-ahead log records past the last replayed one; returns how many there were."""
+        records = 0
+        for kind, record in self._wal.replay(self._wal.offset, truncate):
+            if kind == ADD:
+                self._add_rows(*record)
+            elif kind == DELETE:
+                self._tombstone(record)
+            elif kind == DOCUMENTS:
+                self.registry.apply_changes(record)
+            records += 1
+        # Replayed entries were logged already
+        self.registry.take_changes()
+        return records
+
+    def catch_up(self) -> int:
+        """
+        Replica side of the write-ahead log: apply the chunks, deletes and document changes the
+        writer has logged since the last call, published as one version. Segments and index
+        files written by a later checkpoint or compaction are picked up by reloading instead
+        (see replica.StoreReplica). Returns the number of records applied.
+        """
+        if not self.read_only:
+            raise RuntimeError("catch_up() follows a store written by another process; load it with read_only=True")
+        wal_path = self._wal.path
+        if not os.path.exists(wal_path) or os.path.getsize(wal_path) <= self._wal.offset:
+            return 0
+        with self._lock, self._publish():
+            return self._replay(truncate=False)
+
+    def _rebuild_registry(self):
+        """Build the registry from the chunk columns of a store saved before it had one."""
+        codes = self.table.column("document_id")
+        live = (codes != MISSING) & ~self._deleted[self.ids]
+        rows = np.flatnonzero(live)
+        order = rows[np.argsort(codes[rows], kind="stable")]
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        names = self._vocab["document_id"].values
+        entries = {}
+        for group in np.split(order, bounds) if len(order) else []:
+            first = self.table[int(group[0])].metadata
+            runs = id_runs(self.ids[group])
+            entries[names[int(codes[group[0]])]] = {
+                "source": first.get("source"),
+                "collection": first.get("collection"),
+                "ids": runs,
+                "chunks": len(group),
+                "ingested_at": None,
+                "content_hash": None,
+            }
+        self.registry = DocumentRegistry(entries)
+        logger.info(f"Built the document registry for {len(entries)} documents")
+
+    @classmethod
+    def load_legacy(cls, path: str, config: IndexConfig = None) -> 'VectorStore':
+        """Load a store written by the old pickle-based format (store.pkl + index.faiss)."""
+        with open(os.path.join(path, seg.LEGACY_STATE_FILE), "rb") as f:
             state = pickle.load(f)
-            
-        instance = cls(state["dimension"])
-        instance.index = faiss.read_index(os.path.join(path, "index.faiss"))
-        instance.documents = state["documents"]
-        instance.embeddings = state["embeddings"]
-        
-        logger.info(f"Vector store loaded from {path} with {len(instance.documents)} documents")
+
+        instance = cls(state["dimension"], config)
+        legacy_index = faiss.read_index(os.path.join(path, seg.LEGACY_INDEX_FILE))
+        n = legacy_index.ntotal
+        instance.add(state["documents"], legacy_index.reconstruct_n(0, n) if n else np.empty((0, instance.dimension)))
         return instance
+
+    @classmethod
+    def migrate(cls, path: str, config: IndexConfig = None) -> 'VectorStore':
+        """
+        One-shot migration of a legacy store.pkl + index.faiss pair to the segment format.
+        The legacy files are renamed with a .migrated suffix once the new manifest is committed.
+        """
+        logger.info(f"Migrating legacy vector store at {path} to segment format v{seg.FORMAT_VERSION}")
+        instance = cls.load_legacy(path, config)
+        instance.save(path)
+        for name in (seg.LEGACY_STATE_FILE, seg.LEGACY_INDEX_FILE):
+            legacy_path = os.path.join(path, name)
+            if os.path.exists(legacy_path):
+                os.replace(legacy_path, legacy_path + ".migrated")
+        return cls.load(path, config)
@@ -0,0 +1,123 @@
+from dataclasses import dataclass, fields
+from typing import List, Optional, Dict, Iterable, Tuple
+import numpy as np
+
+# Metadata keys indexed as categorical code columns (a chunk's collection is its partition)
+CATEGORY_COLUMNS = ("source", "document_id")
+# Code of a missing value in category columns, and of a missing page number
+MISSING = -1
+
+
+def category_key(value) -> Optional[str]:
+    """Category values are compared as strings; None means the key is absent."""
+    return None if value is None else str(value)
+
+
+def page_number(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+class Vocabulary:
+    """Dense int32 codes for the distinct values of one metadata key."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.add(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._codes[value] = code
+        return code
+
+    def get(self, value: str) -> int:
+        return self._codes.get(value, MISSING)
+
+    def encode(self, values: Iterable[Optional[str]]) -> np.ndarray:
+        return np.asarray([MISSING if v is None else self.add(v) for v in values], dtype="int32")
+
+
+@dataclass
+class MetadataFilter:
+    """
+    Conjunction of metadata predicates evaluated inside the vector search.
+    List fields match any of their values (IN); None means unrestricted and an empty list
+    matches nothing. Page bounds are inclusive.
+    """
+    sources: Optional[List[str]] = None
+    collections: Optional[List[str]] = None
+    document_ids: Optional[List[str]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+
+    # JSON body key -> field
+    _KEYS = {
+        "source": "sources",
+        "collection": "collections",
+        "document_id": "document_ids",
+        "page_min": "page_min",
+        "page_max": "page_max",
+    }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetadataFilter":
+        """
+        Parse a request body filter such as
+        {"source": ["a.pdf", "b.pdf"], "collection": "hr", "document_id": "doc-1", "page_min": 2, "page_max": 10}.
+        Single values and lists are both accepted for source, collection and document_id.
+        """
+        if data is None:
+            return cls()
+        if not isinstance(data, dict):
+            raise ValueError("filters must be a JSON object")
+        unknown = set(data) - set(cls._KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}")
+
+        values = {}
+        for key, value in data.items():
+            name = cls._KEYS[key]
+            if value is None:
+                continue
+            if name.startswith("page_"):
+                if isinstance(value, bool) or not isinstance(value, int):
+                    raise ValueError(f"{key} must be an integer")
+                values[name] = value
+            else:
+                items = value if isinstance(value, list) else [value]
+                values[name] = [category_key(v) for v in items]
+        return cls(**values)
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) is None for f in fields(self))
+
+    def restrict_sources(self, sources: Optional[List[str]]) -> "MetadataFilter":
+        """This filter additionally limited to the given sources."""
+        if sources is None:
+            return self
+        allowed = [category_key(s) for s in sources]
+        if self.sources is not None:
+            allowed = [s for s in self.sources if s in set(allowed)]
+        return MetadataFilter(allowed, self.collections, self.document_ids, self.page_min, self.page_max)
+
+    def category_terms(self) -> List[Tuple[str, List[str]]]:
+        """(column, allowed values) for each restricted category column."""
+        terms = []
+        if self.sources is not None:
+            terms.append(("source", self.sources))
+        if self.document_ids is not None:
+            terms.append(("document_id", self.document_ids))
+        return terms
+
+    def has_page_range(self) -> bool:
+        return self.page_min is not None or self.page_max is not None
@@ -0,0 +1,96 @@
+import time
+import threading
+from utils import logger
+
+
+class StoreFlusher:
+    """
+    Saves a store from a background thread, so request handlers publish changes in memory
+    and return without waiting for the write-ahead log fsync. Changes are coalesced: a save
+    starts at most `interval` seconds after the first unsaved change and covers everything
+    published until then. A failed save is logged and retried on the next round.
+    """
+
+    def __init__(self, store, path: str, interval: float = 1.0):
+        self.store = store
+        self.path = path
+        self.interval = max(0.0, interval)
+        self._cond = threading.Condition()
+        self._requested = 0   # changes marked so far
+        self._saved = 0       # changes covered by the last successful save
+        self._urgent = False
+        self._closed = False
+        self.saves = 0
+        self.last_error = None
+        self.last_save_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="vectorstore-flusher", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self) -> int:
+        """Record a published change; returns a ticket that flush() can wait for."""
+        with self._cond:
+            self._requested += 1
+            self._cond.notify_all()
+            return self._requested
+
+    def flush(self, ticket: int = None, timeout: float = None) -> bool:
+        """Save now and wait until the change `ticket` (default: every change so far) is on disk."""
+        with self._cond:
+            ticket = self._requested if ticket is None else ticket
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._saved >= ticket or self._closed, timeout)
+
+    def close(self, timeout: float = None):
+        """Save what is pending and stop the thread."""
+        self.flush(timeout=timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        return self._requested - self._saved
+
+    def stats(self) -> dict:
+        return {
+            "pending_changes": self.pending,
+            "saves": self.saves,
+            "last_save_ms": round(self.last_save_ms, 2),
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._requested > self._saved)
+                if self._closed:
+                    return
+                # Let further changes join this save, unless someone is waiting on it
+                deadline = time.monotonic() + self.interval
+                while not self._urgent and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._urgent = False
+                target = self._requested
+
+            start = time.perf_counter()
+            try:
+                self.store.save(self.path)
+            except Exception as e:
+                logger.error(f"Background save of the vector store failed: {e}")
+                with self._cond:
+                    self.last_error = str(e)
+                    # Back off before retrying; flush() callers keep waiting
+                    self._cond.wait(max(self.interval, 1.0))
+                continue
+
+            with self._cond:
+                self._saved = target
+                self.saves += 1
+                self.last_error = None
+                self.last_save_ms = (time.perf_counter() - start) * 1000
+                self._cond.notify_all()
@@ -0,0 +1,148 @@
+import os
+import math
+from dataclasses import asdict
+from typing import Optional
+import numpy as np
+import faiss
+from config import IndexConfig
+from utils import logger
+from .segment import durable_replace
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# How vectors are held in RAM by flat, HNSW and IVF-Flat indexes (IVF-PQ has its own codes)
+STORAGE_TYPES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+# k-means wants at least this many training points per IVF list
+MIN_POINTS_PER_LIST = 39
+# and gains little from more than this many
+MAX_POINTS_PER_LIST = 256
+# Scalar quantizer ranges are estimated from at most this many vectors
+MAX_SQ_TRAINING_POINTS = 100_000
+
+
+def validate(config: IndexConfig) -> IndexConfig:
+    if config.type not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type '{config.type}', expected one of {', '.join(INDEX_TYPES)}")
+    if config.storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage '{config.storage}', expected one of {', '.join(STORAGE_TYPES)}")
+    return config
+
+
+def spec(config: IndexConfig) -> dict:
+    """JSON form of an index configuration, as recorded in the manifest."""
+    return asdict(config)
+
+
+def from_spec(data: Optional[dict]) -> IndexConfig:
+    known = IndexConfig.__dataclass_fields__
+    return validate(IndexConfig(**{k: v for k, v in (data or {}).items() if k in known}))
+
+
+def _initial_description(config: IndexConfig) -> str:
+    # float16 needs no training, so partitions hold fp16 codes from the first chunk
+    return "SQfp16" if config.storage == "float16" else "Flat"
+
+
+def initial_index(config: IndexConfig, dimension: int) -> faiss.Index:
+    """Index a partition starts with: brute force over float32 (or float16) vectors, no training needed."""
+    return faiss.IndexIDMap2(faiss.index_factory(dimension, _initial_description(config)))
+
+
+def inner_index(index: faiss.Index) -> faiss.Index:
+    return faiss.downcast_index(index.index)
+
+
+def is_initial(config: IndexConfig, index: faiss.Index) -> bool:
+    """True for partitions that are still in their initial, untrained layout."""
+    inner = inner_index(index)
+    if _initial_description(config) == "SQfp16":
+        return isinstance(inner, faiss.IndexScalarQuantizer)
+    return isinstance(inner, faiss.IndexFlat)
+
+
+def wants_training(config: IndexConfig, index: faiss.Index) -> bool:
+    """True once an initial partition is large enough to switch to the configured index type."""
+    # Flat float32 / float16 are already the final layout; everything else is trained
+    final_is_initial = config.type == "flat" and config.storage != "int8"
+    return not final_is_initial and index.ntotal >= max(1, config.train_min) and is_initial(config, index)
+
+
+def _nlist(config: IndexConfig, n: int) -> int:
+    nlist = config.nlist or int(4 * math.sqrt(n))
+    return max(1, min(nlist, n // MIN_POINTS_PER_LIST))
+
+
+def _pq_m(config: IndexConfig, dimension: int) -> int:
+    m = max(1, min(config.pq_m, dimension))
+    while dimension % m:
+        m -= 1
+    if m != config.pq_m:
+        logger.warning(f"PQ sub-quantizers {config.pq_m} do not divide dimension {dimension}, using {m}")
+    return m
+
+
+def factory_string(config: IndexConfig, dimension: int, n: int) -> str:
+    storage = STORAGE_TYPES[config.storage]
+    if config.type == "hnsw":
+        return f"HNSW{config.hnsw_m},{storage}"
+    if config.type == "ivf_flat":
+        return f"IVF{_nlist(config, n)},{storage}"
+    if config.type == "ivf_pq":
+        return f"IVF{_nlist(config, n)},PQ{_pq_m(config, dimension)}x{config.pq_bits}"
+    return storage
+
+
+def build_index(config: IndexConfig, dimension: int, vectors: np.ndarray, ids: np.ndarray) -> faiss.Index:
+    """
+    Build an id-mapped index of the configured type over vectors, training it first if needed.
+    IVF quantizers are trained on an evenly spaced sample of at most 256 points per list.
+    """
+    description = factory_string(config, dimension, len(vectors))
+    inner = faiss.index_factory(dimension, description)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = config.ef_construction
+    if not inner.is_trained:
+        if isinstance(inner, faiss.IndexIVF):
+            sample = inner.nlist * MAX_POINTS_PER_LIST
+        else:
+            sample = MAX_SQ_TRAINING_POINTS
+        step = max(1, len(vectors) // sample)
+        inner.train(np.ascontiguousarray(vectors[::step], dtype="float32"))
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.ascontiguousarray(ids, dtype="int64"))
+    logger.info(f"Built {description} index over {len(vectors)} vectors")
+    return index
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector = None,
+                      nprobe: int = None, ef_search: int = None) -> Optional[faiss.SearchParameters]:
+    """Per-query parameters of the right type for this partition's index."""
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW) and ef_search:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    if isinstance(inner, faiss.IndexIVF) and nprobe:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(nprobe, inner.nlist))
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def index_file_name(code: int, generation: int) -> str:
+    return f"index-{code:04d}-{generation:06d}.faiss"
+
+
+def write_index(index: faiss.Index, path: str):
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    durable_replace(tmp_path, path)
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """
+    Read an index file. With mmap, vectors, codes and inverted lists are mapped read-only from
+    the file instead of copied, so processes opening the same file share its pages. Such an
+    index cannot be added to.
+    """
+    if mmap:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(path)
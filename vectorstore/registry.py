@@ -0,0 +1,118 @@
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+# Per-document fields besides the chunk ids, as logged in the write-ahead log and listed by the API
+INFO_FIELDS = ("source", "collection", "ingested_at", "content_hash")
+
+
+def id_runs(ids: np.ndarray) -> List[List[int]]:
+    """Sorted ids as [start, end) runs of consecutive values."""
+    if not len(ids):
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(ids)]))
+    return [[int(ids[s]), int(ids[e - 1]) + 1] for s, e in zip(starts.tolist(), ends.tolist())]
+
+
+def runs_to_ids(runs: List[List[int]]) -> np.ndarray:
+    if not runs:
+        return np.empty(0, dtype="int64")
+    return np.concatenate([np.arange(start, end, dtype="int64") for start, end in runs])
+
+
+class DocumentRegistry:
+    """
+    document_id -> source, collection, live chunk ids (as [start, end) runs, since a document's
+    chunks are added together), chunk count, ingest time and content hash. Kept up to date on
+    every add and delete, so listing, deleting and updating a document cost time proportional
+    to the document rather than to the corpus. Adding ids already present and removing ids
+    already gone are no-ops, which makes replaying the write-ahead log over a snapshot safe.
+    """
+
+    def __init__(self, entries: Dict[str, dict] = None):
+        self.entries: Dict[str, dict] = entries or {}
+        # Documents whose fields changed since they were last logged
+        self._dirty = set()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self.entries
+
+    def get(self, document_id: str) -> Optional[dict]:
+        return self.entries.get(document_id)
+
+    def ids_of(self, document_id: str) -> np.ndarray:
+        entry = self.entries.get(document_id)
+        return runs_to_ids(entry["ids"]) if entry else np.empty(0, dtype="int64")
+
+    def add(self, document_id: str, ids: np.ndarray, metadata: dict, content_hash: str = None):
+        """Register chunk ids (ascending) of a document; metadata is that of one of its chunks."""
+        entry = self.entries.get(document_id)
+        if entry is None:
+            entry = self.entries[document_id] = {
+                "source": metadata.get("source"),
+                "collection": metadata.get("collection"),
+                "ids": [],
+                "chunks": 0,
+                "ingested_at": time.time(),
+                "content_hash": None,
+            }
+            self._dirty.add(document_id)
+        if content_hash is not None and entry["content_hash"] != content_hash:
+            entry["content_hash"] = content_hash
+            self._dirty.add(document_id)
+        runs = entry["ids"]
+        if runs and ids[0] >= runs[-1][1]:
+            # The common case: ids are newer than every chunk the document already has
+            new = id_runs(ids)
+            if new[0][0] == runs[-1][1]:
+                runs[-1][1] = new.pop(0)[1]
+            runs.extend(new)
+        else:
+            entry["ids"] = id_runs(np.union1d(runs_to_ids(runs), ids))
+        entry["chunks"] = sum(end - start for start, end in entry["ids"])
+
+    def remove(self, document_id: str, ids: np.ndarray):
+        """Drop deleted chunk ids; a document left without chunks is removed."""
+        entry = self.entries.get(document_id)
+        if entry is None:
+            return
+        first, last = int(ids.min()), int(ids.max())
+        # Only the runs overlapping the deleted ids are expanded
+        touched = [i for i, (start, end) in enumerate(entry["ids"]) if start <= last and end > first]
+        if not touched:
+            return
+        lo, hi = touched[0], touched[-1] + 1
+        kept = np.setdiff1d(runs_to_ids(entry["ids"][lo:hi]), ids, assume_unique=True)
+        entry["ids"][lo:hi] = id_runs(kept)
+        entry["chunks"] = sum(end - start for start, end in entry["ids"])
+        if not entry["chunks"]:
+            del self.entries[document_id]
+            self._dirty.discard(document_id)
+
+    def take_changes(self) -> Dict[str, dict]:
+        """Fields of the documents changed since the last call, for the write-ahead log."""
+        changes = {
+            document_id: {name: self.entries[document_id][name] for name in INFO_FIELDS}
+            for document_id in self._dirty if document_id in self.entries
+        }
+        self._dirty = set()
+        return changes
+
+    def apply_changes(self, changes: Dict[str, dict]):
+        """Replay logged fields onto documents that (still) have chunks."""
+        for document_id, info in changes.items():
+            entry = self.entries.get(document_id)
+            if entry is not None:
+                entry.update(info)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per-document listing without the chunk ids."""
+        return {
+            document_id: {name: entry[name] for name in ("source", "collection", "chunks", "ingested_at", "content_hash")}
+            for document_id, entry in self.entries.items()
+        }
@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from typing import Optional, IO
+from utils import logger
+from . import segment as seg
+from .faiss_store import VectorStore
+
+try:
+    import fcntl
+except ImportError:  # optional: without it (Windows) the single-writer rule is not enforced
+    fcntl = None
+
+WRITER_LOCK_FILE = "writer.lock"
+
+
+def acquire_writer_lock(path: str) -> Optional[IO]:
+    """
+    Take the exclusive writer lock of the store at path. Returns the lock file, to be kept open
+    for as long as the process writes (the lock is released when it is closed or the process
+    exits), or None if another process holds it.
+    """
+    os.makedirs(path, exist_ok=True)
+    f = open(os.path.join(path, WRITER_LOCK_FILE), "a")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class StoreReplica:
+    """
+    A read-only copy of a store that another process writes, kept current from a background
+    thread. Every poll_interval seconds it applies what the writer appended to the write-ahead
+    log; when the writer commits a new manifest generation (checkpoint, compaction, full save)
+    it loads that generation and swaps it in, so queries move to the new version without a
+    restart. Segment and index files are memory-mapped, so any number of replica processes
+    share one copy of them in the page cache.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        self.path = path
+        self.poll_interval = max(0.05, poll_interval)
+        self.store: Optional[VectorStore] = None
+        self.reloads = 0
+        self.last_error = None
+        self._closed = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="vectorstore-replica", daemon=True)
+        self._thread.start()
+
+    def refresh(self) -> Optional[VectorStore]:
+        """Bring the replica up to date with the writer now; returns the current store."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> Optional[VectorStore]:
+        try:
+            generation = seg.read_manifest(self.path)["generation"] if seg.has_manifest(self.path) else None
+            if generation is None:
+                return self.store  # nothing written yet
+            if self.store is None or generation != self.store.generation:
+                self._reload()
+            else:
+                self.store.catch_up()
+            self.last_error = None
+        except FileNotFoundError as e:
+            # The writer committed again and removed files of the generation being opened
+            logger.debug(f"Vector store changed while loading, retrying: {e}")
+        except Exception as e:
+            if str(e) != self.last_error:  # logged once, not on every poll
+                logger.error(f"Refreshing the vector store replica failed: {e}")
+            self.last_error = str(e)
+        return self.store
+
+    def _reload(self):
+        start = time.perf_counter()
+        store = VectorStore.load(self.path, read_only=True)
+        # Queries already running finish on the version they started with
+        self.store = store
+        self.reloads += 1
+        logger.info(f"Vector store replica moved to generation {store.generation} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        store = self.store
+        return {
+            "generation": store.generation if store else None,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+
+    def _run(self):
+        while not self._closed.wait(self.poll_interval):
+            self.refresh()
@@ -0,0 +1,455 @@
+import os
+import json
+import shutil
+from typing import List, Sequence, Iterator, Dict, Callable, Union, Optional
+import numpy as np
+from utils import Document, logger
+from .buffer import GrowableArray
+
+FORMAT_NAME = "lightrag-vectorstore"
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+
+# Files inside a segment directory
+VECTORS_FILE = "vectors.f32"   # raw little-endian float32, shape (count, dimension)
+TEXTS_FILE = "texts.bin"       # concatenated utf-8 chunk texts
+TEXTS_INDEX = "texts.idx"      # uint64 offsets into texts.bin, count + 1 entries
+META_FILE = "meta.bin"         # concatenated utf-8 JSON metadata records
+META_INDEX = "meta.idx"        # uint64 offsets into meta.bin, count + 1 entries
+
+# Per-row numeric columns, stored as <name>.npy
+COLUMN_DTYPES = {
+    "ids": "int64",            # stable chunk ids, ascending
+    "partition": "int32",      # code of the chunk's partition (see manifest "partitions")
+    "source": "int32",         # code of metadata["source"] (see manifest "categories"), -1 if absent
+    "document_id": "int32",    # code of metadata["document_id"], -1 if absent
+    "page": "int32",           # metadata["page"], -1 if absent
+}
+
+# Legacy (pickle) layout
+LEGACY_STATE_FILE = "store.pkl"
+LEGACY_INDEX_FILE = "index.faiss"
+
+VectorBlocks = Union[np.ndarray, Sequence[np.ndarray]]
+
+
+# A save is only durable if everything its manifest references is on disk before the manifest
+# is committed and the write-ahead log it replaces is removed: every file is fsynced before it
+# is renamed into place, and its directory after
+def sync_file(path: str):
+    """fsync a file written (and closed) earlier."""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def sync_dir(path: str):
+    """fsync a directory, so the files created, renamed or removed in it are durable."""
+    if os.name == "nt":
+        return  # directories cannot be opened, nor fsynced, on Windows
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def durable_replace(tmp_path: str, path: str):
+    """Rename a fully written file into place, durably."""
+    sync_file(tmp_path)
+    os.replace(tmp_path, path)
+    sync_dir(os.path.dirname(path) or ".")
+
+
+def _replace_dir(tmp_path: str, path: str):
+    # The same for a directory of files, e.g. a segment
+    for name in os.listdir(tmp_path):
+        sync_file(os.path.join(tmp_path, name))
+    sync_dir(tmp_path)
+    os.replace(tmp_path, path)
+    sync_dir(os.path.dirname(path))
+
+
+def _write_blobs(data_path: str, index_path: str, blobs: Iterator[bytes], count: int):
+    offsets = np.zeros(count + 1, dtype="<u8")
+    pos = 0
+    with open(data_path, "wb") as f:
+        for i, blob in enumerate(blobs):
+            f.write(blob)
+            pos += len(blob)
+            offsets[i + 1] = pos
+    offsets.tofile(index_path)
+
+
+def _copy_array(f, array: np.ndarray, block_bytes: int = 64 * 2**20):
+    """Stream an array (typically a memmap) to a file without materialising it."""
+    flat = array.reshape(-1)
+    step = max(1, block_bytes // max(1, flat.itemsize))
+    for start in range(0, len(flat), step):
+        f.write(np.ascontiguousarray(flat[start:start + step]).tobytes())
+
+
+def _open_array(path: str, dtype: str, shape: tuple) -> np.ndarray:
+    # np.memmap refuses zero-length files
+    if os.path.getsize(path) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.npy")
+
+
+def _write_columns(path: str, columns: Dict[str, np.ndarray]):
+    for name, values in columns.items():
+        np.save(_column_path(path, name), np.ascontiguousarray(values, dtype=COLUMN_DTYPES[name]))
+
+
+def _fresh_dir(path: str) -> str:
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    return tmp_path
+
+
+def write_segment(path: str, documents: Sequence[Document], vectors: VectorBlocks, columns: Dict[str, np.ndarray]):
+    """
+    Write documents, their vectors (one array or a list of row blocks) and per-row columns
+    as an immutable segment directory.
+    The segment is written to a temporary directory and renamed into place.
+    """
+    blocks = [vectors] if isinstance(vectors, np.ndarray) else list(vectors)
+    count = len(documents)
+    rows = sum(len(b) for b in blocks)
+    if rows != count:
+        raise ValueError(f"Segment has {count} documents but {rows} vectors")
+
+    tmp_path = _fresh_dir(path)
+    with open(os.path.join(tmp_path, VECTORS_FILE), "wb") as f:
+        for block in blocks:
+            _copy_array(f, np.asarray(block, dtype="<f4"))
+    _write_columns(tmp_path, columns)
+    _write_blobs(
+        os.path.join(tmp_path, TEXTS_FILE), os.path.join(tmp_path, TEXTS_INDEX),
+        (doc.text.encode("utf-8") for doc in documents), count
+    )
+    _write_blobs(
+        os.path.join(tmp_path, META_FILE), os.path.join(tmp_path, META_INDEX),
+        (json.dumps(doc.metadata, separators=(",", ":")).encode("utf-8") for doc in documents), count
+    )
+    _replace_dir(tmp_path, path)
+
+
+class Segment:
+    """Read-only, memory-mapped view over a segment directory."""
+
+    def __init__(self, path: str, count: int, dimension: int):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.count = count
+        self.dimension = dimension
+        self.vectors = _open_array(os.path.join(path, VECTORS_FILE), "<f4", (count, dimension))
+        self._text_offsets = _open_array(os.path.join(path, TEXTS_INDEX), "<u8", (count + 1,))
+        self._texts = _open_array(os.path.join(path, TEXTS_FILE), "u1", (int(self._text_offsets[-1]),))
+        self._meta_offsets = _open_array(os.path.join(path, META_INDEX), "<u8", (count + 1,))
+        self._meta = _open_array(os.path.join(path, META_FILE), "u1", (int(self._meta_offsets[-1]),))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def column(self, name: str):
+        """Memory-mapped per-row column, or None if this segment predates it."""
+        path = _column_path(self.path, name)
+        if os.path.exists(path):
+            return np.load(path, mmap_mode="r") if self.count else np.load(path)
+        return None
+
+    def text(self, i: int) -> str:
+        start, end = int(self._text_offsets[i]), int(self._text_offsets[i + 1])
+        return self._texts[start:end].tobytes().decode("utf-8")
+
+    def metadata(self, i: int) -> dict:
+        start, end = int(self._meta_offsets[i]), int(self._meta_offsets[i + 1])
+        return json.loads(self._meta[start:end].tobytes().decode("utf-8"))
+
+    def document(self, i: int) -> Document:
+        return Document(text=self.text(i), metadata=self.metadata(i))
+
+
+class ChunkTable(Sequence):
+    """
+    The store's rows in ascending id order: committed, memory-mapped segments followed by an
+    in-memory tail of chunks that are not in a segment yet.
+    Behaves as a sequence of Documents, decoded from disk only when accessed. Vectors are read
+    by row range; small per-row columns (ids, partition and metadata codes) are kept in memory
+    for all rows.
+    """
+
+    def __init__(self, dimension: int, segments: List[Segment] = None,
+                 missing_column: Callable[[Segment, str, int], np.ndarray] = None):
+        self.dimension = dimension
+        self.segments = list(segments or [])
+        self._starts = np.cumsum([0] + [len(s) for s in self.segments])
+        self.segment_rows = int(self._starts[-1])
+        self._tail_documents: List[Document] = []
+        self._tail_vectors = GrowableArray("float32", dimension)
+        self._columns = {name: GrowableArray(dtype) for name, dtype in COLUMN_DTYPES.items()}
+        for segment, start in zip(self.segments, self._starts):
+            for name, column in self._columns.items():
+                values = segment.column(name)
+                if values is None:
+                    values = missing_column(segment, name, int(start))
+                column.extend(values)
+
+    def __len__(self) -> int:
+        return self.segment_rows + len(self._tail_documents)
+
+    def _locate(self, row: int):
+        seg = int(np.searchsorted(self._starts, row, side="right")) - 1
+        return self.segments[seg], row - int(self._starts[seg])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError(i)
+        if i >= self.segment_rows:
+            return self._tail_documents[i - self.segment_rows]
+        segment, offset = self._locate(i)
+        return segment.document(offset)
+
+    def __iter__(self):
+        for segment in self.segments:
+            for j in range(len(segment)):
+                yield segment.document(j)
+        yield from self._tail_documents
+
+    def append(self, documents: List[Document], vectors: np.ndarray, columns: Dict[str, np.ndarray]):
+        self._tail_documents.extend(documents)
+        self._tail_vectors.extend(vectors)
+        for name, column in self._columns.items():
+            column.extend(columns[name])
+
+    def column(self, name: str) -> np.ndarray:
+        """In-memory column for all rows; invalidated by the next append."""
+        return self._columns[name].view()
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.column("ids")
+
+    def columns(self, start: int, end: int) -> Dict[str, np.ndarray]:
+        return {name: column.view()[start:end] for name, column in self._columns.items()}
+
+    def vector_blocks(self, start: int, end: int) -> List[np.ndarray]:
+        """Zero-copy views (segment memmaps and the tail buffer) covering rows [start, end)."""
+        blocks = []
+        for segment, seg_start in zip(self.segments, self._starts.tolist()):
+            lo, hi = max(start, seg_start), min(end, seg_start + len(segment))
+            if lo < hi:
+                blocks.append(segment.vectors[lo - seg_start:hi - seg_start])
+        lo, hi = max(start, self.segment_rows), end
+        if lo < hi:
+            blocks.append(self._tail_vectors.view()[lo - self.segment_rows:hi - self.segment_rows])
+        return blocks
+
+    def vectors(self, start: int, end: int) -> np.ndarray:
+        blocks = self.vector_blocks(start, end)
+        if len(blocks) == 1:
+            return blocks[0]
+        if not blocks:
+            return np.empty((0, self.dimension), dtype="float32")
+        return np.concatenate(blocks)
+
+    def take_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Gather the vectors of arbitrary rows into a new array."""
+        rows = np.asarray(rows, dtype="int64")
+        out = np.empty((len(rows), self.dimension), dtype="float32")
+        seg_of = np.searchsorted(self._starts, rows, side="right") - 1
+        for seg in np.unique(seg_of).tolist():
+            mask = seg_of == seg
+            if seg < len(self.segments):
+                out[mask] = self.segments[seg].vectors[rows[mask] - self._starts[seg]]
+            else:
+                out[mask] = self._tail_vectors.view()[rows[mask] - self.segment_rows]
+        return out
+
+    def reopen(self, segments: List[Segment], covered_rows: int,
+               missing_column: Callable[[Segment, str, int], np.ndarray] = None) -> "ChunkTable":
+        """
+        A new table over segments that hold this table's rows [0, covered_rows) (minus any rows
+        dropped by compaction), with this table's remaining rows carried over as the tail.
+        """
+        table = ChunkTable(self.dimension, segments, missing_column)
+        if covered_rows < len(self):
+            table.append(
+                self[covered_rows:],
+                self.vectors(covered_rows, len(self)),
+                self.columns(covered_rows, len(self)),
+            )
+        return table
+
+
+def has_manifest(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def has_legacy_store(path: str) -> bool:
+    return os.path.exists(os.path.join(path, LEGACY_STATE_FILE))
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a LightRAG vector store")
+    if manifest.get("version", 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported vector store format version {manifest.get('version')} in {path}")
+    manifest.setdefault("wal", 0)
+    manifest.setdefault("next_segment", len(manifest["segments"]))
+    manifest.setdefault("next_id", manifest.get("count", 0))
+    manifest.setdefault("tombstones", 0)
+    manifest.setdefault("generation", 0)
+    manifest.setdefault("partitions", [])
+    manifest.setdefault("categories", {})
+    manifest.setdefault("index", None)
+    manifest.setdefault("indexes", {})
+    return manifest
+
+
+def write_manifest(path: str, manifest: dict):
+    """Atomically replace the manifest; this is the commit point of a save."""
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, **manifest}
+    tmp_path = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    durable_replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+
+def open_segments(path: str, manifest: dict) -> List[Segment]:
+    return [
+        Segment(os.path.join(path, SEGMENTS_DIR, seg["name"]), seg["count"], manifest["dimension"])
+        for seg in manifest["segments"]
+    ]
+
+
+def segment_name(seq: int) -> str:
+    return f"seg-{seq:06d}"
+
+
+def _kept_runs(keep: np.ndarray) -> List[tuple]:
+    """Contiguous [start, end) row ranges where keep is True."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], keep.astype(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def merge_segments(path: str, segments: List[Segment], columns: List[Dict[str, np.ndarray]],
+                   keep: List[np.ndarray]) -> int:
+    """
+    Concatenate segments into a single new segment at path.
+    columns[i] holds segment i's per-row columns and keep[i] marks the rows to carry over.
+    Raw bytes are streamed in row runs and offsets rebased, so no record is decoded.
+    Returns the number of rows written.
+    """
+    tmp_path = _fresh_dir(path)
+    runs = [_kept_runs(k) for k in keep]
+
+    with open(os.path.join(tmp_path, VECTORS_FILE), "wb") as f:
+        for segment, seg_runs in zip(segments, runs):
+            for start, end in seg_runs:
+                _copy_array(f, segment.vectors[start:end])
+    _write_columns(tmp_path, {
+        name: np.concatenate([np.asarray(cols[name])[k] for cols, k in zip(columns, keep)])
+        for name in COLUMN_DTYPES
+    })
+
+    count = 0
+    for data_name, index_name, data_attr, offsets_attr in (
+        (TEXTS_FILE, TEXTS_INDEX, "_texts", "_text_offsets"),
+        (META_FILE, META_INDEX, "_meta", "_meta_offsets"),
+    ):
+        offsets = [np.zeros(1, dtype="<u8")]
+        base = 0
+        with open(os.path.join(tmp_path, data_name), "wb") as f:
+            for segment, seg_runs in zip(segments, runs):
+                data = getattr(segment, data_attr)
+                seg_offsets = np.asarray(getattr(segment, offsets_attr), dtype="<u8")
+                for start, end in seg_runs:
+                    lo, hi = int(seg_offsets[start]), int(seg_offsets[end])
+                    _copy_array(f, data[lo:hi])
+                    offsets.append(seg_offsets[start + 1:end + 1] - np.uint64(lo) + np.uint64(base))
+                    base += hi - lo
+        offsets = np.concatenate(offsets).astype("<u8")
+        offsets.tofile(os.path.join(tmp_path, index_name))
+        count = len(offsets) - 1
+
+    _replace_dir(tmp_path, path)
+    return count
+
+
+def tombstones_name(generation: int) -> str:
+    return f"tombstones-{generation:06d}.i64"
+
+
+def write_tombstones(path: str, generation: int, ids: np.ndarray):
+    file_path = os.path.join(path, tombstones_name(generation))
+    np.ascontiguousarray(np.sort(ids), dtype="<i8").tofile(file_path + ".tmp")
+    durable_replace(file_path + ".tmp", file_path)
+
+
+def read_tombstones(path: str, manifest: dict) -> np.ndarray:
+    """Ids of deleted chunks that are still physically present in the segments."""
+    if not manifest.get("tombstones"):
+        return np.empty(0, dtype="int64")
+    return np.fromfile(os.path.join(path, tombstones_name(manifest["generation"])), dtype="<i8").astype("int64")
+
+
+def registry_name(generation: int) -> str:
+    return f"documents-{generation:06d}.json"
+
+
+def write_registry(path: str, generation: int, entries: dict):
+    file_path = os.path.join(path, registry_name(generation))
+    with open(file_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entries, f, separators=(",", ":"))
+    durable_replace(file_path + ".tmp", file_path)
+
+
+def read_registry(path: str, manifest: dict) -> Optional[dict]:
+    """The document registry committed with the manifest, or None for stores written before it existed."""
+    if manifest.get("documents") is None:
+        return None
+    with open(os.path.join(path, registry_name(manifest["generation"])), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def remove_stale_files(path: str, manifest: dict, keep: Sequence[str] = ()):
+    """
+    Delete segments, write-ahead logs, tombstone, registry and index files that the committed manifest no longer references.
+    Segment names in keep (e.g. a merge still in progress) are left alone.
+    """
+    from .wal import wal_name
+
+    seg_root = os.path.join(path, SEGMENTS_DIR)
+    if os.path.isdir(seg_root):
+        live = {seg["name"] for seg in manifest["segments"]}
+        live.update(keep)
+        live.update(name + ".tmp" for name in keep)
+        for name in os.listdir(seg_root):
+            if name not in live:
+                shutil.rmtree(os.path.join(seg_root, name), ignore_errors=True)
+                logger.debug(f"Removed stale segment {name}")
+
+    live_files = {wal_name(manifest.get("wal", 0))}
+    if manifest.get("tombstones"):
+        live_files.add(tombstones_name(manifest["generation"]))
+    if manifest.get("documents") is not None:
+        live_files.add(registry_name(manifest["generation"]))
+    live_files.update(entry["file"] for entry in manifest.get("indexes", {}).values())
+    for name in os.listdir(path):
+        if name.startswith(("wal-", "tombstones-", "documents-", "index-")) and name not in live_files:
+            os.remove(os.path.join(path, name))
+            logger.debug(f"Removed stale file {name}")
@@ -0,0 +1,122 @@
+import os
+import json
+import zlib
+import struct
+from typing import List, Iterator, Tuple
+import numpy as np
+from utils import Document, logger
+from .segment import sync_dir
+
+# Record layout: <u4 payload length><u4 crc32 of payload><payload>
+# Add payload:    <u1 0><u4 count><u4 dimension><count int64 ids><count * dimension float32>
+#                 <utf-8 JSON list of [text, metadata]>
+# Delete payload: <u1 1><u4 count><count int64 ids>
+# Documents payload: <u1 2><utf-8 JSON {document_id: registry fields}>
+_HEADER = struct.Struct("<II")
+_ADD_HEADER = struct.Struct("<BII")
+_DELETE_HEADER = struct.Struct("<BI")
+
+ADD = 0
+DELETE = 1
+DOCUMENTS = 2
+
+
+def wal_name(wal_id: int) -> str:
+    return f"wal-{wal_id:06d}.log"
+
+
+class WriteAheadLog:
+    """
+    Append-only log of chunks added and chunk ids deleted since the last checkpoint.
+    Each append is fsynced, so an ingest or delete only pays for writing its own records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        # End of the last complete record read by replay()
+        self.offset = 0
+
+    def _write(self, payload: bytes):
+        created = not os.path.exists(self.path)
+        with open(self.path, "ab") as f:
+            f.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        if created:
+            # The log's directory entry must be durable too, or its records are lost with it
+            sync_dir(os.path.dirname(self.path) or ".")
+
+    def append(self, documents: List[Document], vectors: np.ndarray, ids: np.ndarray):
+        if not documents:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        records = json.dumps([[doc.text, doc.metadata] for doc in documents], separators=(",", ":")).encode("utf-8")
+        self._write(
+            _ADD_HEADER.pack(ADD, len(documents), vectors.shape[1])
+            + np.ascontiguousarray(ids, dtype="<i8").tobytes()
+            + vectors.tobytes()
+            + records
+        )
+        self.rows += len(documents)
+
+    def append_delete(self, ids: np.ndarray):
+        if not len(ids):
+            return
+        self._write(_DELETE_HEADER.pack(DELETE, len(ids)) + np.ascontiguousarray(ids, dtype="<i8").tobytes())
+
+    def append_documents(self, changes: dict):
+        """Log registry fields (ingest time, content hash, ...) of documents added or changed."""
+        if not changes:
+            return
+        self._write(bytes([DOCUMENTS]) + json.dumps(changes, separators=(",", ":")).encode("utf-8"))
+
+    def replay(self, start: int = 0, truncate: bool = True) -> Iterator[Tuple[int, tuple]]:
+        """
+        Yield (ADD, (documents, vectors, ids)), (DELETE, ids) and (DOCUMENTS, changes) records in
+        append order, from byte offset start (a previous replay's offset, to follow the log).
+        A torn or corrupt tail (crash mid-append) is truncated away; a reader following a log
+        that another process appends to passes truncate=False and stops before the incomplete record.
+        """
+        if not os.path.exists(self.path):
+            return
+        good = start
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                good = self.offset = f.tell()
+
+                if payload[0] == DELETE:
+                    _, count = _DELETE_HEADER.unpack_from(payload)
+                    yield DELETE, np.frombuffer(payload, dtype="<i8", count=count, offset=_DELETE_HEADER.size)
+                    continue
+                if payload[0] == DOCUMENTS:
+                    yield DOCUMENTS, json.loads(payload[1:].decode("utf-8"))
+                    continue
+
+                _, count, dimension = _ADD_HEADER.unpack_from(payload)
+                ids_end = _ADD_HEADER.size + count * 8
+                vec_end = ids_end + count * dimension * 4
+                ids = np.frombuffer(payload, dtype="<i8", count=count, offset=_ADD_HEADER.size)
+                vectors = np.frombuffer(payload, dtype="<f4", count=count * dimension, offset=ids_end)
+                records = json.loads(payload[vec_end:].decode("utf-8"))
+                self.rows += count
+                yield ADD, ([Document(text=t, metadata=m) for t, m in records], vectors.reshape(count, dimension), ids)
+
+        if truncate and good < os.path.getsize(self.path):
+            logger.warning(f"Truncating torn write-ahead log tail in {self.path} at byte {good}")
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.rows = 0